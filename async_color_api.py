@@ -0,0 +1,146 @@
+import asyncio
+import copy
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from config import app_config
+from gemini_api import GeminiColorAPI
+from chatgpt_api import ChatGPTColorAPI
+from llm_providers import GeminiProvider, ChatGPTProvider, HedgedProvider
+
+
+class SingleFlight:
+    """
+    Agrupa llamadas concurrentes con la misma clave:
+    mientras una petición está en vuelo, los demás llamadores
+    esperan ese mismo resultado en lugar de lanzar otra.
+    """
+
+    def __init__(self):
+        self._en_vuelo = {}
+        self.coalesced = 0
+
+    def in_flight(self):
+        return len(self._en_vuelo)
+
+    async def do(self, key, coro_factory):
+        fut = self._en_vuelo.get(key)
+        if fut is not None:
+            self.coalesced += 1
+            # Copia para que un llamador no modifique el resultado de otro
+            return copy.deepcopy(await asyncio.shield(fut))
+
+        fut = asyncio.ensure_future(coro_factory())
+        self._en_vuelo[key] = fut
+        fut.add_done_callback(lambda _f: self._en_vuelo.pop(key, None))
+        # shield: si este llamador se cancela, los demás siguen esperando
+        return await asyncio.shield(fut)
+
+
+class AsyncColorClient:
+    """
+    Envoltorio asyncio de un cliente de colores síncrono
+    (GeminiColorAPI / ChatGPTColorAPI).
+
+    - Concurrencia limitada: las llamadas corren en un pool fijo de
+      max_concurrency hilos, así que el número de hilos y sockets
+      no crece con los clics.
+    - Single-flight: peticiones idénticas concurrentes comparten
+      una sola llamada a la API.
+    """
+
+    def __init__(self, client, max_concurrency=None):
+        self.client = client
+        self.max_concurrency = max_concurrency or app_config.http.POOL_SIZE
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency, thread_name_prefix="color-ia"
+        )
+        self._flight = SingleFlight()
+
+    async def get_colors_from_prompt(self, prompt, **kwargs):
+        key = (prompt, tuple(sorted(kwargs.items())))
+        return await self._flight.do(key, lambda: self._run(prompt, kwargs))
+
+    async def _run(self, prompt, kwargs):
+        loop = asyncio.get_running_loop()
+        call = functools.partial(self.client.get_colors_from_prompt, prompt, **kwargs)
+        return await loop.run_in_executor(self._executor, call)
+
+    async def stream_colors_from_prompt(self, prompt, on_color=None, **kwargs):
+        """
+        Streaming (GeminiColorAPI.stream_colors_from_prompt) en el mismo
+        pool y con el mismo single-flight: devuelve la lista de (r,g,b).
+        on_color(i, (r,g,b)) se llama desde el hilo del pool según llega
+        cada color; si ya había un stream igual en vuelo, este llamador
+        solo recibe la lista final.
+        """
+        key = ("stream", prompt, tuple(sorted(kwargs.items())))
+        return await self._flight.do(key, lambda: self._run_stream(prompt, on_color, kwargs))
+
+    async def _run_stream(self, prompt, on_color, kwargs):
+        def consumir():
+            colores = []
+            for color in self.client.stream_colors_from_prompt(prompt, **kwargs):
+                if on_color is not None:
+                    on_color(len(colores), color)
+                colores.append(color)
+            return colores
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, consumir)
+
+    def stats(self):
+        return {
+            "en_vuelo": self._flight.in_flight(),
+            "agrupadas": self._flight.coalesced,
+            "max_concurrencia": self.max_concurrency,
+        }
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+class AsyncGeminiColorAPI(AsyncColorClient):
+    """Variante asyncio de GeminiColorAPI."""
+
+    def __init__(self, config=app_config, max_concurrency=None, client=None, **kwargs):
+        super().__init__(client or GeminiColorAPI(config=config, **kwargs), max_concurrency)
+
+
+class AsyncChatGPTColorAPI(AsyncColorClient):
+    """Variante asyncio de ChatGPTColorAPI."""
+
+    def __init__(self, api_key, model="gpt-4o-mini", max_concurrency=None, client=None, **kwargs):
+        super().__init__(client or ChatGPTColorAPI(api_key, model=model, **kwargs), max_concurrency)
+
+
+def create_color_source(config=app_config):
+    """
+    Cliente de colores de la aplicación: (color_gen, color_source).
+
+    color_gen es el GeminiColorAPI (caché, streaming, motor local).
+    color_source es lo que se usa para pedir paletas: el mismo color_gen
+    o, si hay API key de OpenAI, un HedgedProvider OpenRouter -> OpenAI.
+    """
+    color_gen = GeminiColorAPI(config=config)
+    color_source = color_gen
+    if config.hedge.ENABLED and config.openai.OPENAI_API_KEY:
+        color_source = HedgedProvider(
+            GeminiProvider(color_gen),
+            ChatGPTProvider(ChatGPTColorAPI(config.openai.OPENAI_API_KEY, model=config.openai.MODEL)),
+            percentile=config.hedge.PERCENTILE,
+            min_samples=config.hedge.MIN_SAMPLES,
+            default_deadline=config.hedge.DEFAULT_DEADLINE,
+            min_deadline=config.hedge.MIN_DEADLINE,
+            fallback=color_gen.local,
+            mode=color_gen.mode,
+        )
+    return color_gen, color_source
+
+
+def start_background_loop(name="noria-asyncio"):
+    """Arranca un event loop asyncio en un hilo demonio (para usarlo desde Tk)."""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name=name, daemon=True).start()
+    return loop
@@ -0,0 +1,661 @@
+# bench_noria.py
+"""
+Benchmarks de la Noria.
+
+    python bench_noria.py llm --requests 200 --concurrency 4 --latency-ms 80 --shape mixed
+    python bench_noria.py llm --output bench.json
+    python bench_noria.py parser
+    python bench_noria.py router --messages 200000 --extra-patterns 50
+    python bench_noria.py startup --runs 5
+    python bench_noria.py esp32 --pings 100 --metrics-wait 12
+
+'llm' levanta un servidor local que imita /v1/chat/completions
+(OpenRouter / OpenAI) con latencia, jitter, tasa de error y formato de
+respuesta configurables, y mide GeminiColorAPI y ChatGPTColorAPI:
+throughput, latencias p50/p95/p99, tasa de parseo correcto y memoria
+asignada por llamada. La salida es JSON para poder comparar commits.
+
+'parser' compara color_parser.parse_colors con los parsers anteriores
+(regex por línea de GeminiColorAPI y split/int de ChatGPTColorAPI) en
+entradas grandes y malformadas.
+
+'router' mide mensajes/s a través de topic_router.TopicRouter frente a la
+cadena de if/elif con 'in'/'endswith' que usaba actualizar_estado.
+
+'startup' lanza interfaz.py varias veces (NORIA_STARTUP_BENCH=1) y mide
+el tiempo hasta el primer fotograma de la ventana, hasta que la IA está
+lista y hasta la conexión MQTT. Necesita un display (o Xvfb).
+
+'esp32' mide contra la ESP32 real (por el broker de config.py): latencia
+ida y vuelta de esp32/ping -> esp32/pong y las métricas que publica el
+firmware en esp32/metrics (latencia socket->actuación, despertares por
+segundo, % de CPU ocupada, memoria libre).
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# ======================================================================
+#                      SERVIDOR LLM FALSO
+# ======================================================================
+SHAPES = ("lines", "json", "markdown", "garbage")
+
+
+def _fake_content(shape, n_colors, rng):
+    colores = [(rng.randrange(256), rng.randrange(256), rng.randrange(256)) for _ in range(n_colors)]
+
+    if shape == "lines":
+        return "\n".join(f"{r},{g},{b}" for r, g, b in colores)
+    if shape == "json":
+        return json.dumps({"colors": [list(c) for c in colores]})
+    if shape == "markdown":
+        cuerpo = "\n".join(f"- rgb({r}, {g}, {b})" for r, g, b in colores)
+        return f"Aquí tienes tu paleta:\n```\n{cuerpo}\n```"
+    # garbage
+    return "Lo siento, no puedo ayudarte con eso. " + "".join(rng.choice("abc xyz,;#") for _ in range(60))
+
+
+class FakeLLMServer:
+    """Servidor HTTP local que responde como un endpoint de chat completions."""
+
+    def __init__(self, latency_ms=50.0, jitter_ms=0.0, error_rate=0.0, shape="lines",
+                 n_colors=5, seed=1234):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.shape = shape
+        self.n_colors = n_colors
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self.requests = 0
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                largo = int(self.headers.get("Content-Length", 0))
+                try:
+                    body = json.loads(self.rfile.read(largo) or b"{}")
+                except ValueError:
+                    body = {}
+                server._responder(self, body)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/v1/chat/completions"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def _sortear(self):
+        with self._rng_lock:
+            self.requests += 1
+            espera = max(0.0, self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+            error = self._rng.random() < self.error_rate
+            shape = self._rng.choice(SHAPES) if self.shape == "mixed" else self.shape
+            rng = random.Random(self._rng.random())
+        return espera, error, shape, rng
+
+    def _responder(self, handler, body):
+        espera, error, shape, rng = self._sortear()
+        time.sleep(espera)
+
+        if error:
+            data = json.dumps({"error": {"message": "fake upstream error"}}).encode()
+            handler.send_response(rng.choice((429, 500, 503)))
+            handler.send_header("Content-Type", "application/json")
+            handler.send_header("Content-Length", str(len(data)))
+            handler.end_headers()
+            handler.wfile.write(data)
+            return
+
+        content = _fake_content(shape, self.n_colors, rng)
+
+        if body.get("stream"):
+            handler.send_response(200)
+            handler.send_header("Content-Type", "text/event-stream")
+            handler.send_header("Transfer-Encoding", "chunked")
+            handler.end_headers()
+
+            def chunk(b):
+                handler.wfile.write(b"%x\r\n%s\r\n" % (len(b), b))
+                handler.wfile.flush()
+
+            for linea in content.splitlines(keepends=True):
+                evento = {"choices": [{"delta": {"content": linea}}]}
+                chunk(b"data: " + json.dumps(evento).encode() + b"\n\n")
+            chunk(b"data: [DONE]\n\n")
+            chunk(b"")
+            return
+
+        data = json.dumps({"choices": [{"message": {"role": "assistant", "content": content}}]}).encode()
+        handler.send_response(200)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+# ======================================================================
+#                           UTILIDADES
+# ======================================================================
+def percentil(valores, q):
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * q))]
+
+
+def resumen_latencias(lat_s):
+    return {
+        "p50_ms": percentil(lat_s, 0.50) * 1000 if lat_s else None,
+        "p95_ms": percentil(lat_s, 0.95) * 1000 if lat_s else None,
+        "p99_ms": percentil(lat_s, 0.99) * 1000 if lat_s else None,
+        "media_ms": sum(lat_s) / len(lat_s) * 1000 if lat_s else None,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+# ======================================================================
+#                     BENCHMARK DE CLIENTES LLM
+# ======================================================================
+def _clientes(url, max_retries, pool_size):
+    from config import AppConfig
+    from http_transport import HTTPTransport
+    from gemini_api import GeminiColorAPI
+    from chatgpt_api import ChatGPTColorAPI
+
+    cfg = AppConfig()
+    cfg.cache.ENABLED = False
+
+    def transporte():
+        return HTTPTransport(pool_size=pool_size, max_retries=max_retries, backoff_base=0.01)
+
+    gemini = GeminiColorAPI(config=cfg, transport=transporte())
+    gemini.url = url
+    chatgpt = ChatGPTColorAPI("fake-key", transport=transporte())
+    chatgpt.url = url
+
+    # Se mide petición + parseo sin relleno: el éxito es obtener n colores reales
+    def llamar_gemini(prompt, n):
+        colores = gemini._fetch_colors(prompt, n)
+        return colores is not None and len(colores) >= n
+
+    def llamar_chatgpt(prompt, n):
+        colores = chatgpt._fetch_colors(prompt, n)
+        return colores is not None and len(colores) >= n
+
+    return {"gemini": llamar_gemini, "chatgpt": llamar_chatgpt}
+
+
+def _medir(llamar, n_requests, concurrency, n_colors):
+    latencias = []
+    exitos = 0
+    lock = threading.Lock()
+
+    def una(i):
+        nonlocal exitos
+        t0 = time.perf_counter()
+        try:
+            ok = llamar(f"tema {i}", n_colors)
+        except Exception:
+            ok = False
+        dt = time.perf_counter() - t0
+        with lock:
+            latencias.append(dt)
+            exitos += bool(ok)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(una, range(n_requests)))
+    total = time.perf_counter() - t0
+
+    return {
+        "peticiones": n_requests,
+        "segundos": total,
+        "throughput_rps": n_requests / total if total else None,
+        "parse_ok_rate": exitos / n_requests if n_requests else None,
+        **resumen_latencias(latencias),
+    }
+
+
+def _memoria_por_llamada(llamar, n_calls, n_colors):
+    """Bytes asignados por llamada (pico de tracemalloc), medidos en serie."""
+    llamar("calentamiento", n_colors)
+    tracemalloc.start()
+    picos = []
+    try:
+        for i in range(n_calls):
+            tracemalloc.reset_peak()
+            antes, _ = tracemalloc.get_traced_memory()
+            llamar(f"mem {i}", n_colors)
+            _, pico = tracemalloc.get_traced_memory()
+            picos.append(pico - antes)
+    finally:
+        tracemalloc.stop()
+    return {"alloc_pico_bytes_por_llamada": sum(picos) / len(picos) if picos else None}
+
+
+def bench_llm(args):
+    resultados = {}
+    with FakeLLMServer(args.latency_ms, args.jitter_ms, args.error_rate, args.shape,
+                       n_colors=args.n_colors, seed=args.seed) as server:
+        # Los clientes imprimen cada respuesta: se silencian durante la medida
+        with contextlib.redirect_stdout(io.StringIO()):
+            clientes = _clientes(server.url, args.max_retries, max(args.concurrency, 1))
+            for nombre in args.clients:
+                llamar = clientes[nombre]
+                resultados[nombre] = _medir(llamar, args.requests, args.concurrency, args.n_colors)
+                resultados[nombre].update(_memoria_por_llamada(llamar, args.mem_calls, args.n_colors))
+
+    return {
+        "bench": "llm",
+        "parametros": {
+            "requests": args.requests, "concurrency": args.concurrency,
+            "latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms,
+            "error_rate": args.error_rate, "shape": args.shape,
+            "n_colors": args.n_colors, "max_retries": args.max_retries,
+        },
+        "resultados": resultados,
+    }
+
+
+# ======================================================================
+#                     BENCHMARK DEL PARSER DE COLORES
+# ======================================================================
+def _legacy_gemini(text):
+    """Parser anterior de GeminiColorAPI: replace + re.findall por línea."""
+    import re
+    resultado = []
+    for line in text.strip().splitlines():
+        cleaned = line.lower().strip()
+        cleaned = cleaned.replace("rgb", "").replace("(", "").replace(")", "")
+        nums = re.findall(r"\d{1,3}", cleaned)
+        if len(nums) == 3:
+            resultado.append(tuple(int(n) for n in nums))
+    return resultado
+
+
+def _legacy_chatgpt(text):
+    """Parser anterior de ChatGPTColorAPI: split + int con except."""
+    colors = []
+    for line in text.splitlines():
+        line = line.strip()
+        if "," in line:
+            parts = line.split(",")
+            if len(parts) == 3:
+                try:
+                    r, g, b = int(parts[0]), int(parts[1]), int(parts[2])
+                    if 0 <= r <= 255 and 0 <= g <= 255 and 0 <= b <= 255:
+                        colors.append((r, g, b))
+                except ValueError:
+                    pass
+    return colors
+
+
+def _entradas_parser(n_lineas, seed):
+    rng = random.Random(seed)
+
+    def c():
+        return rng.randrange(256), rng.randrange(256), rng.randrange(256)
+
+    lineas = "\n".join("%d,%d,%d" % c() for _ in range(n_lineas))
+
+    formatos = []
+    for _ in range(n_lineas):
+        r, g, b = c()
+        formatos.append(rng.choice((
+            f"{r},{g},{b}", f"rgb({r}, {g}, {b})", f"[{r}, {g}, {b}]",
+            f"#{r:02x}{g:02x}{b:02x}", f"- Color: {r}, {g}, {b}", f'{{"r": {r}, "g": {g}, "b": {b}}}',
+        )))
+    mixto = "\n".join(formatos)
+
+    basura = []
+    for i in range(n_lineas):
+        if i % 4 == 0:
+            basura.append("%d,%d,%d" % c())
+        else:
+            basura.append("".join(rng.choice("abcxyz0123456789,;#()[] ") for _ in range(rng.randrange(5, 120))))
+    malformado = "\n".join(basura)
+
+    json_una_linea = json.dumps({"colors": [list(c()) for _ in range(n_lineas)]})
+
+    return {"lineas": lineas, "mixto": mixto, "malformado": malformado, "json_una_linea": json_una_linea}
+
+
+def bench_parser(args):
+    from color_parser import parse_colors
+
+    parsers = {"nuevo": parse_colors, "legacy_gemini": _legacy_gemini, "legacy_chatgpt": _legacy_chatgpt}
+    resultados = {}
+
+    for nombre_entrada, texto in _entradas_parser(args.lines, args.seed).items():
+        fila = {"bytes": len(texto.encode())}
+        for nombre, fn in parsers.items():
+            colores = fn(texto)
+            tiempos = []
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                fn(texto)
+                tiempos.append(time.perf_counter() - t0)
+            mejor = min(tiempos)
+            fila[nombre] = {
+                "colores": len(colores),
+                "mejor_ms": mejor * 1000,
+                "mb_por_s": fila["bytes"] / mejor / 1e6 if mejor else None,
+            }
+        resultados[nombre_entrada] = fila
+
+    return {
+        "bench": "parser",
+        "parametros": {"lines": args.lines, "repeat": args.repeat, "seed": args.seed},
+        "resultados": resultados,
+    }
+
+
+# ======================================================================
+#                          ROUTER DE TÓPICOS
+# ======================================================================
+# Tráfico típico de la noria: mucha distancia/estado, algo de eco de
+# mandos y tópicos sin handler (chatbot, efectos).
+_TOPICOS_ROUTER = (
+    ("esp32/distance_cm", 40), ("esp32/status", 15), ("esp32/neopixel", 10),
+    ("esp32/dc_speed", 10), ("esp32/stepper_speed", 10), ("esp32/play_song", 3),
+    ("esp32/servo_door", 3), ("esp32/error", 2), ("esp32/chatbot_command", 4),
+    ("esp32/effect", 3),
+)
+
+
+def _legacy_router(contador):
+    """Cadena de actualizar_estado anterior (mismas comprobaciones, sin UI)."""
+    def despachar(topic, payload):
+        if topic == "esp32/error" or topic.endswith("/error"):
+            contador[0] += 1
+            return
+        if "esp32/status" in topic or topic.endswith("/status"):
+            contador[0] += 1
+        if "esp32/neopixel" in topic or "neopixel" in topic:
+            contador[0] += 1
+        elif "esp32/dc_speed" in topic or "dc_speed" in topic:
+            contador[0] += 1
+        elif "esp32/stepper_speed" in topic or "stepper_speed" in topic or "dc_speed" not in topic and "stepper" in topic:
+            contador[0] += 1
+        elif "esp32/play_song" in topic or "play_song" in topic or "music" in topic or "musica" in topic:
+            contador[0] += 1
+        elif "esp32/servo_door" in topic or "servo" in topic:
+            contador[0] += 1
+        elif "esp32/distance_cm" in topic or "sensor" in topic:
+            contador[0] += 1
+    return despachar
+
+
+def _nuevo_router(contador, extra_patterns):
+    from topic_router import TopicRouter
+
+    def handler(topic, payload):
+        contador[0] += 1
+
+    router = TopicRouter()
+    for topic in ("esp32/error", "esp32/status", "esp32/neopixel", "esp32/dc_speed",
+                  "esp32/stepper_speed", "esp32/play_song", "esp32/servo_door", "esp32/distance_cm"):
+        router.add(topic, handler)
+    router.add("esp32/+/error", handler)
+    router.add("esp32/+/status", handler)
+    # Patrones extra (p. ej. una flota de norias) que no coinciden con el tráfico
+    for i in range(extra_patterns):
+        router.add(f"noria/{i}/+/#", handler)
+    return router.route
+
+
+def bench_router(args):
+    rng = random.Random(args.seed)
+    topicos = [t for t, _ in _TOPICOS_ROUTER]
+    pesos = [w for _, w in _TOPICOS_ROUTER]
+    mensajes = rng.choices(topicos, weights=pesos, k=args.messages)
+
+    resultados = {}
+    for nombre in ("legacy", "router"):
+        contador = [0]
+        if nombre == "legacy":
+            despachar = _legacy_router(contador)
+        else:
+            despachar = _nuevo_router(contador, args.extra_patterns)
+
+        tiempos = []
+        for _ in range(args.repeat):
+            contador[0] = 0
+            t0 = time.perf_counter()
+            for topic in mensajes:
+                despachar(topic, "1")
+            tiempos.append(time.perf_counter() - t0)
+        mejor = min(tiempos)
+        resultados[nombre] = {
+            "handlers_llamados": contador[0],
+            "mejor_ms": mejor * 1000,
+            "mensajes_por_s": args.messages / mejor if mejor else None,
+            "ns_por_mensaje": mejor / args.messages * 1e9,
+        }
+
+    return {
+        "bench": "router",
+        "parametros": {"messages": args.messages, "repeat": args.repeat,
+                       "extra_patterns": args.extra_patterns, "seed": args.seed},
+        "resultados": resultados,
+    }
+
+
+# ======================================================================
+#                     BENCHMARK DE ARRANQUE DE LA INTERFAZ
+# ======================================================================
+# Lo que antes se importaba y construía antes de mostrar la ventana
+_IMPORTS_DIFERIDOS = "import requests, PIL.Image, PIL.ImageTk, numpy, async_color_api, palette_prefetch"
+
+
+def _tiempo_import(codigo):
+    script = f"import time; t = time.perf_counter(); {codigo}; print(time.perf_counter() - t)"
+    try:
+        salida = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, timeout=60)
+        return float(salida.stdout.strip().splitlines()[-1])
+    except Exception:
+        return None
+
+
+def bench_startup(args):
+    entorno = dict(os.environ, NORIA_STARTUP_BENCH="1")
+    carpeta = os.path.dirname(os.path.abspath(__file__))
+
+    corridas, errores = [], []
+    for _ in range(args.runs):
+        t0 = time.perf_counter()
+        try:
+            proc = subprocess.run([sys.executable, "interfaz.py"], cwd=carpeta, env=entorno,
+                                  capture_output=True, text=True, timeout=args.timeout)
+        except subprocess.TimeoutExpired:
+            errores.append("timeout")
+            continue
+        total = time.perf_counter() - t0
+
+        linea = next((l for l in proc.stdout.splitlines() if l.startswith("NORIA_STARTUP ")), None)
+        if linea is None:
+            errores.append((proc.stderr.strip().splitlines() or ["sin salida"])[-1])
+            continue
+        tiempos = json.loads(linea[len("NORIA_STARTUP "):])
+        tiempos["proceso_total"] = total
+        corridas.append(tiempos)
+
+    resultados = {}
+    for clave in ("importado", "primer_frame", "ia_lista", "mqtt_conectado", "proceso_total"):
+        valores = [c[clave] for c in corridas if clave in c]
+        if valores:
+            resultados[clave] = {
+                "p50_ms": percentil(valores, 0.50) * 1000,
+                "max_ms": max(valores) * 1000,
+                "corridas": len(valores),
+            }
+
+    diferidos = _tiempo_import(_IMPORTS_DIFERIDOS)
+    return {
+        "bench": "startup",
+        "parametros": {"runs": args.runs, "timeout": args.timeout},
+        "resultados": resultados,
+        "imports_diferidos_ms": diferidos * 1000 if diferidos is not None else None,
+        "errores": errores,
+    }
+
+
+# ======================================================================
+#                  BENCHMARK CONTRA LA ESP32 (ping / métricas)
+# ======================================================================
+def bench_esp32(args):
+    from config import AppConfig
+    from mqtt_transport import create_mqtt_transport
+    from topics import TOPIC_PING, TOPIC_PONG, TOPIC_METRICS
+
+    pendientes = {}          # payload -> t de envío
+    rtts, metricas = [], []
+    llegada = threading.Event()
+    conectado = threading.Event()
+
+    def on_message(topic, payload):
+        if topic == TOPIC_PONG:
+            t0 = pendientes.pop(payload, None)
+            if t0 is not None:
+                rtts.append(time.perf_counter() - t0)
+                llegada.set()
+        elif topic == TOPIC_METRICS:
+            try:
+                metricas.append(json.loads(payload))
+            except ValueError:
+                pass
+
+    config = AppConfig()
+    transporte = create_mqtt_transport(
+        config.mqtt, suffix="bench", on_message=on_message,
+        on_state=lambda ok: conectado.set() if ok else None,
+    )
+    transporte.subscribe(TOPIC_PONG, qos=0)
+    transporte.subscribe(TOPIC_METRICS, qos=0)
+    transporte.start()
+    try:
+        if not conectado.wait(args.timeout):
+            return {"bench": "esp32", "error": "sin conexión al broker"}
+
+        perdidos = 0
+        for i in range(args.pings):
+            payload = f"{i}-{random.random()}".encode()
+            llegada.clear()
+            pendientes[payload] = time.perf_counter()
+            transporte.publish(TOPIC_PING, payload, qos=0)
+            if not llegada.wait(args.timeout):
+                pendientes.pop(payload, None)
+                perdidos += 1
+            time.sleep(args.interval_ms / 1000)
+
+        fin = time.time() + args.metrics_wait
+        while time.time() < fin and not metricas:
+            time.sleep(0.1)
+    finally:
+        transporte.stop()
+
+    return {
+        "bench": "esp32",
+        "parametros": {"pings": args.pings, "interval_ms": args.interval_ms, "broker": config.mqtt.BROKER},
+        "ping": dict(resumen_latencias(rtts), recibidos=len(rtts), perdidos=perdidos),
+        "metricas_esp32": metricas,
+    }
+
+
+# ======================================================================
+#                                 CLI
+# ======================================================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks de la Noria")
+    parser.add_argument("--output", help="archivo JSON de salida (por defecto stdout)")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    p = sub.add_parser("llm", help="clientes de colores contra un LLM falso local")
+    p.add_argument("--clients", nargs="+", choices=("gemini", "chatgpt"), default=["gemini", "chatgpt"])
+    p.add_argument("--requests", type=int, default=200)
+    p.add_argument("--concurrency", type=int, default=4)
+    p.add_argument("--latency-ms", type=float, default=50.0)
+    p.add_argument("--jitter-ms", type=float, default=20.0)
+    p.add_argument("--error-rate", type=float, default=0.0)
+    p.add_argument("--shape", choices=SHAPES + ("mixed",), default="lines")
+    p.add_argument("--n-colors", type=int, default=5)
+    p.add_argument("--max-retries", type=int, default=0)
+    p.add_argument("--mem-calls", type=int, default=20)
+    p.add_argument("--seed", type=int, default=1234)
+    p.set_defaults(func=bench_llm)
+
+    p = sub.add_parser("parser", help="parser de colores nuevo vs. anteriores")
+    p.add_argument("--lines", type=int, default=20000)
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--seed", type=int, default=1234)
+    p.set_defaults(func=bench_parser)
+
+    p = sub.add_parser("router", help="despacho de mensajes MQTT entrantes por tópico")
+    p.add_argument("--messages", type=int, default=200000)
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--extra-patterns", type=int, default=0)
+    p.add_argument("--seed", type=int, default=1234)
+    p.set_defaults(func=bench_router)
+
+    p = sub.add_parser("startup", help="tiempo hasta el primer fotograma de interfaz.py")
+    p.add_argument("--runs", type=int, default=5)
+    p.add_argument("--timeout", type=float, default=30.0)
+    p.set_defaults(func=bench_startup)
+
+    p = sub.add_parser("esp32", help="latencia ping/pong y métricas del firmware")
+    p.add_argument("--pings", type=int, default=50)
+    p.add_argument("--interval-ms", type=float, default=100.0)
+    p.add_argument("--timeout", type=float, default=5.0)
+    p.add_argument("--metrics-wait", type=float, default=12.0)
+    p.set_defaults(func=bench_esp32)
+
+    args = parser.parse_args(argv)
+    resultado = args.func(args)
+    resultado["commit"] = git_commit()
+    resultado["python"] = sys.version.split()[0]
+    resultado["fecha"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(texto + "\n")
+    else:
+        print(texto)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,76 @@
 import json
-import requests
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http_transport import get_shared_transport
+from local_palette import LocalPaletteEngine
+from color_parser import parse_colors
 
 class ChatGPTColorAPI:
-    def __init__(self, api_key, model="gpt-4o-mini"):
+    def __init__(self, api_key, model="gpt-4o-mini", transport=None, mode="fallback", n_local=3):
         self.api_key = api_key
         self.model = model
         self.url = "https://api.openai.com/v1/chat/completions"
+        # Sesión HTTP compartida (keep-alive, timeouts, reintentos)
+        self.transport = transport or get_shared_transport()
+        # "llm" = rojo si falla, "fallback" = paleta local si falla, "local" = sin red,
+        # "local_first" = paleta local al instante y la de la IA por on_refine
+        self.mode = mode
+        self.n_local = n_local
+        self.local = LocalPaletteEngine()
+        self._refine_executor = None   # solo lo usa local_first: se crea al primer uso
+        self._refine_lock = threading.Lock()
+
+    def _local_colors(self, prompt, n_colors=None):
+        n = n_colors or self.n_local
+        return [f"{r},{g},{b}" for (r, g, b) in self.local.generate(prompt, n)]
+
+    def _fallback(self, prompt, mode, n_colors=None):
+        if mode == "llm":
+            return ["255,0,0"]  # fallback: rojo
+        return self._local_colors(prompt, n_colors)
+
+    def get_colors_from_prompt(self, prompt, n_colors=None, use_cache=True, refresh=False,
+                               mode=None, on_refine=None):
+        """
+        Misma firma y modos que GeminiColorAPI (mode por defecto: self.mode).
+        En "local_first" devuelve la paleta local y pide la de la IA en
+        segundo plano; on_refine(colors) la recibe si llega.
+        Este cliente no tiene caché: cada llamada va a la red, así que
+        use_cache=False y refresh=True ya se cumplen siempre.
+        """
+        mode = mode or self.mode
+        if mode == "local":
+            return self._local_colors(prompt, n_colors)
+
+        if mode == "local_first":
+            self._refinador().submit(self._refinar, prompt, n_colors, on_refine)
+            return self._local_colors(prompt, n_colors)
+
+        colors = self._fetch_colors(prompt, n_colors)
+        if not colors:
+            return self._fallback(prompt, mode, n_colors)
+        return colors
+
+    def _refinador(self):
+        with self._refine_lock:
+            if self._refine_executor is None:
+                self._refine_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="refinar-gpt")
+            return self._refine_executor
+
+    def _refinar(self, prompt, n_colors, on_refine):
+        colors = self._fetch_colors(prompt, n_colors)
+        if colors and on_refine is not None:
+            try:
+                on_refine(colors)
+            except Exception as e:
+                print("⚠️ Error en on_refine:", e)
+
+    def _fetch_colors(self, prompt, n_colors=None):
+        """Llama a OpenAI. Devuelve ["R,G,B", ...] (vacía si no hay colores) o None si falla."""
+        pedido = f"Convierte este texto en colores RGB: {prompt}"
+        if n_colors:
+            pedido = f"Convierte este texto en exactamente {n_colors} colores RGB, uno por línea: {prompt}"
 
-    def get_colors_from_prompt(self, prompt):
         headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self.api_key}"
@@ -17,41 +80,24 @@ class ChatGPTColorAPI:
             "model": self.model,
             "messages": [
                 {"role": "system", "content": "Devuélveme colores en formato 'R,G,B'."},
-                {"role": "user", "content": f"Convierte este texto en colores RGB: {prompt}"}
+                {"role": "user", "content": pedido}
             ],
             "max_tokens": 50,
             "temperature": 0.3
         }
 
         try:
-            response = requests.post(self.url, headers=headers, json=payload)
+            response = self.transport.post(self.url, headers=headers, json=payload)
             response.raise_for_status()
             result = response.json()
 
             raw_text = result["choices"][0]["message"]["content"]
 
-            # Extraer líneas que tengan formato R,G,B
-            colors = []
-            for line in raw_text.splitlines():
-                line = line.strip()
-                if "," in line:
-                    parts = line.split(",")
-                    if len(parts) == 3:
-                        try:
-                            r = int(parts[0])
-                            g = int(parts[1])
-                            b = int(parts[2])
-
-                            if 0 <= r <= 255 and 0 <= g <= 255 and 0 <= b <= 255:
-                                colors.append(f"{r},{g},{b}")
-                        except:
-                            pass
-
-            if not colors:
-                return ["255,0,0"]  # fallback: rojo
+            # Extraer todos los colores (R,G,B, rgb(), hex, JSON...) en una pasada
+            colors = [f"{r},{g},{b}" for (r, g, b) in parse_colors(raw_text)]
 
             return colors
 
         except Exception as e:
             print("Error llamando a ChatGPT:", e)
-            return ["255,0,0"]  # fallback
+            return None
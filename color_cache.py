@@ -0,0 +1,144 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class ColorCache:
+    """
+    Caché LRU con TTL para las paletas generadas por la IA.
+
+    - Clave: (prompt, n_colors, modelo, temperatura)
+    - Tamaño acotado: al superar max_entries se expulsa la menos usada.
+    - Las entradas caducan tras ttl segundos.
+    - Se respalda en un archivo JSON que se carga al arrancar.
+    """
+
+    VERSION = 1
+
+    def __init__(self, max_entries=128, ttl=7 * 24 * 3600, path=None):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = ttl
+        self.path = path
+
+        self._data = OrderedDict()   # clave -> (timestamp, colores)
+        self._lock = threading.Lock()
+
+        # Contadores
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        if self.path:
+            self._cargar()
+
+    # -------------------------------------------------------------
+    @staticmethod
+    def make_key(prompt, n_colors, model, temperature):
+        """Clave serializable (string) para poder guardarla en JSON."""
+        return json.dumps([prompt, int(n_colors), model, float(temperature)], ensure_ascii=False)
+
+    def _caducada(self, ts, ahora):
+        return self.ttl is not None and (ahora - ts) > self.ttl
+
+    # -------------------------------------------------------------
+    def get(self, key):
+        """Devuelve la lista de colores [(r,g,b), ...] o None si no hay entrada válida."""
+        ahora = time.time()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+
+            ts, colores = item
+            if self._caducada(ts, ahora):
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return [tuple(c) for c in colores]
+
+    def put(self, key, colores):
+        with self._lock:
+            self._data[key] = (time.time(), [tuple(int(v) for v in c) for c in colores])
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+        self._guardar()
+
+    def invalidate(self, key=None):
+        """Elimina una entrada concreta, o toda la caché si key es None."""
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+        self._guardar()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entradas": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": (self.hits / total) if total else 0.0,
+            }
+
+    # -------------------------------------------------------------
+    # PERSISTENCIA EN DISCO
+    # -------------------------------------------------------------
+    def _cargar(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            print("⚠️ No se pudo leer la caché de colores:", e)
+            return
+
+        if not isinstance(data, dict) or data.get("version") != self.VERSION:
+            return
+
+        ahora = time.time()
+        # Las entradas se guardan de la menos a la más usada recientemente
+        for entry in data.get("entries", []):
+            try:
+                key, ts, colores = entry
+                if self._caducada(ts, ahora):
+                    continue
+                self._data[key] = (float(ts), [tuple(int(v) for v in c) for c in colores])
+            except Exception:
+                continue
+
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def _guardar(self):
+        if not self.path:
+            return
+
+        with self._lock:
+            snapshot = {
+                "version": self.VERSION,
+                "entries": [[k, ts, [list(c) for c in colores]] for k, (ts, colores) in self._data.items()],
+            }
+
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, ensure_ascii=False)
+            os.replace(tmp, self.path)   # escritura atómica
+        except Exception as e:
+            print("⚠️ No se pudo guardar la caché de colores:", e)
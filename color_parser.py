@@ -0,0 +1,175 @@
+import re
+
+# ============================================================
+# Colores con nombre (español / inglés)
+# ============================================================
+NAMED_COLORS = {
+    "rojo": (255, 0, 0), "red": (255, 0, 0),
+    "verde": (0, 128, 0), "green": (0, 128, 0),
+    "lima": (0, 255, 0), "lime": (0, 255, 0),
+    "azul": (0, 0, 255), "blue": (0, 0, 255),
+    "amarillo": (255, 255, 0), "yellow": (255, 255, 0),
+    "naranja": (255, 165, 0), "orange": (255, 165, 0),
+    "morado": (128, 0, 128), "purple": (128, 0, 128),
+    "violeta": (238, 130, 238), "violet": (238, 130, 238),
+    "rosa": (255, 192, 203), "pink": (255, 192, 203),
+    "magenta": (255, 0, 255), "fucsia": (255, 0, 255), "fuchsia": (255, 0, 255),
+    "cian": (0, 255, 255), "cyan": (0, 255, 255), "turquesa": (64, 224, 208), "turquoise": (64, 224, 208),
+    "blanco": (255, 255, 255), "white": (255, 255, 255),
+    "negro": (0, 0, 0), "black": (0, 0, 0),
+    "gris": (128, 128, 128), "gray": (128, 128, 128), "grey": (128, 128, 128),
+    "marron": (139, 69, 19), "marrón": (139, 69, 19), "brown": (139, 69, 19),
+    "dorado": (255, 215, 0), "gold": (255, 215, 0),
+    "plateado": (192, 192, 192), "silver": (192, 192, 192),
+    "celeste": (135, 206, 235), "indigo": (75, 0, 130), "índigo": (75, 0, 130),
+}
+
+
+def _trie_regex(palabras):
+    """
+    Alternancia agrupada por prefijos (r(?:ojo|osa|ed)|...): el motor
+    descarta casi todas las posiciones con solo mirar la primera letra.
+    """
+    trie = {}
+    for palabra in palabras:
+        nodo = trie
+        for c in palabra:
+            nodo = nodo.setdefault(c, {})
+        nodo[""] = {}
+
+    def construir(nodo):
+        ramas = []
+        fin = "" in nodo
+        for c in sorted(k for k in nodo if k):
+            ramas.append(re.escape(c) + construir(nodo[c]))
+        if not ramas:
+            return ""
+        if len(ramas) == 1 and not fin:
+            return ramas[0]
+        return "(?:" + "|".join(ramas) + ")" + ("?" if fin else "")
+
+    return construir(trie)
+
+
+# Un solo patrón con todas las alternativas: se recorre el texto UNA vez.
+# El texto se pasa a minúsculas antes (más rápido que IGNORECASE).
+# Grupos (findall devuelve una tupla con todos; solo la rama que coincidió
+# trae texto):
+#   1-3  etiquetado "r: 255, g: 0, b: 0" / objeto {"r":..,"g":..,"b":..}
+#   4-6  rgb()/rgba()      7-9  array [r,g,b]      10  hexadecimal
+#  11-13 "R,G,B" / "R; G; B"      14-16 "R G B" (en una misma línea)
+#  17    nombre
+# Un triplete no puede ir pegado a letras, otro número, un signo menos o
+# unos ":" (horas); sí puede acabar en un punto final ("10, 20, 30.").
+_COLOR_RE = re.compile(
+    r"""
+      (?<!\w)"?r"?[ \t]*[:=][ \t]*(\d+)[ \t]*[,;]?[ \t]*"?g"?[ \t]*[:=][ \t]*(\d+)[ \t]*[,;]?[ \t]*"?b"?[ \t]*[:=][ \t]*(\d+)
+    | rgba?\(\s*(\d+(?:\.\d+)?%?)\s*[,\s]\s*(\d+(?:\.\d+)?%?)\s*[,\s]\s*(\d+(?:\.\d+)?%?)\s*(?:[,/]\s*[\d.]+%?\s*)?\)
+    | \[\s*(\d+)\s*,\s*(\d+)\s*,\s*(\d+)\s*\]
+    | \#([0-9a-f]{6}|[0-9a-f]{3})(?![0-9a-f])
+    | (?<![\w.#:-])(\d+)[ \t]*[,;][ \t]*(\d+)[ \t]*[,;][ \t]*(\d+)(?![\w%]|\.\d|[ \t]*[,;][ \t]*\d)
+    | (?<![\w.#:-])(?<!\d[ \t])(\d+)[ \t]+(\d+)[ \t]+(\d+)(?![\w%]|\.\d|[ \t]*[,;]?[ \t]*\d)
+    | \b("""
+    + _trie_regex(NAMED_COLORS)
+    + r""")\b
+    """,
+    re.VERBOSE,
+)
+
+# "0".."255" -> int sin llamar a int() por canal (el caso normal)
+_CANAL = {str(i): i for i in range(256)}
+
+
+def _canal(texto):
+    v = _CANAL.get(texto)
+    return v if v is not None else min(255, int(texto))
+
+
+def _canal_css(texto):
+    """Canal de rgb(): entero o porcentaje, limitado a 0-255."""
+    if texto.endswith("%"):
+        return min(255, round(float(texto[:-1]) * 2.55))
+    return min(255, int(float(texto)))
+
+
+def _extraer(text, limit=None):
+    """(colores numéricos, colores con nombre) de un texto, en orden."""
+    colores = []
+    nombres = []
+    if not text:
+        return colores, nombres
+
+    append = colores.append
+    canal = _CANAL.get
+    for (e1, e2, e3, c1, c2, c3, a1, a2, a3, hx,
+         t1, t2, t3, s1, s2, s3, nombre) in _COLOR_RE.findall(text.lower()):
+        if t1:
+            # camino caliente: una línea "R,G,B" con canales 0-255
+            r, g, b = canal(t1), canal(t2), canal(t3)
+            if r is None or g is None or b is None:
+                r, g, b = _canal(t1), _canal(t2), _canal(t3)
+            append((r, g, b))
+        elif nombre:
+            nombres.append(NAMED_COLORS[nombre])
+        elif hx:
+            if len(hx) == 3:
+                hx = hx[0] * 2 + hx[1] * 2 + hx[2] * 2
+            append((int(hx[0:2], 16), int(hx[2:4], 16), int(hx[4:6], 16)))
+        elif c1:
+            append((_canal_css(c1), _canal_css(c2), _canal_css(c3)))
+        elif a1:
+            append((_canal(a1), _canal(a2), _canal(a3)))
+        elif s1:
+            append((_canal(s1), _canal(s2), _canal(s3)))
+        else:
+            append((_canal(e1), _canal(e2), _canal(e3)))
+
+    if limit is not None:
+        del colores[limit:]
+    return colores, nombres
+
+
+def parse_colors(text, limit=None):
+    """
+    Extrae TODOS los colores de un texto en una sola pasada.
+
+    Acepta "R,G,B", "R; G; B", "R G B", "R: .., G: .., B: ..", rgb()/rgba()
+    (con espacios o %), arrays JSON [r,g,b], objetos {"r":..,"g":..,"b":..},
+    hexadecimal #RRGGBB / #RGB y colores con nombre. Los valores se limitan
+    a 0-255; los negativos ("-5,2,3") y las horas ("12:30, 5,6") no son colores.
+
+    Los nombres solo cuentan si el texto no trae ningún color numérico:
+    en "255,0,0 - Rojo intenso" o "paleta roja y azul:" son comentarios,
+    no colores aparte.
+    Devuelve [(r, g, b), ...] en el orden en que aparecen.
+    """
+    colores, nombres = _extraer(text, limit)
+    if colores:
+        return colores
+    return nombres if limit is None else nombres[:limit]
+
+
+class ColorLineParser:
+    """
+    parse_colors para texto que llega línea a línea (streaming, secciones),
+    con la misma regla: los nombres solo valen si no hay ningún color
+    numérico. Las líneas con solo nombres se guardan hasta flush().
+    """
+
+    def __init__(self):
+        self.numericos = False
+        self._nombres = []
+
+    def feed(self, line):
+        colores, nombres = _extraer(line)
+        if colores:
+            self.numericos = True
+            self._nombres = []
+            return colores
+        if not self.numericos:
+            self._nombres.extend(nombres)
+        return []
+
+    def flush(self):
+        nombres, self._nombres = self._nombres, []
+        return nombres
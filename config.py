@@ -17,14 +17,155 @@ class MQTTConfig:
         self.USE_TLS = False
         self.QOS = 1
 
+        # Sesión persistente y reconexión (ver mqtt_transport.py)
+        # Sin NORIA_MQTT_CLIENT_ID el broker asigna un id aleatorio y la
+        # sesión es limpia: en un broker público un id derivado del nombre
+        # del equipo ("raspberrypi"...) choca con el de otros usuarios.
+        # Con un id propio, la sesión es persistente salvo NORIA_MQTT_CLEAN_SESSION=1.
+        self.CLIENT_ID = os.getenv("NORIA_MQTT_CLIENT_ID", "")
+        self.CLEAN_SESSION = not self.CLIENT_ID or os.getenv("NORIA_MQTT_CLEAN_SESSION", "") not in ("", "0")
+        self.KEEPALIVE = 60
+        self.RECONNECT_MIN = 1      # segundos, se duplica en cada intento...
+        self.RECONNECT_MAX = 60     # ...hasta este máximo
+        self.OFFLINE_QUEUE = 200    # mensajes guardados sin conexión
+
+        # Modo flota de MQTTClientPC: <TOPIC_BASE>/<id>/<sub>
+        # (el daemon lo activa con NORIA_FLEET=1; cada ESP32 necesita su
+        # DEVICE_ID en noria_esp32.py)
+        self.FLEET_ENABLED = os.getenv("NORIA_FLEET", "") not in ("", "0")
+        self.FLEET_SHARDS = 4
+        self.FLEET_GROUP_MODE = "broker"   # "broker" | "per_device"
+
     def resumen(self):
         return {
             "Broker": self.BROKER,
             "Puerto": self.PORT,
             "TLS": self.USE_TLS,
             "QOS": self.QOS,
+            "Client ID": self.CLIENT_ID or "(asignado por el broker)",
+            "Sesión persistente": not self.CLEAN_SESSION,
             "Tópico control": self.TOPIC_CONTROL,
             "Tópico estado": self.TOPIC_ESTADO,
+            "Flota": f"{self.FLEET_SHARDS} shards, grupos por {self.FLEET_GROUP_MODE}"
+                     if self.FLEET_ENABLED else "No",
+        }
+
+
+# ============================================================
+# Clase: PublishConfig
+# ============================================================
+class PublishConfig:
+    """Publicaciones salientes (ver publish_scheduler.PublishCoalescer)."""
+    def __init__(self):
+        # Mensajes/s máximos por tópico (el último valor siempre se envía)
+        self.DEFAULT_RATE = 10.0
+        self.RATES = {
+            "esp32/neopixel": 20.0,
+        }
+        # Tópicos que NUNCA se fusionan (cada mensaje cuenta)
+        self.PASSTHROUGH = ["esp32/chatbot_command"]
+        # Tópicos que comparten hueco: el último mensaje de cualquiera gana
+        # (color fijo y efecto pintan el mismo anillo de LEDs)
+        self.SLOTS = {
+            "esp32/neopixel": "leds",
+            "esp32/effect": "leds",
+        }
+
+    def resumen(self):
+        return {
+            "Ritmo por defecto (msg/s)": self.DEFAULT_RATE,
+            "Ritmos por tópico": self.RATES,
+            "Sin fusionar": self.PASSTHROUGH,
+            "Huecos compartidos": self.SLOTS,
+        }
+
+
+# ============================================================
+# Clase: UIConfig
+# ============================================================
+class UIConfig:
+    """Ritmo de refresco de la interfaz (ver inbound_queue.InboundQueue)."""
+    def __init__(self):
+        # Los mensajes MQTT entrantes se aplican a la UI una vez por fotograma
+        self.FRAME_MS = 33
+        # Tópicos cuyos mensajes se aplican todos (no solo el último):
+        # cada error de la ESP32 es distinto y no debe perderse
+        self.INBOX_PASSTHROUGH = ["esp32/error"]
+        self.INBOX_MAX_QUEUE = 1000
+
+    def resumen(self):
+        return {
+            "Fotograma UI (ms)": self.FRAME_MS,
+            "Sin fusionar": self.INBOX_PASSTHROUGH,
+            "Cola máxima": self.INBOX_MAX_QUEUE,
+        }
+
+
+# ============================================================
+# Clase: TelemetryConfig
+# ============================================================
+class TelemetryConfig:
+    """Telemetría del sensor de distancia (ver telemetry.py)."""
+    def __init__(self):
+        self.RAW_CAPACITY = 20000        # muestras crudas en memoria (fijo)
+        self.BUCKET_SECONDS = 1.0        # una cubeta min/max/media por segundo
+        self.MAX_BUCKETS = 600           # 10 minutos de cubetas
+        self.CHART_BUCKETS = 120         # la gráfica muestra los últimos 2 minutos
+        self.CHART_MAX_CM = 200.0        # escala vertical fija
+        # Paso de pasajero: la distancia baja de THRESHOLD y vuelve a subir
+        self.PASSENGER_THRESHOLD_CM = 30.0
+        self.PASSENGER_HYSTERESIS_CM = 5.0
+
+    def resumen(self):
+        return {
+            "Muestras crudas": self.RAW_CAPACITY,
+            "Cubeta (s)": self.BUCKET_SECONDS,
+            "Cubetas en gráfica": self.CHART_BUCKETS,
+            "Umbral pasajero (cm)": self.PASSENGER_THRESHOLD_CM,
+        }
+
+
+# ============================================================
+# Clase: DaemonConfig
+# ============================================================
+class DaemonConfig:
+    """API local del daemon sin interfaz (noria_daemon.py)."""
+    def __init__(self):
+        self.HOST = "127.0.0.1"          # solo local
+        self.PORT = int(os.getenv("NORIA_DAEMON_PORT", "8765"))
+        # Si se define, los clientes deben enviar "Authorization: Bearer <token>"
+        self.TOKEN = os.getenv("NORIA_DAEMON_TOKEN", "")
+        self.MAX_BODY = 64 * 1024        # bytes
+        self.IDLE_TIMEOUT = 30           # segundos sin petición antes de cerrar la conexión
+
+    def resumen(self):
+        return {
+            "Dirección": f"{self.HOST}:{self.PORT}",
+            "Token": "Configurado" if self.TOKEN else "No",
+        }
+
+
+# ============================================================
+# Clase: LedConfig
+# ============================================================
+class LedConfig:
+    """Anillo NeoPixel de la noria."""
+    def __init__(self):
+        self.NUM_LEDS = 16
+        # True: se envían tramas binarias por LED (ver neopixel_protocol.py)
+        # False: texto "R,G,B" (un solo color en todo el anillo)
+        self.BINARY_FRAMES = True
+        # Efecto animado en la ESP32 para las paletas de la IA
+        # (gradient, chase, breathing, rainbow, palette); None = imagen fija
+        self.EFFECT = os.getenv("NORIA_LED_EFFECT", "gradient") or None
+        self.EFFECT_SPEED = 40   # 0-100
+
+    def resumen(self):
+        return {
+            "LEDs": self.NUM_LEDS,
+            "Tramas binarias": self.BINARY_FRAMES,
+            "Efecto": self.EFFECT,
+            "Velocidad efecto": self.EFFECT_SPEED,
         }
 
 
@@ -47,22 +188,157 @@ class GeminiConfig:
 
         self.TEMPERATURE = 0.3
 
+        # Modo de paleta: "llm" | "fallback" | "local" | "local_first"
+        #   fallback    -> IA y, si falla, paleta local (en vez de rojo)
+        #   local       -> solo motor local, sin red
+        #   local_first -> paleta local al instante y refinado con la IA
+        self.PALETTE_MODE = os.environ.get("NORIA_PALETTE_MODE", "fallback")
+        # Espacio de color para las armonías locales: "oklab" | "hsv"
+        self.LOCAL_SPACE = "oklab"
+        # Streaming SSE: el primer color se publica en cuanto llega
+        self.STREAM = True
+        # Imprime el cuerpo completo de cada respuesta (solo para depurar)
+        self.DEBUG_RAW = os.environ.get("NORIA_DEBUG_RAW", "") not in ("", "0")
+
     def resumen(self):
         return {
             "Modelo": self.MODEL,
             "Temperatura": self.TEMPERATURE,
+            "Modo paleta": self.PALETTE_MODE,
             "API_KEY definida": bool(self.GEMINI_API_KEY),
         }
 
 
+# ============================================================
+# Clase: OpenAIConfig
+# ============================================================
+class OpenAIConfig:
+    """Configuración para la API de OpenAI (ChatGPT), proveedor secundario."""
+    def __init__(self, api_key=None):
+        self.OPENAI_API_KEY = api_key or os.environ.get("OPENAI_API_KEY", "")
+        self.MODEL = "gpt-4o-mini"
+
+    def resumen(self):
+        return {
+            "Modelo": self.MODEL,
+            "API_KEY definida": bool(self.OPENAI_API_KEY),
+        }
+
+
+# ============================================================
+# Clase: HedgeConfig
+# ============================================================
+class HedgeConfig:
+    """Hedging OpenRouter -> OpenAI para recortar la latencia de cola."""
+    def __init__(self):
+        # Solo tiene efecto si hay OPENAI_API_KEY
+        self.ENABLED = True
+        self.PERCENTILE = 0.95        # plazo = p95 de latencia del primario
+        self.MIN_SAMPLES = 5          # hasta entonces se usa DEFAULT_DEADLINE
+        self.DEFAULT_DEADLINE = 1.5   # segundos
+        self.MIN_DEADLINE = 0.2       # segundos
+
+    def resumen(self):
+        return {
+            "Activo": self.ENABLED,
+            "Percentil": self.PERCENTILE,
+            "Plazo inicial (s)": self.DEFAULT_DEADLINE,
+        }
+
+
+# ============================================================
+# Clase: CacheConfig
+# ============================================================
+class CacheConfig:
+    """Configuración de la caché de paletas (LRU + TTL, respaldada en disco)."""
+    def __init__(self):
+        self.ENABLED = True
+        self.MAX_ENTRIES = 128
+        self.TTL_SECONDS = 7 * 24 * 3600   # una semana
+
+        # Archivo JSON donde se guarda la caché entre ejecuciones
+        self.PATH = os.environ.get(
+            "NORIA_CACHE_PATH",
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), ".noria_cache", "paletas.json")
+        )
+
+    def resumen(self):
+        return {
+            "Activa": self.ENABLED,
+            "Máx. entradas": self.MAX_ENTRIES,
+            "TTL (s)": self.TTL_SECONDS,
+            "Archivo": self.PATH,
+        }
+
+
+# ============================================================
+# Clase: HTTPConfig
+# ============================================================
+class HTTPConfig:
+    """Transporte HTTP compartido por los clientes de IA."""
+    def __init__(self):
+        self.POOL_SIZE = 4
+        self.CONNECT_TIMEOUT = 3.05   # segundos
+        self.READ_TIMEOUT = 20.0      # segundos
+        self.MAX_RETRIES = 2          # reintentos ante 429/5xx o fallo de red
+        self.BACKOFF_BASE = 0.5       # segundos (se duplica en cada intento)
+        self.BACKOFF_MAX = 8.0
+
+    def resumen(self):
+        return {
+            "Pool": self.POOL_SIZE,
+            "Timeout conexión": self.CONNECT_TIMEOUT,
+            "Timeout lectura": self.READ_TIMEOUT,
+            "Reintentos": self.MAX_RETRIES,
+        }
+
+
+# ============================================================
+# Clase: PrefetchConfig
+# ============================================================
+class PrefetchConfig:
+    """Búfer de paletas precargadas para que las luces enciendan al instante."""
+    def __init__(self):
+        self.ENABLED = True
+        self.PROMPTS = ["Ilumina la noria con colores vibrantes"]
+        self.N_COLORS = 3
+        self.DEPTH = 4                # paletas listas por prompt
+        self.LOW_WATER = 2            # al bajar de aquí se rellena
+        self.REFILL_CONCURRENCY = 1   # peticiones de relleno simultáneas
+        self.MAX_AGE_SECONDS = 3600   # paletas más viejas se descartan
+        self.RETRY_BACKOFF_SECONDS = 5.0        # espera tras un relleno fallido...
+        self.RETRY_BACKOFF_MAX_SECONDS = 300.0  # ...que se dobla hasta este tope
+
+    def resumen(self):
+        return {
+            "Activo": self.ENABLED,
+            "Prompts": len(self.PROMPTS),
+            "Profundidad": self.DEPTH,
+            "Nivel mínimo": self.LOW_WATER,
+            "Concurrencia": self.REFILL_CONCURRENCY,
+            "Máx. antigüedad (s)": self.MAX_AGE_SECONDS,
+            "Backoff tras fallo (s)": f"{self.RETRY_BACKOFF_SECONDS}-{self.RETRY_BACKOFF_MAX_SECONDS}",
+        }
+
+
 # ============================================================
 # Clase principal
 # ============================================================
 class AppConfig:
     def __init__(self):
         self.mqtt = MQTTConfig()
+        self.leds = LedConfig()
+        self.publish = PublishConfig()
+        self.ui = UIConfig()
+        self.telemetry = TelemetryConfig()
+        self.daemon = DaemonConfig()
         # Pasar explícitamente la API key si se desea inicializar desde el entorno
         self.gemini = GeminiConfig()
+        self.openai = OpenAIConfig()
+        self.hedge = HedgeConfig()
+        self.cache = CacheConfig()
+        self.http = HTTPConfig()
+        self.prefetch = PrefetchConfig()
 
 # Si quieres usar un solo objeto de configuración global:
 app_config = AppConfig()
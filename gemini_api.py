@@ -1,6 +1,13 @@
 import re
-import requests
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from config import AppConfig, app_config
+from color_cache import ColorCache
+from http_transport import HTTPTransport, get_shared_transport
+from local_palette import LocalPaletteEngine
+from color_parser import ColorLineParser, parse_colors
 
 
 class GeminiColorAPI:
@@ -15,7 +22,8 @@ class GeminiColorAPI:
     }
     """
 
-    def __init__(self, config: AppConfig = app_config):
+    def __init__(self, config: AppConfig = app_config, cache: ColorCache = None,
+                 transport: HTTPTransport = None):
 
         self.api_key = config.gemini.GEMINI_API_KEY
         self.model = "google/gemini-2.5-flash"
@@ -23,30 +31,139 @@ class GeminiColorAPI:
 
         self.url = "https://openrouter.ai/api/v1/chat/completions"
 
+        # Caché LRU + TTL de paletas (None = desactivada)
+        if cache is None and config.cache.ENABLED:
+            cache = ColorCache(
+                max_entries=config.cache.MAX_ENTRIES,
+                ttl=config.cache.TTL_SECONDS,
+                path=config.cache.PATH,
+            )
+        self.cache = cache
+
+        # Sesión HTTP compartida (keep-alive, timeouts, reintentos)
+        self.transport = transport or get_shared_transport(config)
+
+        # Motor de paletas local: modo primario, respaldo o respuesta inmediata
+        self.mode = config.gemini.PALETTE_MODE
+        self.debug_raw = config.gemini.DEBUG_RAW
+        self.local = LocalPaletteEngine(space=config.gemini.LOCAL_SPACE)
+        # Pool de refinado de local_first: se crea al primer uso
+        self._refine_workers = config.http.POOL_SIZE
+        self._refine_executor = None
+        self._refine_lock = threading.Lock()
+
         print(f"🤖 OpenRouter inicializado con modelo: {self.model}")
 
     # -------------------------------------------------------------
-    def _parse_color(self, text):
-        """Convierte cualquier formato a (r,g,b)"""
+    def _cache_key(self, prompt, n_colors):
+        return ColorCache.make_key(prompt, n_colors, self.model, self.temperature)
+
+    def invalidate_cache(self, prompt=None, n_colors=5):
+        """Invalida la entrada de un prompt, o toda la caché si prompt es None."""
+        if self.cache is None:
+            return
+        self.cache.invalidate(None if prompt is None else self._cache_key(prompt, n_colors))
 
-        if isinstance(text, (list, tuple)) and len(text) == 3:
-            return tuple(int(v) for v in text)
+    def cache_stats(self):
+        return self.cache.stats() if self.cache is not None else {}
 
-        if isinstance(text, dict) and all(k in text for k in ("r", "g", "b")):
-            return (int(text["r"]), int(text["g"]), int(text["b"]))
+    # -------------------------------------------------------------
+    def get_colors_from_prompt(self, prompt, n_colors=5, use_cache=True, refresh=False,
+                               mode=None, on_refine=None):
+        """
+        use_cache=False -> ignora la caché por completo (ni lee ni guarda).
+        refresh=True    -> no lee de la caché pero guarda la respuesta nueva.
+
+        mode (por defecto config.gemini.PALETTE_MODE):
+          "llm"         -> solo IA (si falla: rojo, como antes)
+          "fallback"    -> IA; si falla, paleta del motor local
+          "local"       -> solo motor local, sin red
+          "local_first" -> responde al instante con la paleta local y la
+                           refina con la IA en segundo plano: on_refine(data)
+                           recibe la paleta de la IA (que queda en caché)
+        """
+        mode = mode or self.mode
+
+        if mode == "local":
+            return self.local.get_colors_from_prompt(prompt, n_colors)
+
+        if mode == "local_first":
+            cached = self._cached_colors(prompt, n_colors, use_cache, refresh)
+            if cached is not None:
+                return cached
+            self._refinador().submit(self._refinar, prompt, n_colors, use_cache, on_refine, mode)
+            return self.local.get_colors_from_prompt(prompt, n_colors)
+
+        data = self._cached_colors(prompt, n_colors, use_cache, refresh)
+        if data is None:
+            data = self._llm_colors(prompt, n_colors, use_cache, mode)
+        if data is not None:
+            return data
+
+        return self._fallback_colors(prompt, n_colors, mode)
+
+    def _fallback_colors(self, prompt, n_colors, mode):
+        """Paleta de respaldo. "fallback" marca que NO viene de la IA."""
+        if mode in ("fallback", "local_first"):
+            data = self.local.get_colors_from_prompt(prompt, n_colors)
+            data["fallback"] = True
+            return data
+        return {"colors": [{"r": 255, "g": 0, "b": 0}] * n_colors, "fallback": True}
+
+    def _refinador(self):
+        with self._refine_lock:
+            if self._refine_executor is None:
+                self._refine_executor = ThreadPoolExecutor(
+                    max_workers=self._refine_workers, thread_name_prefix="refinar"
+                )
+            return self._refine_executor
+
+    def _refinar(self, prompt, n_colors, use_cache, on_refine, mode="local_first"):
+        data = self._llm_colors(prompt, n_colors, use_cache, mode)
+        if data is not None and on_refine is not None:
+            try:
+                on_refine(data)
+            except Exception as e:
+                print("⚠️ Error en on_refine:", e)
+
+    def _cached_colors(self, prompt, n_colors, use_cache, refresh):
+        if self.cache is None or not use_cache or refresh:
+            return None
+        cached = self.cache.get(self._cache_key(prompt, n_colors))
+        if cached is None:
+            return None
+        return {"colors": [{"r": r, "g": g, "b": b} for (r, g, b) in cached], "source": "cache"}
+
+    def _llm_colors(self, prompt, n_colors, use_cache, mode=None):
+        """
+        Pide la paleta a la IA y la guarda en caché. None si falla.
+        Si faltan colores se completa con rojo en modo "llm" (como antes)
+        y con la paleta local en los demás modos.
+        """
+        resultado = self._fetch_colors(prompt, n_colors)
+        if resultado is None:
+            return None
+
+        # Solo se guardan respuestas completas (no las rellenadas con rojo)
+        if self.cache is not None and use_cache and len(resultado) >= n_colors:
+            self.cache.put(self._cache_key(prompt, n_colors), resultado)
+
+        # Si vienen menos de los necesarios → completar
+        if len(resultado) < n_colors:
+            if (mode or self.mode) == "llm":
+                resultado += [(255, 0, 0)] * (n_colors - len(resultado))
+            else:
+                resultado += self.local.generate(prompt, n_colors)[len(resultado):]
 
-        if isinstance(text, str):
-            cleaned = text.lower().strip()
-            cleaned = cleaned.replace("rgb", "").replace("(", "").replace(")", "")
-            nums = re.findall(r"\d{1,3}", cleaned)
-            if len(nums) == 3:
-                return tuple(int(n) for n in nums)
+        # --------------------------------------------------
+        # 🔥 FORMATO COMPATIBLE CON interfaz.py
+        # --------------------------------------------------
+        colors_json = [{"r": r, "g": g, "b": b} for (r, g, b) in resultado]
 
-        return None
+        return {"colors": colors_json, "source": "ia"}
 
     # -------------------------------------------------------------
-    def get_colors_from_prompt(self, prompt, n_colors=5):
-
+    def _payload(self, prompt, n_colors):
         prompt_text = f"""
 Genera exactamente {n_colors} colores en formato RGB.
 Salida SOLO líneas con: R,G,B
@@ -54,7 +171,7 @@ Sin texto adicional.
 Tema: "{prompt}"
 """
 
-        payload = {
+        return {
             "model": self.model,
             "temperature": self.temperature,
             "max_tokens": 128,     # evitar error 402
@@ -63,17 +180,37 @@ Tema: "{prompt}"
             ]
         }
 
-        headers = {
+    def _headers(self):
+        return {
             "Authorization": f"Bearer {self.api_key}",
             "HTTP-Referer": "http://localhost",
             "X-Title": "Noria",
             "Content-Type": "application/json"
         }
 
+    # -------------------------------------------------------------
+    def _fetch_colors(self, prompt, n_colors):
+        """Llama a OpenRouter. Devuelve [(r,g,b), ...] o None si falla."""
+
+        text = self._request_text(self._payload(prompt, n_colors))
+        if text is None:
+            return None
+
+        # --------------------------------------------------
+        # PROCESAR TEXTO: todos los colores en una sola pasada
+        # --------------------------------------------------
+        return parse_colors(text)
+
+    def _request_text(self, payload):
+        """POST a OpenRouter. Devuelve el texto de la respuesta o None si falla."""
+
+        headers = self._headers()
+
         try:
-            response = requests.post(self.url, json=payload, headers=headers)
+            response = self.transport.post(self.url, json=payload, headers=headers)
 
-            print("🔎 Respuesta OpenRouter RAW:", response.text)
+            if self.debug_raw:
+                print("🔎 Respuesta OpenRouter RAW:", response.text)
 
             data = response.json()
 
@@ -88,39 +225,260 @@ Tema: "{prompt}"
 
             elif "error" in data:
                 print("❌ Error OpenRouter:", data["error"].get("message"))
-                return {"colors": [{"r": 255, "g": 0, "b": 0}] * n_colors}
+                return None
 
             else:
                 print("⚠️ Respuesta sin campos choices/response")
-                return {"colors": [{"r": 255, "g": 0, "b": 0}] * n_colors}
+                return None
 
-            # --------------------------------------------------
-            # PROCESAR TEXTO EN FORMATO R,G,B
-            # --------------------------------------------------
-            text = text.strip()
-            resultado = []
+            return text
 
-            for line in text.splitlines():
-                color = self._parse_color(line)
-                if color:
-                    resultado.append(color)
+        except Exception as e:
+            print("❌ Error en OpenRouter:", e)
+            return None
 
-            # Si vienen menos de los necesarios → completar
-            while len(resultado) < n_colors:
-                resultado.append((255, 0, 0))
+    # -------------------------------------------------------------
+    # LOTE: VARIOS TEMAS EN UNA SOLA PETICIÓN
+    # -------------------------------------------------------------
+    _SECCION_RE = re.compile(r"^\s*(?:#+|tema|theme)\s*(\d+)\s*[:.)]?\s*$", re.IGNORECASE)
+
+    def get_palettes_for_prompts(self, prompts, n_colors=5, use_cache=True, mode=None):
+        """
+        Genera una paleta por tema con UNA sola petición a la IA.
+        Devuelve una lista de {"colors": [...]} en el mismo orden que prompts.
+
+        Los temas en caché no se piden. Si la sección de un tema no se
+        puede interpretar, solo ese tema usa la paleta de respaldo.
+        """
+        mode = mode or self.mode
+        prompts = list(prompts)
+
+        if mode == "local":
+            return [
+                {"colors": [{"r": r, "g": g, "b": b} for (r, g, b) in pal], "source": "local"}
+                for pal in self.local.generate_batch(prompts, n_colors)
+            ]
 
-            # --------------------------------------------------
-            # 🔥 FORMATO COMPATIBLE CON interfaz.py
-            # --------------------------------------------------
-            colors_json = [{"r": r, "g": g, "b": b} for (r, g, b) in resultado]
+        resultados = {}
+        pendientes = []
+        for prompt in prompts:
+            if prompt in resultados or prompt in pendientes:
+                continue
+            cached = self._cached_colors(prompt, n_colors, use_cache, refresh=False)
+            if cached is not None:
+                resultados[prompt] = cached
+            else:
+                pendientes.append(prompt)
+
+        if pendientes:
+            secciones = self._fetch_batch(pendientes, n_colors) or {}
+
+            for i, prompt in enumerate(pendientes, start=1):
+                colores = secciones.get(i, [])
+                if len(colores) < n_colors:
+                    print(f"⚠️ Tema {i} ({prompt!r}) sin colores suficientes, usando respaldo")
+                    resultados[prompt] = self._fallback_colors(prompt, n_colors, mode)
+                    continue
+
+                colores = colores[:n_colors]
+                if self.cache is not None and use_cache:
+                    self.cache.put(self._cache_key(prompt, n_colors), colores)
+                resultados[prompt] = {
+                    "colors": [{"r": r, "g": g, "b": b} for (r, g, b) in colores],
+                    "source": "ia",
+                }
+
+        # Copias independientes si un tema aparece repetido
+        return [
+            {**resultados[p], "colors": [dict(c) for c in resultados[p]["colors"]]}
+            for p in prompts
+        ]
 
-            return {"colors": colors_json}
+    def _fetch_batch(self, prompts, n_colors):
+        """Una petición para todos los temas. Devuelve {nº de tema: [(r,g,b), ...]} o None."""
+
+        temas = "\n".join(f'{i}. "{p}"' for i, p in enumerate(prompts, start=1))
+        prompt_text = f"""
+Para CADA tema genera exactamente {n_colors} colores en formato RGB.
+Salida SOLO con este formato, sin texto adicional:
+### 1
+R,G,B
+...
+### 2
+R,G,B
+...
+Temas:
+{temas}
+"""
+
+        payload = {
+            "model": self.model,
+            "temperature": self.temperature,
+            # ~12 tokens por línea de color + cabeceras
+            "max_tokens": 32 + len(prompts) * (8 + n_colors * 12),
+            "messages": [
+                {"role": "user", "content": prompt_text}
+            ]
+        }
+
+        text = self._request_text(payload)
+        if text is None:
+            return None
+        return self._split_sections(text)
+
+    def _split_sections(self, text):
+        """Reparte las líneas de color entre las secciones '### N'."""
+        secciones = {}
+        parsers = {}
+        actual = None
+
+        for line in text.splitlines():
+            m = self._SECCION_RE.match(line)
+            if m:
+                actual = int(m.group(1))
+                secciones.setdefault(actual, [])
+                parsers.setdefault(actual, ColorLineParser())
+                continue
+
+            if actual is None:
+                continue
+            secciones[actual].extend(parsers[actual].feed(line))
+
+        for n, parser in parsers.items():
+            secciones[n].extend(parser.flush())
+        return secciones
+
+    # -------------------------------------------------------------
+    # STREAMING (SSE)
+    # -------------------------------------------------------------
+    def stream_colors_from_prompt(self, prompt, n_colors=5, use_cache=True):
+        """
+        Generador: pide la paleta con stream=true (SSE de OpenRouter) y
+        entrega cada (r,g,b) en cuanto su línea está completa, sin esperar
+        al final de la respuesta.
+
+        Al terminar deja en self.last_stream_stats el tiempo hasta el primer
+        color (ttfc_ms) y la latencia total (total_ms).
+        Si la petición falla no entrega nada.
+        """
+        t0 = time.perf_counter()
+        stats = {"ttfc_ms": None, "total_ms": None, "colores": 0, "source": "ia"}
+        self.last_stream_stats = stats
+
+        cached = self._cached_colors(prompt, n_colors, use_cache, refresh=False)
+        if cached is not None:
+            stats["source"] = "cache"
+            stats["ttfc_ms"] = stats["total_ms"] = (time.perf_counter() - t0) * 1000
+            stats["colores"] = len(cached["colors"])
+            for c in cached["colors"]:
+                yield (c["r"], c["g"], c["b"])
+            return
+
+        payload = self._payload(prompt, n_colors)
+        payload["stream"] = True
+        resultado = []
+
+        try:
+            response = self.transport.post(self.url, json=payload, headers=self._headers(), stream=True)
+            try:
+                if response.status_code != 200:
+                    print(f"❌ Error OpenRouter (stream): HTTP {response.status_code}", response.text[:200])
+                    return
+
+                parser = SSEColorParser()
+                # chunk_size=None: entrega los bytes tal como llegan del socket
+                for chunk in response.iter_content(chunk_size=None):
+                    for color in parser.feed(chunk):
+                        if stats["ttfc_ms"] is None:
+                            stats["ttfc_ms"] = (time.perf_counter() - t0) * 1000
+                        resultado.append(color)
+                        yield color
+                    if parser.done:
+                        break
+
+                for color in parser.flush():
+                    if stats["ttfc_ms"] is None:
+                        stats["ttfc_ms"] = (time.perf_counter() - t0) * 1000
+                    resultado.append(color)
+                    yield color
+
+                if parser.error:
+                    print("❌ Error OpenRouter (stream):", parser.error)
+            finally:
+                response.close()
 
         except Exception as e:
-            print("❌ Error en OpenRouter:", e)
-            fallback = [{"r": 255, "g": 0, "b": 0}] * n_colors
-            return {"colors": fallback}
+            print("❌ Error en OpenRouter (stream):", e)
+
+        finally:
+            stats["total_ms"] = (time.perf_counter() - t0) * 1000
+            stats["colores"] = len(resultado)
+            ttfc = "-" if stats["ttfc_ms"] is None else f"{stats['ttfc_ms']:.0f} ms"
+            print(f"⏱ Streaming: primer color {ttfc} · total {stats['total_ms']:.0f} ms · {len(resultado)} colores")
 
+        if self.cache is not None and use_cache and len(resultado) >= n_colors:
+            self.cache.put(self._cache_key(prompt, n_colors), resultado)
 
 
+class SSEColorParser:
+    """
+    Parser incremental del stream SSE de chat completions.
+
+    feed(bytes) devuelve los colores cuyas líneas de texto ya están
+    completas; los fragmentos incompletos (de SSE o de texto) se guardan
+    hasta el siguiente trozo.
+    """
 
+    def __init__(self):
+        self._sse_buf = b""
+        self._texto = ""
+        self._parser = ColorLineParser()
+        self.done = False
+        self.error = None
+
+    def feed(self, chunk):
+        colores = []
+        self._sse_buf += chunk
+
+        while b"\n" in self._sse_buf:
+            linea, self._sse_buf = self._sse_buf.split(b"\n", 1)
+            linea = linea.strip()
+
+            # Líneas vacías separan eventos; ":" son comentarios keep-alive
+            if not linea.startswith(b"data:"):
+                continue
+
+            data = linea[5:].strip()
+            if data == b"[DONE]":
+                self.done = True
+                break
+
+            try:
+                evento = json.loads(data)
+            except ValueError:
+                continue
+
+            if "error" in evento:
+                self.error = evento["error"].get("message", evento["error"])
+                self.done = True
+                break
+
+            for choice in evento.get("choices", []):
+                delta = choice.get("delta") or {}
+                self._texto += delta.get("content") or ""
+
+            colores.extend(self._lineas_completas())
+
+        return colores
+
+    def _lineas_completas(self):
+        colores = []
+        while "\n" in self._texto:
+            linea, self._texto = self._texto.split("\n", 1)
+            colores.extend(self._parser.feed(linea))
+        return colores
+
+    def flush(self):
+        """Procesa la última línea de texto (puede venir sin salto final)."""
+        linea, self._texto = self._texto, ""
+        return self._parser.feed(linea) + self._parser.flush()
@@ -0,0 +1,180 @@
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class RequestCancelled(Exception):
+    """La petición se canceló (p. ej. la otra rama de un hedge ya respondió)."""
+
+
+class HTTPTransport:
+    """
+    Transporte HTTP compartido por los clientes de IA (OpenRouter / OpenAI).
+
+    - Una sola requests.Session con pool de conexiones keep-alive
+      (se evita repetir DNS + TCP + TLS en cada petición).
+    - Timeouts de conexión y de lectura: un endpoint colgado ya no
+      bloquea para siempre el hilo que lo llama.
+    - Reintentos acotados con backoff exponencial + jitter ante 429/5xx
+      y errores de red (respetando Retry-After si viene).
+    - Latencia de cada llamada (incluyendo reintentos) para métricas.
+    """
+
+    RETRY_STATUS = frozenset({429, 500, 502, 503, 504})
+
+    def __init__(self, pool_size=4, connect_timeout=3.05, read_timeout=20.0,
+                 max_retries=2, backoff_base=0.5, backoff_max=8.0, latency_window=256):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max(0, int(max_retries))
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        # Evento de cancelación por hilo (ver cancel_scope)
+        self._local = threading.local()
+
+        # Métricas
+        self._lock = threading.Lock()
+        self._latencias = deque(maxlen=latency_window)
+        self.calls = 0
+        self.retries = 0
+        self.errors = 0
+        self.last_latency = None
+
+    # -------------------------------------------------------------
+    def _backoff(self, intento, retry_after=None):
+        """Backoff exponencial con 'full jitter'."""
+        techo = min(self.backoff_max, self.backoff_base * (2 ** intento))
+        espera = random.uniform(0, techo)
+        if retry_after:
+            try:
+                espera = max(espera, min(float(retry_after), self.backoff_max))
+            except ValueError:
+                pass
+        return espera
+
+    def _registrar(self, t0, error=False):
+        latencia = time.perf_counter() - t0
+        with self._lock:
+            self.calls += 1
+            self.last_latency = latencia
+            self._latencias.append(latencia)
+            if error:
+                self.errors += 1
+
+    # -------------------------------------------------------------
+    @contextmanager
+    def cancel_scope(self, event):
+        """
+        Dentro del bloque, las peticiones de ESTE hilo se abortan cuando
+        event se activa: no se envían nuevos intentos y la espera del
+        backoff se interrumpe (lanzan RequestCancelled).
+        """
+        anterior = getattr(self._local, "cancel", None)
+        self._local.cancel = event
+        try:
+            yield event
+        finally:
+            self._local.cancel = anterior
+
+    def _cancelada(self):
+        event = getattr(self._local, "cancel", None)
+        return event is not None and event.is_set()
+
+    # -------------------------------------------------------------
+    def post(self, url, json=None, headers=None, stream=False, timeout=None):
+        """
+        POST con reintentos. Devuelve el requests.Response final
+        (que puede ser un 4xx/5xx si se agotan los reintentos).
+        Lanza la excepción de requests si la red falla en todos los intentos,
+        o RequestCancelled si se cancela desde cancel_scope.
+        """
+        t0 = time.perf_counter()
+        intento = 0
+        cancel = getattr(self._local, "cancel", None)
+
+        while True:
+            if self._cancelada():
+                raise RequestCancelled()
+            try:
+                resp = self.session.post(
+                    url, json=json, headers=headers,
+                    timeout=timeout or self.timeout, stream=stream
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if intento >= self.max_retries:
+                    self._registrar(t0, error=True)
+                    raise
+                espera = self._backoff(intento)
+                print(f"🔁 Error de red ({e.__class__.__name__}), reintentando en {espera:.2f}s...")
+            else:
+                if resp.status_code not in self.RETRY_STATUS or intento >= self.max_retries:
+                    self._registrar(t0, error=resp.status_code >= 400)
+                    return resp
+                espera = self._backoff(intento, resp.headers.get("Retry-After"))
+                print(f"🔁 HTTP {resp.status_code}, reintentando en {espera:.2f}s...")
+                resp.close()
+
+            with self._lock:
+                self.retries += 1
+            intento += 1
+            if cancel is not None:
+                cancel.wait(espera)
+            else:
+                time.sleep(espera)
+
+    # -------------------------------------------------------------
+    def stats(self):
+        with self._lock:
+            lat = sorted(self._latencias)
+            resumen = {
+                "llamadas": self.calls,
+                "reintentos": self.retries,
+                "errores": self.errors,
+                "ultima_ms": None if self.last_latency is None else self.last_latency * 1000,
+            }
+
+        if lat:
+            resumen["media_ms"] = sum(lat) / len(lat) * 1000
+            resumen["p50_ms"] = lat[len(lat) // 2] * 1000
+            resumen["p95_ms"] = lat[min(len(lat) - 1, int(len(lat) * 0.95))] * 1000
+        return resumen
+
+    def close(self):
+        self.session.close()
+
+
+# -------------------------------------------------------------
+# Transporte compartido (una sola sesión para toda la aplicación)
+# -------------------------------------------------------------
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_transport(config=None):
+    """Devuelve el HTTPTransport global, creándolo la primera vez."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            if config is None:
+                from config import app_config
+                config = app_config
+            http = config.http
+            _shared = HTTPTransport(
+                pool_size=http.POOL_SIZE,
+                connect_timeout=http.CONNECT_TIMEOUT,
+                read_timeout=http.READ_TIMEOUT,
+                max_retries=http.MAX_RETRIES,
+                backoff_base=http.BACKOFF_BASE,
+                backoff_max=http.BACKOFF_MAX,
+            )
+        return _shared
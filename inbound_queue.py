@@ -0,0 +1,79 @@
+import threading
+from collections import OrderedDict, deque
+
+
+class InboundQueue:
+    """
+    Cola de mensajes MQTT entrantes hacia la UI de Tk.
+
+    El hilo de MQTT llama a put(); el hilo de Tk llama a drain() una vez
+    por fotograma. Por defecto cada tópico tiene un solo hueco (solo
+    importa el último valor de cada widget); los tópicos de 'passthrough'
+    conservan todos sus mensajes en una cola FIFO acotada a max_queue,
+    y si se llena se descartan los más antiguos.
+    """
+
+    def __init__(self, passthrough=(), max_queue=1000):
+        self.passthrough = set(passthrough)
+        self._ultimos = OrderedDict()               # topic -> payload
+        self._fifo = deque(maxlen=max(1, int(max_queue)))
+        self._lock = threading.Lock()
+
+        # Métricas
+        self.received = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.drained = 0
+        self.frames = 0
+        self.max_depth = 0
+
+    def put(self, topic, payload):
+        """Desde cualquier hilo. Nunca bloquea."""
+        with self._lock:
+            self.received += 1
+            if topic in self.passthrough:
+                if len(self._fifo) == self._fifo.maxlen:
+                    self.dropped += 1
+                self._fifo.append((topic, payload))
+            else:
+                if topic in self._ultimos:
+                    self.coalesced += 1
+                    self._ultimos.move_to_end(topic)
+                self._ultimos[topic] = payload
+
+            depth = len(self._ultimos) + len(self._fifo)
+            if depth > self.max_depth:
+                self.max_depth = depth
+
+    def drain(self):
+        """
+        Devuelve y vacía lo pendiente: [(topic, payload), ...]. Primero los
+        de passthrough, en orden de llegada; después el último valor de cada
+        tópico, del actualizado hace más tiempo al más reciente.
+        """
+        with self._lock:
+            if not self._ultimos and not self._fifo:
+                return []
+            items = list(self._fifo)
+            items.extend(self._ultimos.items())
+            self._fifo.clear()
+            self._ultimos.clear()
+            self.drained += len(items)
+            self.frames += 1
+        return items
+
+    def depth(self):
+        with self._lock:
+            return len(self._ultimos) + len(self._fifo)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "recibidos": self.received,
+                "aplicados": self.drained,
+                "fusionados": self.coalesced,
+                "descartados": self.dropped,
+                "profundidad": len(self._ultimos) + len(self._fifo),
+                "profundidad_max": self.max_depth,
+                "fotogramas": self.frames,
+            }
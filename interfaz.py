@@ -6,34 +6,38 @@ Interfaz gráfica para la Noria (MQTT + ESP32).
 - SOLUCIÓN DEFINITIVA PARA TAMAÑO DE BOTONES
 """
 
+import time
+_T_INICIO = time.perf_counter()   # referencia para medir el arranque
+
 import tkinter as tk
 from tkinter import messagebox
-from PIL import Image, ImageTk
 import paho.mqtt.client as mqtt
 import threading
+import asyncio
 import json
-import time
+import os
 
 # Importar configuración orientada a objetos (tu config.py)
-from gemini_api import GeminiColorAPI 
+# PIL, requests y los clientes de IA se importan al usarlos por primera
+# vez (iconos / hilo de arranque): la ventana aparece sin esperarlos.
+from llm_providers import HedgedProvider
+from publish_scheduler import PublishCoalescer
+from topic_router import TopicRouter
+from mqtt_transport import create_mqtt_transport
+from inbound_queue import InboundQueue
+from telemetry import TelemetryRing, PassengerCounter, parse_number
+from telemetry_chart import TelemetryChart
+from neopixel_protocol import decode_frame, is_frame, palette_message
+from topics import (
+    TOPIC_NEOPIXEL, TOPIC_DC_SPEED, TOPIC_STEPPER_SPEED, TOPIC_SONG,
+    TOPIC_SERVO, TOPIC_CHATBOT, TOPIC_ERROR, TOPIC_STATUS, TOPIC_DISTANCE, TOPIC_ALL,
+)
 from config import AppConfig
 config = AppConfig()
-# interfaz.py (Línea 21)
-# Pasa el objeto 'config' completo, el cual contiene la API Key y el modelo.
-color_gen = GeminiColorAPI(config=config) # ✅ CORREGIDO
-
-# ---------------- TOPICS ESP32 ----------------
-TOPIC_NEOPIXEL = "esp32/neopixel"
-TOPIC_DC_SPEED = "esp32/dc_speed"            # DC motor speed (0-100)
-TOPIC_STEPPER_SPEED = "esp32/stepper_speed"  # Stepper motor speed (0-100)
-TOPIC_STEPPER = "esp32/stepper_delay"        # Compatibilidad, si alguien usa delay
-TOPIC_SONG = "esp32/play_song"
-TOPIC_CHATBOT = "esp32/chatbot_command"
-TOPIC_SERVO = "esp32/servo_door"
-TOPIC_ERROR = "esp32/error"
-TOPIC_STATUS = "esp32/status"
-TOPIC_DISTANCE = "esp32/distance_cm"           # Nuevo topic para texto sensor (mostrar en UI)
 
+PROMPT_LUCES = config.prefetch.PROMPTS[0]
+
+_T_IMPORTADO = time.perf_counter() - _T_INICIO
 
 class InterfazNoria:
     def __init__(self, root):
@@ -41,14 +45,52 @@ class InterfazNoria:
         self._configurar_ventana()
         self._definir_colores()
 
+        # Tiempos de arranque (s desde que se empezó a importar el módulo)
+        self.tiempos = {"importado": _T_IMPORTADO}
+
         # MQTT
-        self.mqtt_client = None
+        self.mqtt = None
+        self._mqtt_conectado = None   # None = aún no hubo respuesta del broker
+        self.router = self._crear_router()
+        # Mensajes entrantes: se aplican a la UI a ritmo de fotograma
+        self.inbox = InboundQueue(
+            passthrough=config.ui.INBOX_PASSTHROUGH,
+            max_queue=config.ui.INBOX_MAX_QUEUE,
+        )
+        # Telemetría del sensor de distancia (memoria fija) y conteo de pasajeros
+        self.telemetria = TelemetryRing(
+            capacity=config.telemetry.RAW_CAPACITY,
+            bucket_seconds=config.telemetry.BUCKET_SECONDS,
+            max_buckets=config.telemetry.MAX_BUCKETS,
+        )
+        self.contador_pasajeros = PassengerCounter(
+            threshold_cm=config.telemetry.PASSENGER_THRESHOLD_CM,
+            hysteresis_cm=config.telemetry.PASSENGER_HYSTERESIS_CM,
+        )
+        self.grafica = None
         self._setup_mqtt()
 
-        # Debounce / últimos enviados
-        self._vel_debounce_id = None
+        # Publicaciones salientes: un valor pendiente por tópico, con ritmo
+        # máximo por tópico, enviadas desde un hilo propio (no el de Tk)
+        self.publisher = PublishCoalescer(
+            self._mqtt_send,
+            default_rate=config.publish.DEFAULT_RATE,
+            rates=config.publish.RATES,
+            passthrough=config.publish.PASSTHROUGH,
+            slots=config.publish.SLOTS,
+        )
+
+        # Clientes de IA: los crea _iniciar_ia en segundo plano. Hasta
+        # entonces las luces usan la paleta local.
+        self.color_gen = None
+        self.color_source = None
+        self.async_color_gen = None
+        self.prefetcher = None
+        self._aio_loop = None
+        self._estado_ia = "iniciando"
+
+        # Últimos valores enviados de los sliders
         self._vel_last_sent = None
-        self._dc_debounce_id = None
         self._dc_last_sent = None
 
 
@@ -65,6 +107,13 @@ class InterfazNoria:
         self.estado_musica.trace_add("write", lambda *a: self._trace_update("musica"))
         self.estado_servo.trace_add("write", lambda *a: self._trace_update("servo"))
 
+        # Barra inferior con el estado de la conexión (visible en todas las pantallas)
+        self.label_conexion = tk.Label(
+            self.root, text="", font=("Comic Sans MS", 10), bg="#FFE5B4", fg="#BF360C", anchor="w"
+        )
+        self.label_conexion.pack(side="bottom", fill="x", padx=10, pady=(0, 4))
+        self._refrescar_conexion()
+
         # Bienvenida
         self.frame_bienvenida = tk.Frame(self.root, bg="#FFE5B4")
         self.frame_bienvenida.pack(expand=True, fill="both")
@@ -73,6 +122,89 @@ class InterfazNoria:
         # Panel se crea al entrar
         self.panel = None
 
+        # Primero se dibuja la ventana; la red y la IA arrancan después
+        self.root.after_idle(self._arrancar_servicios)
+        self.root.after(config.ui.FRAME_MS, self._drenar_entrada)
+
+    def _arrancar_servicios(self):
+        """Primer momento libre del loop de Tk: la ventana ya está dibujada."""
+        self.root.update_idletasks()
+        self.tiempos["primer_frame"] = time.perf_counter() - _T_INICIO
+        print(f"🖼 Ventana lista en {self.tiempos['primer_frame'] * 1000:.0f} ms")
+        self.mqtt.start()
+        threading.Thread(target=self._iniciar_ia, name="init-ia", daemon=True).start()
+
+    def _iniciar_ia(self):
+        """Hilo de arranque: importa y crea los clientes de IA y el prefetch."""
+        try:
+            from async_color_api import AsyncColorClient, start_background_loop, create_color_source
+            from palette_prefetch import create_prefetcher
+
+            # Con API key de OpenAI, color_source hace hedging OpenRouter -> OpenAI
+            color_gen, color_source = create_color_source(config)
+            self._aio_loop = start_background_loop()
+            self.color_gen, self.color_source = color_gen, color_source
+            # Búfer de paletas listas: las luces se encienden sin esperar a la IA
+            self.prefetcher = create_prefetcher(color_gen, config.prefetch)
+            if self.prefetcher:
+                self.prefetcher.start()
+            # Variante asyncio: clics repetidos comparten una sola petición en vuelo.
+            # Se asigna al final: es la señal de que la IA está lista.
+            self.async_color_gen = AsyncColorClient(color_source)
+            self._estado_ia = "lista" if color_gen.mode == "llm" else "local"
+        except Exception as e:
+            print("❌ No se pudo iniciar la IA (se usará la paleta local):", e)
+            self._estado_ia = "error"
+        self.tiempos["ia_lista"] = time.perf_counter() - _T_INICIO
+
+    def _on_mqtt_state(self, conectado):
+        """Hilo de MQTT: solo guarda el estado; la etiqueta se pinta en el fotograma."""
+        self._mqtt_conectado = conectado
+        if conectado:
+            self.tiempos.setdefault("mqtt_conectado", time.perf_counter() - _T_INICIO)
+
+    def _refrescar_conexion(self):
+        if self._mqtt_conectado is None:
+            mqtt_txt = "🟡 MQTT: conectando..."
+        elif self._mqtt_conectado:
+            mqtt_txt = "🟢 MQTT: conectado"
+        else:
+            mqtt_txt = "🔴 MQTT: sin conexión, reintentando..."
+        ia_txt = {"iniciando": "IA: iniciando...", "lista": "IA: lista",
+                  "local": "IA: paleta local", "error": "IA: no disponible (paleta local)"}[self._estado_ia]
+        texto = f"{mqtt_txt}   ·   {ia_txt}"
+        if self.label_conexion.cget("text") != texto:
+            self.label_conexion.config(text=texto)
+
+    def reportar_arranque(self, timeout=15.0):
+        """
+        Modo benchmark (NORIA_STARTUP_BENCH=1): espera a que la IA esté
+        lista (o timeout), imprime los tiempos en una línea JSON y cierra.
+        """
+        limite = time.perf_counter() + timeout
+
+        def comprobar():
+            if "ia_lista" in self.tiempos or time.perf_counter() > limite:
+                print("NORIA_STARTUP " + json.dumps(self.tiempos), flush=True)
+                self.root.destroy()
+                return
+            self.root.after(20, comprobar)
+
+        self.root.after(20, comprobar)
+
+    def _drenar_entrada(self):
+        """Cada fotograma: aplica el último valor de cada tópico recibido."""
+        try:
+            for topic, payload in self.inbox.drain():
+                self.actualizar_estado(topic, payload)
+            self._refrescar_conexion()
+            if self.grafica is not None:
+                self.grafica.update()
+        except Exception as e:
+            print("⚠️ Error refrescando la UI:", e)
+        finally:
+            self.root.after(config.ui.FRAME_MS, self._drenar_entrada)
+
     def _configurar_ventana(self):
         self.root.title("Control de la Noria 🎡")
         self.root.geometry("1000x650")
@@ -88,27 +220,17 @@ class InterfazNoria:
         self.COLOR_TEXTO_ENCENDIDO = "#E65100"
 
     def _setup_mqtt(self):
-        try:
-            self.mqtt_client = mqtt.Client()
-            if getattr(config.mqtt, "USER", ""):
-                self.mqtt_client.username_pw_set(config.mqtt.USER, config.mqtt.PASSWORD)
-            self.mqtt_client.on_connect = self._on_mqtt_connect
-            self.mqtt_client.on_message = self._on_mqtt_message_internal
-            self.mqtt_client.on_disconnect = self._on_mqtt_disconnect
-            self.mqtt_client.on_log = self._on_mqtt_log
-
-            print("🔗 Intentando conectar al broker MQTT...", config.mqtt.BROKER, config.mqtt.PORT)
-            self.mqtt_client.connect(config.mqtt.BROKER, config.mqtt.PORT, 60)
-            self.mqtt_client.loop_start()
-        except Exception as e:
-            print("⚠️ No se pudo conectar al broker MQTT:", e)
-            self.mqtt_client = None
-
-    def _on_mqtt_disconnect(self, client, userdata, rc):
-        if rc != 0:
-            print("❌ MQTT se desconectó inesperadamente (rc =", rc, ")")
-        else:
-            print("🔌 MQTT desconectado correctamente.")
+        # Conexión en segundo plano: si el broker no está, se reintenta con
+        # backoff y lo publicado mientras tanto se guarda para reenviarlo
+        self.mqtt = create_mqtt_transport(
+            config.mqtt, suffix="ui",
+            on_message=self._on_mqtt_message_internal,
+            on_state=self._on_mqtt_state,
+        )
+        self.mqtt.client.on_log = self._on_mqtt_log
+        # Una suscripción con comodín; el TopicRouter reparte por tópico.
+        # start() se llama en _arrancar_servicios, con la ventana ya dibujada.
+        self.mqtt.subscribe(TOPIC_ALL)
 
     def _on_mqtt_log(self, client, userdata, level, buf):
         if level == mqtt.MQTT_LOG_ERR:
@@ -116,39 +238,27 @@ class InterfazNoria:
         elif level == mqtt.MQTT_LOG_WARNING:
             print("⚠️ MQTT WARNING:", buf)
 
-    def _on_mqtt_connect(self, client, userdata, flags, rc):
-        status = "OK" if rc == 0 else f"rc={rc}"
-        print("🟢 MQTT conectado exitosamente (", status, ")")
+    def _on_mqtt_message_internal(self, topic, raw):
         try:
-            # Suscribir a los topics relevantes
-            client.subscribe(TOPIC_NEOPIXEL)
-            client.subscribe(TOPIC_DC_SPEED)
-            client.subscribe(TOPIC_STEPPER_SPEED)
-            client.subscribe(TOPIC_STEPPER)
-            client.subscribe(TOPIC_SONG)
-            client.subscribe(TOPIC_CHATBOT)
-            client.subscribe(TOPIC_SERVO)
-            client.subscribe(TOPIC_ERROR)
-            client.subscribe(TOPIC_STATUS)
-            client.subscribe(TOPIC_DISTANCE)
-            print("📡 Suscrito a topics esenciales de la noria")
-        except Exception as e:
-            print("⚠️ Error suscribiendo a topics:", e)
-
-    def _on_mqtt_message_internal(self, client, userdata, msg):
-        try:
-            topic = msg.topic
-            payload = msg.payload.decode(errors="replace")
-            self.root.after(0, lambda: self.actualizar_estado(topic, payload))
+            if is_frame(raw):
+                # Trama binaria por LED -> "r,g,b, r,g,b, ..." para la UI
+                leds = decode_frame(raw) or []
+                payload = ", ".join(f"{r},{g},{b}" for (r, g, b) in leds)
+            else:
+                payload = raw.decode(errors="replace")
+            if topic == TOPIC_DISTANCE:
+                # Cada muestra cuenta para la telemetría, aunque la UI solo vea la última
+                valor = parse_number(payload)
+                if valor is not None:
+                    self.telemetria.append(time.time(), valor)
+                    self.contador_pasajeros.update(valor)
+            # Nada de root.after por mensaje: _drenar_entrada lo aplica por fotograma
+            self.inbox.put(topic, payload)
         except Exception as e:
             print("⚠️ Error en on_message:", e)
 
     def _mqtt_publish(self, topic, payload):
         try:
-            if self.mqtt_client is None:
-                print("⚠️ MQTT no inicializado — publicación cancelada.")
-                return
-
             if isinstance(payload, dict):
                 if "r" in payload and "g" in payload and "b" in payload:
                     payload = f"{int(payload['r'])},{int(payload['g'])},{int(payload['b'])}"
@@ -158,12 +268,26 @@ class InterfazNoria:
                 else:
                     payload = json.dumps(payload)
 
-            print(f"📤 PUBLICAR -> {topic}: {payload}")
-            self.mqtt_client.publish(topic, str(payload))
-            print("   ✔ Enviado")
+            if not isinstance(payload, (bytes, bytearray)):
+                payload = str(payload)
+            self.publisher.submit(topic, payload)
         except Exception as e:
             print("❌ Error al publicar MQTT:", e)
 
+    def _mqtt_send(self, topic, payload):
+        """Envío real al broker (lo llama el hilo del PublishCoalescer)."""
+        if isinstance(payload, (bytes, bytearray)):
+            # Trama binaria (neopixel_protocol): se envía tal cual
+            print(f"📤 PUBLICAR -> {topic}: <trama {len(payload)} bytes>")
+            payload = bytes(payload)
+        else:
+            print(f"📤 PUBLICAR -> {topic}: {payload}")
+
+        if self.mqtt.publish(topic, payload):
+            print("   ✔ Enviado")
+        else:
+            print("   ⏳ Sin conexión: se enviará al reconectar")
+
     def _crear_bienvenida(self):
         tk.Label(
             self.frame_bienvenida,
@@ -173,6 +297,7 @@ class InterfazNoria:
         ).pack(pady=60)
 
         try:
+            from PIL import Image, ImageTk
             img = Image.open("assets/logo.png").resize((180, 180))
             self.logo = ImageTk.PhotoImage(img)
             tk.Label(self.frame_bienvenida, image=self.logo, bg="#FFE5B4").pack(pady=10)
@@ -231,6 +356,7 @@ class InterfazNoria:
         """Cargar todos los iconos necesarios"""
         self.icons = {}
         try:
+            from PIL import Image, ImageTk
             icon_size = (28, 28)  # Tamaño uniforme para todos los iconos
             self.icons["motor"] = ImageTk.PhotoImage(Image.open("assets/motor.png").resize(icon_size))
             self.icons["luces"] = ImageTk.PhotoImage(Image.open("assets/luces.png").resize(icon_size))
@@ -318,6 +444,14 @@ class InterfazNoria:
         # ============================
         self.label_sensor = tk.Label(parent, text="Sensor: -", font=("Comic Sans MS", 11), bg="#FFE5B4")
         self.label_sensor.pack(anchor="w", pady=6)
+        # Gráfica en vivo de la distancia (min-max y media por segundo)
+        self.grafica = TelemetryChart(
+            parent, self.telemetria,
+            width=400, height=90,
+            n_buckets=config.telemetry.CHART_BUCKETS,
+            y_max=config.telemetry.CHART_MAX_CM,
+        )
+        self.grafica.pack(anchor="w", pady=(0, 6))
 
 
         tk.Label(velocidad_frame, text="Velocidad de la Noria (Stepper)", font=self.fuente, bg="#FFE5B4", fg="#BF360C").pack(anchor="w")
@@ -450,10 +584,51 @@ class InterfazNoria:
 
         elif tipo == "luces":
             if nuevo_estado:
+                if self.async_color_gen is None:
+                    # La IA aún se está iniciando: paleta local al instante
+                    from local_palette import LocalPaletteEngine
+                    print("🎨 IA iniciándose: usando paleta local")
+                    try:
+                        self._aplicar_colores(LocalPaletteEngine().get_colors_from_prompt(
+                            PROMPT_LUCES, n_colors=config.prefetch.N_COLORS))
+                    except Exception as e:
+                        self._error_luces(e)
+                    return
+
+                data = self.prefetcher.take(PROMPT_LUCES) if self.prefetcher else None
+                if data is not None:
+                    print("⚡ Paleta precargada disponible (sin esperar a la IA)")
+                    try:
+                        self._aplicar_colores(data)
+                    except Exception as e:
+                        self._error_luces(e)
+                    return
+
                 print("✨ Solicitando colores IA...")
                 if tipo in self.botones_ui:
                     self.botones_ui[tipo][1].config(text="Buscando...", fg=self.COLOR_TEXTO_APAGADO)
-                threading.Thread(target=self._worker_luces, daemon=True).start()
+
+                if config.gemini.STREAM and self.color_source is self.color_gen and self.color_gen.mode in ("llm", "fallback"):
+                    # Mismo pool y single-flight que el resto de peticiones:
+                    # clics repetidos no duplican el stream
+                    fut = asyncio.run_coroutine_threadsafe(
+                        self.async_color_gen.stream_colors_from_prompt(
+                            PROMPT_LUCES, n_colors=config.prefetch.N_COLORS,
+                            on_color=self._color_stream
+                        ),
+                        self._aio_loop
+                    )
+                    fut.add_done_callback(self._worker_luces_stream)
+                    return
+
+                fut = asyncio.run_coroutine_threadsafe(
+                    self.async_color_gen.get_colors_from_prompt(
+                        PROMPT_LUCES, n_colors=config.prefetch.N_COLORS,
+                        on_refine=self._refinar_luces
+                    ),
+                    self._aio_loop
+                )
+                fut.add_done_callback(self._worker_luces)
             else:
                 print("🌑 Publicando apagar luces")
                 self._mqtt_publish(TOPIC_NEOPIXEL, "0,0,0")
@@ -493,14 +668,51 @@ class InterfazNoria:
                 else:
                     label_estado.config(text="Apagado", fg=self.COLOR_TEXTO_APAGADO)
 
-    def _worker_luces(self):
-     """Worker para manejar la solicitud de colores IA"""
+    def _worker_luces(self, fut):
+     """Callback cuando termina la solicitud de colores IA (fut = resultado asyncio)"""
      try:
-         data = color_gen.get_colors_from_prompt(
-             "Ilumina la noria con colores vibrantes",
-             n_colors=3
-         )
- 
+         self._aplicar_colores(fut.result())
+     except Exception as e:
+         self._error_luces(e)
+
+    def _color_stream(self, i, color):
+     """Streaming: publica el primer color apenas llega, sin esperar al resto"""
+     if i == 0:
+         r, g, b = color
+         print(f"🌈 Primer color por IA (streaming) -> {r},{g},{b} (publicando...)")
+         self._mqtt_publish(TOPIC_NEOPIXEL, f"{r},{g},{b}")
+
+    def _worker_luces_stream(self, fut):
+     """Callback cuando termina el stream de colores (fut = lista de (r,g,b))"""
+     color_gen = self.color_gen
+     try:
+         colores = [{"r": r, "g": g, "b": b} for (r, g, b) in fut.result()]
+
+         if not colores:
+             # Misma regla que GeminiColorAPI._fallback_colors
+             if color_gen.mode not in ("fallback", "local_first"):
+                 raise ValueError("El streaming no devolvió colores")
+             self._aplicar_colores(color_gen._fallback_colors(PROMPT_LUCES, config.prefetch.N_COLORS, color_gen.mode))
+             return
+
+         if len(colores) > 1 and (config.leds.EFFECT or config.leds.BINARY_FRAMES):
+             # Escena animada o trama con la paleta completa (en modo texto
+             # ya se publicó el primer color en _color_stream)
+             self._mqtt_publish(*palette_message(colores, config.leds))
+
+         colores_str = ", ".join([f"{c['r']},{c['g']},{c['b']}" for c in colores])
+         self.root.after(0, lambda: self.label_colores.config(text=f"Colores: {colores_str}"))
+     except Exception as e:
+         self._error_luces(e)
+
+    def _refinar_luces(self, data):
+     """Modo local_first: llega la paleta de la IA que mejora la local"""
+     if self.estado_luces.get():
+         print("🔄 Paleta refinada por la IA")
+         self._aplicar_colores(data)
+
+    def _aplicar_colores(self, data):
+         """Valida la paleta, la publica a la ESP32 y la muestra en la UI"""
          # Ejemplo esperado:
          # {"colors": [{"r":123,"g":52,"b":255}, ...]}
  
@@ -511,28 +723,23 @@ class InterfazNoria:
          if not isinstance(colors, list) or len(colors) == 0:
              raise ValueError("Lista de colores vacía o inválida")
  
-         # --------------------------------------------
-         # 🔥 NUEVO: elegir un color aleatorio de la IA
-         # --------------------------------------------
-         import random
-         chosen = random.choice(colors)
- 
          # Validar claves
-         if not all(k in chosen for k in ("r", "g", "b")):
-             raise ValueError("Faltan claves r,g,b en color elegido")
- 
-         # Convertir a payload "R,G,B"
-         payload = f"{chosen['r']},{chosen['g']},{chosen['b']}"
-         print(f"🌈 Color elegido por IA -> {payload} (publicando...)")
+         if not all(all(k in c for k in ("r", "g", "b")) for c in colors):
+             raise ValueError("Faltan claves r,g,b en algún color")
+
+         origen = "motor local" if data.get("source") == "local" else "IA"
+         # Efecto animado, trama binaria o "R,G,B" según config.leds
+         topic, payload = palette_message(colors, config.leds)
+         print(f"🌈 Paleta por {origen} -> {len(colors)} colores en {topic} (publicando...)")
  
          # Publicar a la Noria (ESP32)
-         self._mqtt_publish(TOPIC_NEOPIXEL, payload)
+         self._mqtt_publish(topic, payload)
  
          # Mostrar los 3 colores generados en la UI
          colores_str = ", ".join([f"{c['r']},{c['g']},{c['b']}" for c in colors])
          self.root.after(0, lambda: self.label_colores.config(text=f"Colores: {colores_str}"))
- 
-     except Exception as e:
+
+    def _error_luces(self, e):
          print("❌ Error ChatGPT (luces):", e)
          self.root.after(0, lambda: messagebox.showerror(
              "Error al generar colores",
@@ -557,107 +764,108 @@ class InterfazNoria:
         val = self.velocidad.get()
         self.label_vel.config(text=f"Velocidad actual: {val}%")
 
-        try:
-            if self._vel_debounce_id:
-                self.root.after_cancel(self._vel_debounce_id)
-        except Exception:
-            pass
-
-        def enviar():
-            if self._vel_last_sent == val:
-                return
-            self._vel_last_sent = val
-            print(f"🎚 Usuario cambió velocidad stepper -> {val}% (publicando...)")
-            self._mqtt_publish(TOPIC_STEPPER_SPEED, str(val))
-
-        self._vel_debounce_id = self.root.after(200, enviar)
+        # El PublishCoalescer limita el ritmo: al arrastrar solo sale el último valor
+        if self._vel_last_sent == val:
+            return
+        self._vel_last_sent = val
+        print(f"🎚 Usuario cambió velocidad stepper -> {val}% (publicando...)")
+        self._mqtt_publish(TOPIC_STEPPER_SPEED, str(val))
 
     def _dc_slider_changed(self, _):
      val = self.dc_speed.get()
      self.label_dc.config(text=f"DC: {val}%")
  
-     try:
-         if self._dc_debounce_id:
-             self.root.after_cancel(self._dc_debounce_id)
-     except Exception:
-         pass
- 
-     def enviar():
-         publish_value = int(val)
- 
-         if self._dc_last_sent == publish_value:
-             return
- 
-         self._dc_last_sent = publish_value
-         print(f"🎚 Usuario cambió velocidad DC -> {publish_value}% (publicando...)")
- 
-         # Aquí ya NO se pregunta si el motor está on/off
-         # Solo se publica un número simple, como ESP32 espera
-         self._mqtt_publish(TOPIC_DC_SPEED, str(publish_value))
- 
-     self._dc_debounce_id = self.root.after(200, enviar)
+     publish_value = int(val)
+     if self._dc_last_sent == publish_value:
+         return
+
+     self._dc_last_sent = publish_value
+     print(f"🎚 Usuario cambió velocidad DC -> {publish_value}% (publicando...)")
+
+     # Aquí ya NO se pregunta si el motor está on/off
+     # Solo se publica un número simple, como ESP32 espera
+     self._mqtt_publish(TOPIC_DC_SPEED, str(publish_value))
 
  
 
+    def _crear_router(self):
+        """Tabla de despacho de mensajes entrantes: tópico -> handler."""
+        router = TopicRouter()
+        router.add(TOPIC_ERROR, self._on_estado_error)
+        router.add("esp32/+/error", self._on_estado_error)
+        router.add(TOPIC_STATUS, self._on_estado_status)
+        router.add("esp32/+/status", self._on_estado_status)
+        router.add(TOPIC_NEOPIXEL, self._on_estado_neopixel)
+        router.add(TOPIC_DC_SPEED, self._on_estado_dc)
+        router.add(TOPIC_STEPPER_SPEED, self._on_estado_stepper)
+        router.add(TOPIC_SONG, self._on_estado_musica)
+        router.add(TOPIC_SERVO, self._on_estado_servo)
+        router.add(TOPIC_DISTANCE, self._on_estado_distancia)
+        return router
+
     def actualizar_estado(self, topic, payload):
         try:
-            if topic == TOPIC_ERROR or topic.endswith("/error"):
-                print("🚨 Error desde ESP32:", payload)
-                messagebox.showerror("Error ESP32", payload)
-                return
-
-            if TOPIC_STATUS in topic or topic.endswith("/status"):
-                print("ℹ️ Estado ESP:", payload)
-
-            if TOPIC_NEOPIXEL in topic or "neopixel" in topic:
-                try:
-                    parsed = json.loads(payload)
-                    if isinstance(parsed, dict) and "colors" in parsed:
-                        colores = parsed["colors"]
-                        display = ", ".join([f"{c[0]},{c[1]},{c[2]}" for c in colores])
-                        self.label_colores.config(text=f"Colores: {display}")
-                    else:
-                        self.label_colores.config(text=f"Colores: {parsed}")
-                except Exception:
-                    self.label_colores.config(text=f"Colores: {payload}")
-
-            elif TOPIC_DC_SPEED in topic or "dc_speed" in topic:
-                # Esperamos recibir JSON o número
-                try:
-                    parsed = json.loads(payload)
-                    if isinstance(parsed, dict) and "speed" in parsed:
-                        num = int(parsed.get("speed", 0))
-                    else:
-                        num = int(float(payload))
-                    self.label_dc.config(text=f"DC: {num}%")
-                    self.dc_speed.set(num)
-                except Exception:
-                    self.label_dc.config(text=f"DC: {payload}")
-
-            elif TOPIC_STEPPER_SPEED in topic or "stepper_speed" in topic or "dc_speed" not in topic and "stepper" in topic:
-                try:
-                    num = int(payload)
-                    self.label_vel.config(text=f"Velocidad actual: {num}%")
-                    self.velocidad.set(num)
-                    self._vel_last_sent = num
-                except Exception:
-                    self.label_vel.config(text=f"Velocidad actual: {payload}")
-
-            elif TOPIC_SONG in topic or "play_song" in topic or "music" in topic or "musica" in topic:
-                state = payload.strip().lower() in ("1", "on", "start", "true", "encendido")
-                self.estado_musica.set(state)
-
-            elif TOPIC_SERVO in topic or "servo" in topic:
-                state = payload.strip().lower() in ("open", "abrir", "true", "1")
-                self.estado_servo.set(state)
-
-            elif TOPIC_DISTANCE in topic or "sensor" in topic:
-                # Mostrar texto directamente en la UI
-                self.label_sensor.config(text=f"Sensor: {payload}")
-
+            self.router.route(topic, payload)
         except Exception as e:
             print("⚠️ Error actualizando estado:", e)
 
+    def _on_estado_error(self, topic, payload):
+        print("🚨 Error desde ESP32:", payload)
+        messagebox.showerror("Error ESP32", payload)
+
+    def _on_estado_status(self, topic, payload):
+        print("ℹ️ Estado ESP:", payload)
+
+    def _on_estado_neopixel(self, topic, payload):
+        try:
+            parsed = json.loads(payload)
+            if isinstance(parsed, dict) and "colors" in parsed:
+                colores = parsed["colors"]
+                display = ", ".join([f"{c[0]},{c[1]},{c[2]}" for c in colores])
+                self.label_colores.config(text=f"Colores: {display}")
+            else:
+                self.label_colores.config(text=f"Colores: {parsed}")
+        except Exception:
+            self.label_colores.config(text=f"Colores: {payload}")
+
+    def _on_estado_dc(self, topic, payload):
+        # Esperamos recibir JSON o número
+        try:
+            parsed = json.loads(payload)
+            if isinstance(parsed, dict) and "speed" in parsed:
+                num = int(parsed.get("speed", 0))
+            else:
+                num = int(float(payload))
+            self.label_dc.config(text=f"DC: {num}%")
+            self.dc_speed.set(num)
+        except Exception:
+            self.label_dc.config(text=f"DC: {payload}")
+
+    def _on_estado_stepper(self, topic, payload):
+        try:
+            num = int(payload)
+            self.label_vel.config(text=f"Velocidad actual: {num}%")
+            self.velocidad.set(num)
+            self._vel_last_sent = num
+        except Exception:
+            self.label_vel.config(text=f"Velocidad actual: {payload}")
+
+    def _on_estado_musica(self, topic, payload):
+        state = payload.strip().lower() in ("1", "on", "start", "true", "encendido")
+        self.estado_musica.set(state)
+
+    def _on_estado_servo(self, topic, payload):
+        state = payload.strip().lower() in ("open", "abrir", "true", "1")
+        self.estado_servo.set(state)
+
+    def _on_estado_distancia(self, topic, payload):
+        # Mostrar texto directamente en la UI
+        self.label_sensor.config(text=f"Sensor: {payload}")
+        pasajeros = self.contador_pasajeros.count
+        if pasajeros != self.pasajeros.get():
+            self.pasajeros.set(pasajeros)
+            self.label_pasajeros.config(text=f"Pasajeros pasaron: {pasajeros}")
+
     def _send_chatbot_command(self):
         text = self.chat_entry.get().strip()
         if not text:
@@ -679,20 +887,22 @@ class InterfazNoria:
 
     def _shutdown(self):
         print("⏹ Cerrando aplicación — iniciando shutdown...")
+        print("📊 Arranque (s):", self.tiempos)
+        if self.prefetcher:
+            print("📊 Prefetch de paletas:", self.prefetcher.stats())
+            self.prefetcher.close()
+        if isinstance(self.color_source, HedgedProvider):
+            print("📊 Hedging IA:", self.color_source.stats())
         def do_shutdown():
             try:
-                if self.mqtt_client:
-                    print("🔌 Deteniendo loop MQTT...")
-                    try:
-                        self.mqtt_client.loop_stop()
-                    except Exception as e:
-                        print("⚠️ Error al detener loop MQTT:", e)
-                    print("🔌 Desconectando broker MQTT...")
-                    try:
-                        self.mqtt_client.disconnect()
-                        print("✔ MQTT desconectado correctamente.")
-                    except Exception as e:
-                        print("⚠️ Error al desconectar MQTT:", e)
+                # Enviar lo que quede pendiente antes de desconectar
+                self.publisher.close()
+                print("📊 Publicaciones MQTT:", self.publisher.stats())
+                print("📊 Mensajes entrantes:", self.inbox.stats())
+                print("📊 Telemetría distancia:", self.telemetria.stats())
+                print("📊 Conexión MQTT:", self.mqtt.stats())
+                print("🔌 Desconectando broker MQTT...")
+                self.mqtt.stop()
             except Exception as e:
                 print("⚠️ Error durante shutdown:", e)
             self.root.after(50, self.root.destroy)
@@ -702,4 +912,6 @@ class InterfazNoria:
 if __name__ == "__main__":
     root = tk.Tk()
     app = InterfazNoria(root)
+    if os.environ.get("NORIA_STARTUP_BENCH"):
+        app.reportar_arranque()
     root.mainloop()
@@ -0,0 +1,322 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+class ProviderError(Exception):
+    """El proveedor no pudo generar una paleta válida."""
+
+
+class PaletteResult:
+    """Resultado normalizado de cualquier proveedor de colores."""
+
+    def __init__(self, colors, provider, latency, fallback=False):
+        self.colors = [tuple(int(v) for v in c) for c in colors]   # [(r,g,b), ...]
+        self.provider = provider
+        self.latency = latency   # segundos
+        self.fallback = fallback
+
+    def as_dict(self):
+        """Formato de GeminiColorAPI: {"colors": [{"r":..,"g":..,"b":..}, ...]}"""
+        data = {
+            "colors": [{"r": r, "g": g, "b": b} for (r, g, b) in self.colors],
+            "source": self.provider,
+        }
+        if self.fallback:
+            data["fallback"] = True
+        return data
+
+    def as_strings(self):
+        """Formato de ChatGPTColorAPI: ["R,G,B", ...]"""
+        return [f"{r},{g},{b}" for (r, g, b) in self.colors]
+
+    def __repr__(self):
+        return f"PaletteResult({self.provider}, {self.colors}, {self.latency * 1000:.0f} ms)"
+
+
+# ============================================================
+# Interfaz común
+# ============================================================
+class ColorProvider:
+    """
+    Interfaz común de los proveedores de paletas.
+
+    Las subclases implementan _generate(prompt, n_colors) -> [(r,g,b), ...]
+    y lanzan ProviderError si fallan (nunca devuelven un color de respaldo).
+    Si tienen caché, cached() la consulta antes: los aciertos no cuentan
+    como latencia (si no, el p95 del hedging se hundiría a microsegundos).
+    use_cache=False no lee ni guarda en la caché; refresh=True no la lee
+    pero guarda la respuesta nueva (como en GeminiColorAPI).
+    """
+
+    name = "base"
+
+    def __init__(self, latency_window=128, fallback=None, mode="fallback"):
+        self._latencias = deque(maxlen=latency_window)
+        self._lock = threading.Lock()
+        # Motor local para get_colors_from_prompt ("local", "local_first"
+        # y "fallback" cuando el proveedor falla)
+        self.fallback = fallback
+        # Modo por defecto de get_colors_from_prompt (los de GeminiColorAPI)
+        self.mode = mode
+        self._refine_executor = None   # solo lo usa local_first: se crea al primer uso
+        self._refine_lock = threading.Lock()
+
+    def generate(self, prompt, n_colors=5, cancel_event=None, use_cache=True, refresh=False):
+        colors = self.cached(prompt, n_colors) if use_cache and not refresh else None
+        if colors is not None:
+            return PaletteResult(colors, self.name, 0.0)
+
+        t0 = time.perf_counter()
+        colors = self._generate(prompt, n_colors, cancel_event, use_cache)
+        latencia = time.perf_counter() - t0
+        with self._lock:
+            self._latencias.append(latencia)
+        return PaletteResult(colors, self.name, latencia)
+
+    def _generate(self, prompt, n_colors, cancel_event, use_cache=True):
+        raise NotImplementedError
+
+    def cached(self, prompt, n_colors):
+        """Paleta en caché [(r,g,b), ...] o None (por defecto no hay caché)."""
+        return None
+
+    def latency_percentile(self, q=0.95):
+        """Percentil q de las latencias de éxito recientes (None si no hay datos)."""
+        with self._lock:
+            lat = sorted(self._latencias)
+        if not lat:
+            return None
+        return lat[min(len(lat) - 1, int(len(lat) * q))]
+
+    def samples(self):
+        with self._lock:
+            return len(self._latencias)
+
+    # Compatibilidad con el código que espera GeminiColorAPI (misma firma)
+    def get_colors_from_prompt(self, prompt, n_colors=5, use_cache=True, refresh=False,
+                               mode=None, on_refine=None):
+        """
+        mode (por defecto self.mode), como en GeminiColorAPI:
+          "llm"         -> solo el proveedor (si falla: rojo)
+          "fallback"    -> el proveedor; si falla, el motor local
+          "local"       -> solo el motor local
+          "local_first" -> motor local al instante; on_refine(data) recibe
+                           después la paleta del proveedor
+        """
+        mode = mode or self.mode
+
+        if mode in ("local", "local_first") and self.fallback is None:
+            raise ValueError(f"El modo {mode!r} necesita un motor local (fallback=...)")
+
+        if mode == "local":
+            return self._local(prompt, n_colors)
+
+        if mode == "local_first":
+            colors = self.cached(prompt, n_colors) if use_cache and not refresh else None
+            if colors is not None:
+                return PaletteResult(colors, self.name, 0.0).as_dict()
+            self._refinador().submit(self._refinar, prompt, n_colors, use_cache, on_refine)
+            return self._local(prompt, n_colors)
+
+        try:
+            return self.generate(prompt, n_colors, use_cache=use_cache, refresh=refresh).as_dict()
+        except ProviderError as e:
+            print(f"❌ Proveedor {self.name} falló:", e)
+            if mode == "fallback" and self.fallback is not None:
+                return self._local(prompt, n_colors, fallback=True)
+            return {"colors": [{"r": 255, "g": 0, "b": 0}] * n_colors, "fallback": True}
+
+    def _local(self, prompt, n_colors, fallback=False):
+        return PaletteResult(self.fallback.generate(prompt, n_colors), "local", 0.0, fallback=fallback).as_dict()
+
+    def _refinador(self):
+        with self._refine_lock:
+            if self._refine_executor is None:
+                self._refine_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="refinar")
+            return self._refine_executor
+
+    def _refinar(self, prompt, n_colors, use_cache, on_refine):
+        # La caché ya se miró en get_colors_from_prompt: refresh=True
+        try:
+            data = self.generate(prompt, n_colors, use_cache=use_cache, refresh=True).as_dict()
+        except ProviderError as e:
+            print(f"❌ Proveedor {self.name} falló:", e)
+            return
+        if on_refine is not None:
+            try:
+                on_refine(data)
+            except Exception as e:
+                print("⚠️ Error en on_refine:", e)
+
+    def close(self):
+        with self._refine_lock:
+            if self._refine_executor is not None:
+                self._refine_executor.shutdown(wait=False)
+
+
+# ============================================================
+# Adaptadores
+# ============================================================
+class GeminiProvider(ColorProvider):
+    """OpenRouter / Gemini a través de GeminiColorAPI (con su caché)."""
+
+    name = "gemini"
+
+    def __init__(self, client, **kwargs):
+        super().__init__(**kwargs)
+        self.client = client
+
+    def cached(self, prompt, n_colors):
+        data = self.client._cached_colors(prompt, n_colors, use_cache=True, refresh=False)
+        if data is None:
+            return None
+        return [(c["r"], c["g"], c["b"]) for c in data["colors"]]
+
+    def _generate(self, prompt, n_colors, cancel_event, use_cache=True):
+        # Siempre a la red (la caché ya se miró en cached()); guarda el resultado
+        if cancel_event is None:
+            data = self.client._llm_colors(prompt, n_colors, use_cache)
+        else:
+            with self.client.transport.cancel_scope(cancel_event):
+                data = self.client._llm_colors(prompt, n_colors, use_cache)
+
+        if data is None:
+            raise ProviderError("OpenRouter no devolvió colores")
+        return [(c["r"], c["g"], c["b"]) for c in data["colors"]]
+
+
+class ChatGPTProvider(ColorProvider):
+    """OpenAI a través de ChatGPTColorAPI."""
+
+    name = "chatgpt"
+
+    def __init__(self, client, **kwargs):
+        super().__init__(**kwargs)
+        self.client = client
+
+    def _generate(self, prompt, n_colors, cancel_event, use_cache=True):
+        if cancel_event is None:
+            colors = self.client._fetch_colors(prompt, n_colors)
+        else:
+            with self.client.transport.cancel_scope(cancel_event):
+                colors = self.client._fetch_colors(prompt, n_colors)
+
+        if not colors:
+            raise ProviderError("OpenAI no devolvió colores")
+        colors = [tuple(int(v) for v in c.split(",")) for c in colors][:n_colors]
+        while len(colors) < n_colors:
+            colors.append(colors[len(colors) % len(colors)])
+        return colors
+
+
+class LocalProvider(ColorProvider):
+    """Motor de paletas local (sin red)."""
+
+    name = "local"
+
+    def __init__(self, engine, **kwargs):
+        super().__init__(**kwargs)
+        self.engine = engine
+
+    def _generate(self, prompt, n_colors, cancel_event, use_cache=True):
+        return self.engine.generate(prompt, n_colors)
+
+
+# ============================================================
+# Hedging entre dos proveedores
+# ============================================================
+class HedgedProvider(ColorProvider):
+    """
+    Peticiones 'hedged': se lanza el primario y, si no responde antes de
+    un plazo basado en su p95 reciente (o falla antes), se lanza también
+    el secundario. Gana el primero que responda bien y el otro se cancela
+    (no se hacen más reintentos y su resultado se descarta).
+    """
+
+    name = "hedged"
+
+    def __init__(self, primary, secondary, percentile=0.95, min_samples=5,
+                 default_deadline=1.5, min_deadline=0.2, max_workers=4, **kwargs):
+        super().__init__(**kwargs)
+        self.primary = primary
+        self.secondary = secondary
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.default_deadline = default_deadline
+        self.min_deadline = min_deadline
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge")
+
+        # Métricas
+        self.hedges = 0
+        self.wins = {primary.name: 0, secondary.name: 0}
+        self.failures = 0
+
+    def deadline(self):
+        if self.primary.samples() < self.min_samples:
+            return self.default_deadline
+        return max(self.min_deadline, self.primary.latency_percentile(self.percentile))
+
+    def cached(self, prompt, n_colors):
+        return self.primary.cached(prompt, n_colors)
+
+    def generate(self, prompt, n_colors=5, cancel_event=None, use_cache=True, refresh=False):
+        # Acierto de caché del primario: ni hilos ni hedge
+        colors = self.cached(prompt, n_colors) if use_cache and not refresh else None
+        if colors is not None:
+            return PaletteResult(colors, self.primary.name, 0.0)
+
+        t0 = time.perf_counter()
+        result = self._hedge(prompt, n_colors, use_cache)
+        result.latency = time.perf_counter() - t0
+        with self._lock:
+            self._latencias.append(result.latency)
+        return result
+
+    def _hedge(self, prompt, n_colors, use_cache=True):
+        cancel = {self.primary: threading.Event(), self.secondary: threading.Event()}
+        # refresh=True: la caché del primario ya se miró en generate()
+        opciones = {"use_cache": use_cache, "refresh": True}
+        futuros = {
+            self._executor.submit(self.primary.generate, prompt, n_colors, cancel[self.primary], **opciones): self.primary
+        }
+
+        hecho, _ = wait(futuros, timeout=self.deadline())
+        if not hecho or next(iter(hecho)).exception() is not None:
+            # El primario tarda más que su p95 (o ya falló): lanzar el secundario
+            with self._lock:
+                self.hedges += 1
+            futuros[self._executor.submit(self.secondary.generate, prompt, n_colors, cancel[self.secondary], **opciones)] = self.secondary
+
+        pendientes = set(futuros)
+        while pendientes:
+            hecho, pendientes = wait(pendientes, return_when=FIRST_COMPLETED)
+            for fut in hecho:
+                if fut.exception() is not None:
+                    continue
+                ganador = futuros[fut]
+                for otro_fut, otro in futuros.items():
+                    if otro is not ganador:
+                        cancel[otro].set()
+                        otro_fut.cancel()
+                with self._lock:
+                    self.wins[ganador.name] += 1
+                return fut.result()
+
+        with self._lock:
+            self.failures += 1
+        raise ProviderError("Ningún proveedor devolvió colores")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "plazo_ms": self.deadline() * 1000,
+                "hedges": self.hedges,
+                "victorias": dict(self.wins),
+                "fallos": self.failures,
+            }
+
+    def close(self):
+        super().close()
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,208 @@
+import unicodedata
+import zlib
+
+import numpy as np
+
+
+# ============================================================
+# Tabla de temas: palabra clave -> (tono°, saturación, brillo, armonía)
+# ============================================================
+THEMES = {
+    "fuego":      (12, 0.95, 1.00, "analogous"),
+    "fire":       (12, 0.95, 1.00, "analogous"),
+    "mar":        (200, 0.85, 0.90, "analogous"),
+    "oceano":     (200, 0.85, 0.90, "analogous"),
+    "ocean":      (200, 0.85, 0.90, "analogous"),
+    "agua":       (190, 0.75, 0.95, "analogous"),
+    "water":      (190, 0.75, 0.95, "analogous"),
+    "bosque":     (120, 0.80, 0.70, "analogous"),
+    "forest":     (120, 0.80, 0.70, "analogous"),
+    "noche":      (240, 0.85, 0.55, "split"),
+    "night":      (240, 0.85, 0.55, "split"),
+    "atardecer":  (25, 0.90, 1.00, "split"),
+    "sunset":     (25, 0.90, 1.00, "split"),
+    "navidad":    (0, 0.95, 0.90, "complementary"),
+    "christmas":  (0, 0.95, 0.90, "complementary"),
+    "halloween":  (28, 1.00, 1.00, "split"),
+    "primavera":  (95, 0.55, 1.00, "triadic"),
+    "spring":     (95, 0.55, 1.00, "triadic"),
+    "verano":     (48, 0.90, 1.00, "triadic"),
+    "summer":     (48, 0.90, 1.00, "triadic"),
+    "otono":      (30, 0.85, 0.80, "analogous"),
+    "autumn":     (30, 0.85, 0.80, "analogous"),
+    "invierno":   (205, 0.35, 1.00, "analogous"),
+    "winter":     (205, 0.35, 1.00, "analogous"),
+    "arcoiris":   (0, 1.00, 1.00, "tetradic"),
+    "rainbow":    (0, 1.00, 1.00, "tetradic"),
+    "pastel":     (330, 0.35, 1.00, "triadic"),
+    "neon":       (300, 1.00, 1.00, "triadic"),
+    "circo":      (355, 0.95, 1.00, "triadic"),
+    "circus":     (355, 0.95, 1.00, "triadic"),
+    "feria":      (45, 0.95, 1.00, "triadic"),
+    "fair":       (45, 0.95, 1.00, "triadic"),
+    "vibrante":   (320, 1.00, 1.00, "triadic"),
+    "vibrantes":  (320, 1.00, 1.00, "triadic"),
+    "vibrant":    (320, 1.00, 1.00, "triadic"),
+    "calma":      (170, 0.45, 0.85, "analogous"),
+    "calm":       (170, 0.45, 0.85, "analogous"),
+    "amor":       (340, 0.85, 0.95, "analogous"),
+    "love":       (340, 0.85, 0.95, "analogous"),
+    "rojo":       (0, 1.00, 1.00, "analogous"),
+    "red":        (0, 1.00, 1.00, "analogous"),
+    "naranja":    (30, 1.00, 1.00, "analogous"),
+    "orange":     (30, 1.00, 1.00, "analogous"),
+    "amarillo":   (55, 1.00, 1.00, "analogous"),
+    "yellow":     (55, 1.00, 1.00, "analogous"),
+    "verde":      (120, 1.00, 0.90, "analogous"),
+    "green":      (120, 1.00, 0.90, "analogous"),
+    "azul":       (225, 1.00, 1.00, "analogous"),
+    "blue":       (225, 1.00, 1.00, "analogous"),
+    "morado":     (275, 0.90, 0.90, "analogous"),
+    "purple":     (275, 0.90, 0.90, "analogous"),
+    "rosa":       (330, 0.70, 1.00, "analogous"),
+    "pink":       (330, 0.70, 1.00, "analogous"),
+}
+
+# Desplazamientos de tono (grados) de cada regla de armonía
+HARMONIES = {
+    "complementary": (0, 180),
+    "analogous":     (0, -30, 30),
+    "triadic":       (0, 120, 240),
+    "split":         (0, 150, 210),
+    "tetradic":      (0, 90, 180, 270),
+}
+
+
+def _normalizar(texto):
+    """Minúsculas y sin tildes: 'Otoño' -> 'otono'."""
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+
+# ============================================================
+# Conversión de color (vectorizada con NumPy)
+# ============================================================
+def _hsv_to_rgb(h, s, v):
+    """h, s, v en [0, 1] (arrays) -> array (..., 3) en [0, 1]."""
+    i = np.floor(h * 6.0).astype(int) % 6
+    f = h * 6.0 - np.floor(h * 6.0)
+    p = v * (1.0 - s)
+    q = v * (1.0 - f * s)
+    t = v * (1.0 - (1.0 - f) * s)
+
+    r = np.choose(i, [v, q, p, p, t, v])
+    g = np.choose(i, [t, v, v, q, p, p])
+    b = np.choose(i, [p, p, t, v, v, q])
+    return np.stack([r, g, b], axis=-1)
+
+
+_M1 = np.array([[0.4122214708, 0.5363325363, 0.0514459929],
+                [0.2119034982, 0.6806995451, 0.1073969566],
+                [0.0883024619, 0.2817188376, 0.6299787005]])
+_M2 = np.array([[0.2104542553, 0.7936177850, -0.0040720468],
+                [1.9779984951, -2.4285922050, 0.4505937099],
+                [0.0259040371, 0.7827717662, -0.8086757660]])
+_M1_INV = np.linalg.inv(_M1)
+_M2_INV = np.linalg.inv(_M2)
+
+
+def _srgb_to_oklab(rgb):
+    lineal = np.where(rgb <= 0.04045, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+    lms = np.cbrt(lineal @ _M1.T)
+    return lms @ _M2.T
+
+
+def _oklab_to_srgb(lab):
+    lms = (lab @ _M2_INV.T) ** 3
+    lineal = np.clip(lms @ _M1_INV.T, 0.0, 1.0)
+    return np.where(lineal <= 0.0031308, lineal * 12.92, 1.055 * lineal ** (1 / 2.4) - 0.055)
+
+
+# ============================================================
+# Clase: LocalPaletteEngine
+# ============================================================
+class LocalPaletteEngine:
+    """
+    Generador de paletas local y determinista (sin red).
+
+    El prompt se busca en la tabla de temas (español/inglés); si no hay
+    coincidencia, el tono base sale de un hash del texto. A partir del
+    color base se aplica una regla de armonía (complementario, triádico,
+    análogo...) rotando el tono en HSV o en OKLab (perceptualmente
+    uniforme). Todo el lote se calcula con NumPy en una sola pasada.
+    """
+
+    def __init__(self, space="oklab"):
+        if space not in ("oklab", "hsv"):
+            raise ValueError("space debe ser 'oklab' o 'hsv'")
+        self.space = space
+
+    # -------------------------------------------------------------
+    def _tema(self, prompt):
+        texto = _normalizar(prompt)
+        semilla = zlib.crc32(texto.encode("utf-8"))
+
+        for palabra in texto.replace(",", " ").replace(".", " ").split():
+            if palabra in THEMES:
+                return THEMES[palabra], semilla
+
+        # Sin tema conocido: tono derivado del hash, armonía triádica
+        return (semilla % 360, 0.85, 1.0, "triadic"), semilla
+
+    def _tonos(self, prompts, n_colors):
+        """Devuelve arrays (P, n) de tono [0,1), saturación y brillo."""
+        h = np.empty((len(prompts), n_colors))
+        s = np.empty((len(prompts), 1))
+        v = np.empty((len(prompts), 1))
+        paso = np.empty((len(prompts), n_colors))
+
+        idx = np.arange(n_colors)
+        for fila, prompt in enumerate(prompts):
+            (tono, sat, bri, armonia), semilla = self._tema(prompt)
+            offsets = np.asarray(HARMONIES[armonia], dtype=float)
+            # Pequeña variación determinista por prompt (±8°)
+            jitter = (semilla >> 8) % 17 - 8
+            h[fila] = tono + jitter + offsets[idx % len(offsets)]
+            s[fila] = sat
+            v[fila] = bri
+            paso[fila] = idx // len(offsets)   # vuelta de la armonía
+
+        return (h % 360.0) / 360.0, s, v, paso
+
+    # -------------------------------------------------------------
+    def generate_batch(self, prompts, n_colors=5):
+        """Lista de paletas [[(r,g,b), ...], ...], una por prompt."""
+        if not prompts or n_colors <= 0:
+            return [[] for _ in prompts]
+
+        h, s, v, paso = self._tonos(prompts, n_colors)
+        # Cada vuelta completa de la armonía se oscurece un poco
+        v = np.clip(v * (1.0 - 0.18 * paso), 0.15, 1.0)
+        s = np.broadcast_to(s, h.shape)
+
+        if self.space == "hsv":
+            rgb = _hsv_to_rgb(h, s, v)
+        else:
+            # Color base en HSV -> OKLab, y rotación del tono en OKLCh
+            base = _hsv_to_rgb(h[:, :1], s[:, :1], v[:, :1])
+            lab = _srgb_to_oklab(base)
+            L = lab[..., 0] * (v / v[:, :1])
+            C = np.hypot(lab[..., 1], lab[..., 2])
+            delta = (h - h[:, :1]) * 2.0 * np.pi
+            ang = np.arctan2(lab[..., 2], lab[..., 1]) + delta
+            lab = np.stack([L, C * np.cos(ang), C * np.sin(ang)], axis=-1)
+            rgb = _oklab_to_srgb(lab)
+
+        rgb8 = np.clip(np.rint(rgb * 255.0), 0, 255).astype(int)
+        return [[tuple(int(c) for c in color) for color in fila] for fila in rgb8]
+
+    def generate(self, prompt, n_colors=5):
+        """Paleta [(r,g,b), ...] para un solo prompt."""
+        return self.generate_batch([prompt], n_colors)[0]
+
+    def get_colors_from_prompt(self, prompt, n_colors=5, **_kwargs):
+        """Misma forma de salida que GeminiColorAPI."""
+        return {
+            "colors": [{"r": r, "g": g, "b": b} for (r, g, b) in self.generate(prompt, n_colors)],
+            "source": "local",
+        }
@@ -1,42 +1,251 @@
-import paho.mqtt.client as mqtt
+import queue
 import threading
+import time
+import zlib
+
+from config import app_config
+from mqtt_transport import MQTTTransport
+
+
+class ShardedHandlerPool:
+    """
+    Reparte trabajo entre n hilos según una clave (el id de la noria).
+
+    La misma clave cae siempre en el mismo hilo, así los mensajes de una
+    noria se procesan en orden, y norias distintas avanzan en paralelo.
+    Cada hilo tiene una cola acotada: si se llena se descarta el mensaje
+    (el hilo de red de MQTT nunca se bloquea).
+    """
+
+    def __init__(self, n_shards=4, max_queue=1000):
+        self.n_shards = max(1, int(n_shards))
+        self._colas = [queue.Queue(maxsize=max_queue) for _ in range(self.n_shards)]
+        self._lock = threading.Lock()
+        self.processed = [0] * self.n_shards
+        self.dropped = 0
+        self.errors = 0
+
+        self._hilos = []
+        for i, cola in enumerate(self._colas):
+            hilo = threading.Thread(target=self._bucle, args=(i, cola), name=f"fleet-{i}", daemon=True)
+            hilo.start()
+            self._hilos.append(hilo)
+
+    def shard_of(self, key):
+        return zlib.crc32(key.encode()) % self.n_shards
+
+    def submit(self, key, fn, *args):
+        try:
+            self._colas[self.shard_of(key)].put_nowait((fn, args))
+            return True
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+
+    def _bucle(self, i, cola):
+        while True:
+            item = cola.get()
+            if item is None:
+                return
+            fn, args = item
+            try:
+                fn(*args)
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                print("⚠️ Error en handler de noria:", e)
+            self.processed[i] += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "shards": self.n_shards,
+                "procesados": sum(self.processed),
+                "por_shard": list(self.processed),
+                "en_cola": [c.qsize() for c in self._colas],
+                "descartados": self.dropped,
+                "errores": self.errors,
+            }
+
+    def close(self):
+        for cola in self._colas:
+            cola.put(None)
+
 
 class MQTTClientPC:
     """
     Cliente MQTT para la PC que maneja la interfaz Tkinter.
     Se conecta al broker y comunica los estados entre la interfaz y la Raspberry.
+    La conexión (reconexión, sesión persistente, cola sin conexión) la
+    gestiona MQTTTransport, el mismo transporte que usa la interfaz.
+
+    Modo flota (enable_fleet): muchas norias con una sola conexión, con
+    tópicos por id de dispositivo:
+
+        <base>/<id>/<sub>            estado / control de una noria
+        <base>/grupo/<grupo>/<sub>   comandos para un grupo
+        <base>/todas/<sub>           comandos para todas
+
+    Los comandos van a sub="control" o "control/<tópico>": la ESP32 (con
+    DEVICE_ID en noria_esp32.py) trata <base>/.../control/neopixel como
+    esp32/neopixel. Lo que publica la noria (estado, metrics) marca el
+    dispositivo como visto. Los mensajes entrantes se reparten por id en un
+    ShardedHandlerPool.
     """
 
-    def __init__(self, broker, port, topic_estado, topic_control, on_message_callback=None):
+    GRUPO = "grupo"
+    TODAS = "todas"
+
+    def __init__(self, broker, port, topic_estado, topic_control, on_message_callback=None,
+                 transport=None, **transport_kwargs):
         self.broker = broker
         self.port = port
         self.topic_estado = topic_estado
         self.topic_control = topic_control
         self.on_message_callback = on_message_callback
 
-        self.client = mqtt.Client()
-        self.client.on_connect = self.on_connect
-        self.client.on_message = self._on_message_wrapper
+        self.transport = transport or MQTTTransport(broker, port, **transport_kwargs)
+        self.transport.on_message = self._on_message_wrapper
+        self.transport.subscribe(self.topic_estado)
 
-    def on_connect(self, client, userdata, flags, rc):
-        print(f"🔗 Conectado al broker MQTT ({self.broker}:{self.port}) con código {rc}")
-        self.client.subscribe(self.topic_estado)
+        # Flota (desactivada hasta enable_fleet)
+        self.fleet_base = None
+        self.group_mode = "broker"
+        self.on_device_message = None
+        self.pool = None
+        self.devices = {}     # id -> {"grupos": set, "visto": ts, "estado": str}
+        self.groups = {}      # grupo -> set(ids)
+        self._fleet_lock = threading.Lock()
 
-    def _on_message_wrapper(self, client, userdata, msg):
+    def _on_message_wrapper(self, topic, payload):
+        if self.handle_fleet_message(topic, payload):
+            return
         if self.on_message_callback:
             # Llamamos la función que se definió desde la interfaz principal
-            self.on_message_callback(msg.topic, msg.payload.decode())
+            self.on_message_callback(topic, payload.decode(errors="replace"))
 
     def connect(self):
-        try:
-            self.client.connect(self.broker, self.port, 60)
-            threading.Thread(target=self.client.loop_forever, daemon=True).start()
-        except Exception as e:
-            print("❌ Error al conectar con el broker:", e)
+        # No bloquea: si el broker no responde se reintenta en segundo plano
+        self.transport.start()
 
     def publish(self, topic, message):
         print(f"📤 Publicando en {topic} -> {message}")
-        try:
-            self.client.publish(topic, message)
-        except Exception as e:
-            print("⚠️ Error al publicar:", e)
+        if not self.transport.publish(topic, message):
+            print("⏳ Sin conexión: se enviará al reconectar")
+
+    # ==================================================================
+    #                              FLOTA
+    # ==================================================================
+    def enable_fleet(self, base=None, shards=None, on_device_message=None,
+                     group_mode=None, max_queue=1000, mqtt_config=None):
+        """
+        Activa el modo flota: una sola suscripción <base>/+/# para todas
+        las norias. on_device_message(device_id, sub, payload) se ejecuta
+        en el shard de esa noria. base, shards y group_mode salen de
+        config.MQTTConfig (TOPIC_BASE, FLEET_SHARDS, FLEET_GROUP_MODE) si
+        no se pasan.
+
+        group_mode:
+          "broker"     -> un solo mensaje al tópico del grupo; el broker lo
+                          reparte (las norias se suscriben a su grupo)
+          "per_device" -> un mensaje por noria del grupo (norias que solo
+                          escuchan su propio tópico)
+        """
+        mqtt_config = mqtt_config or app_config.mqtt
+        base = base or mqtt_config.TOPIC_BASE
+        shards = shards or mqtt_config.FLEET_SHARDS
+        group_mode = group_mode or mqtt_config.FLEET_GROUP_MODE
+        if group_mode not in ("broker", "per_device"):
+            raise ValueError("group_mode debe ser 'broker' o 'per_device'")
+        self.fleet_base = base.rstrip("/")
+        self.group_mode = group_mode
+        self.on_device_message = on_device_message
+        self.pool = ShardedHandlerPool(shards, max_queue=max_queue)
+        self.transport.subscribe(f"{self.fleet_base}/+/#")
+
+    def add_device(self, device_id, groups=()):
+        with self._fleet_lock:
+            info = self.devices.setdefault(device_id, {"grupos": set(), "visto": None, "estado": None})
+            for g in groups:
+                info["grupos"].add(g)
+                self.groups.setdefault(g, set()).add(device_id)
+
+    def remove_device(self, device_id):
+        with self._fleet_lock:
+            info = self.devices.pop(device_id, None)
+            if info:
+                for g in info["grupos"]:
+                    self.groups.get(g, set()).discard(device_id)
+
+    def handle_fleet_message(self, topic, payload):
+        """
+        Reparte un mensaje de la flota (<base>/<id>/<sub...>) a su shard.
+        True si era de la flota (quien comparta el transporte, como el
+        daemon, lo llama antes de su propio enrutado).
+        """
+        if self.fleet_base is None or not topic.startswith(self.fleet_base + "/"):
+            return False
+        partes = topic[len(self.fleet_base) + 1:].split("/", 1)
+        if len(partes) != 2:
+            return False   # p. ej. noria/estado del modo de una sola noria
+        device_id, sub = partes
+        if device_id in (self.GRUPO, self.TODAS) or sub == "control" or sub.startswith("control/"):
+            return True    # eco de nuestros propios comandos
+        self.pool.submit(device_id, self._handle_device, device_id, sub, payload)
+        return True
+
+    def _handle_device(self, device_id, sub, payload):
+        texto = payload.decode(errors="replace")
+        with self._fleet_lock:
+            info = self.devices.get(device_id)
+            if info is None:
+                # Descubrimiento automático: cualquier noria que publique
+                info = self.devices[device_id] = {"grupos": set(), "visto": None, "estado": None}
+            info["visto"] = time.time()
+            if sub == "estado":
+                info["estado"] = texto
+        if self.on_device_message:
+            self.on_device_message(device_id, sub, texto)
+
+    def device_topic(self, device_id, sub="control"):
+        return f"{self.fleet_base}/{device_id}/{sub}"
+
+    def publish_device(self, device_id, message, sub="control"):
+        return self.transport.publish(self.device_topic(device_id, sub), message)
+
+    def publish_group(self, group, message, sub="control"):
+        """
+        Comando para un grupo (group=None -> todas las norias).
+        Devuelve cuántos mensajes se publicaron.
+        """
+        if self.group_mode == "broker":
+            destino = self.TODAS if group is None else f"{self.GRUPO}/{group}"
+            self.transport.publish(f"{self.fleet_base}/{destino}/{sub}", message)
+            return 1
+
+        with self._fleet_lock:
+            ids = list(self.devices) if group is None else list(self.groups.get(group, ()))
+        for device_id in ids:
+            self.publish_device(device_id, message, sub)
+        return len(ids)
+
+    def publish_all(self, message, sub="control"):
+        return self.publish_group(None, message, sub)
+
+    def fleet_stats(self):
+        with self._fleet_lock:
+            activas = sum(1 for d in self.devices.values() if d["visto"] is not None)
+            resumen = {"norias": len(self.devices), "activas": activas, "grupos": len(self.groups)}
+        if self.pool:
+            resumen["pool"] = self.pool.stats()
+        return resumen
+
+    # ==================================================================
+    def stats(self):
+        return self.transport.stats()
+
+    def close(self):
+        if self.pool:
+            self.pool.close()
+        self.transport.stop()
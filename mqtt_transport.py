@@ -0,0 +1,197 @@
+import threading
+import time
+from collections import deque
+
+import paho.mqtt.client as mqtt
+
+
+class MQTTTransport:
+    """
+    Conexión MQTT compartida por la interfaz y MQTTClientPC.
+
+    - Sesión persistente (client_id fijo + clean_session=False): el broker
+      guarda las suscripciones y los mensajes QoS>0 mientras no estamos.
+      Sin client_id no hay sesión que recuperar y se usa sesión limpia.
+    - Conexión asíncrona con reconexión automática y backoff exponencial
+      (reconnect_delay_set de paho): si el broker está caído al arrancar,
+      se sigue intentando en segundo plano en vez de rendirse.
+    - Las suscripciones se recuerdan y se renuevan al reconectar.
+    - Lo que se publica sin conexión va a una cola acotada y se reenvía
+      en orden al reconectar (si se llena, se descarta lo más antiguo).
+    - Métricas: reconexiones, tiempo sin conexión, profundidad de cola.
+
+    on_message(topic, payload) recibe el payload en bytes.
+    on_state(conectado) se llama en cada conexión / desconexión.
+    """
+
+    def __init__(self, broker, port=1883, client_id=None, user="", password="",
+                 keepalive=60, clean_session=None, qos=1, use_tls=False,
+                 reconnect_min=1, reconnect_max=60, offline_queue=200,
+                 on_message=None, on_state=None):
+        self.broker = broker
+        self.port = port
+        self.keepalive = keepalive
+        self.qos = qos
+        self.on_message = on_message
+        self.on_state = on_state
+        if clean_session is None:
+            clean_session = not client_id
+        elif not clean_session and not client_id:
+            print("⚠️ Sesión persistente sin client_id: se usa sesión limpia")
+            clean_session = True
+        self.clean_session = clean_session
+
+        self.client = mqtt.Client(client_id=client_id or "", clean_session=clean_session)
+        if user:
+            self.client.username_pw_set(user, password)
+        if use_tls:
+            self.client.tls_set()
+        self.client.reconnect_delay_set(min_delay=reconnect_min, max_delay=reconnect_max)
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+        self.client.on_message = self._on_message
+
+        self._subs = {}                                      # topic -> qos
+        self._cola = deque(maxlen=max(1, int(offline_queue)))
+        self._lock = threading.Lock()
+        self.connected = False
+        self._desconectado_desde = time.monotonic()
+
+        # Métricas
+        self.connects = 0
+        self.disconnects = 0
+        self.last_reconnect_s = None
+        self.max_reconnect_s = 0.0
+        self.queued = 0
+        self.replayed = 0
+        self.dropped = 0
+        self.published = 0
+
+    # -------------------------------------------------------------
+    def start(self):
+        """Arranca el hilo de red. Nunca bloquea ni lanza si el broker no está."""
+        print("🔗 Conectando al broker MQTT...", self.broker, self.port)
+        self.client.connect_async(self.broker, self.port, self.keepalive)
+        self.client.loop_start()
+
+    def stop(self):
+        try:
+            self.client.disconnect()
+        except Exception as e:
+            print("⚠️ Error al desconectar MQTT:", e)
+        self.client.loop_stop()
+
+    # -------------------------------------------------------------
+    def _on_connect(self, client, userdata, flags, rc):
+        if rc != 0:
+            print("❌ MQTT rechazó la conexión (rc =", rc, ")")
+            return
+
+        with self._lock:
+            fuera = time.monotonic() - self._desconectado_desde
+            self.connects += 1
+            if self.connects > 1:
+                self.last_reconnect_s = fuera
+                self.max_reconnect_s = max(self.max_reconnect_s, fuera)
+
+            # Con sesión persistente el broker ya las tiene, pero si la
+            # sesión se perdió (session present = 0) hay que renovarlas
+            if self._subs and not flags.get("session present"):
+                client.subscribe([(t, q) for t, q in self._subs.items()])
+
+            pendientes = list(self._cola)
+            self._cola.clear()
+            self.connected = True
+            for topic, payload, qos, retain in pendientes:
+                client.publish(topic, payload, qos=qos, retain=retain)
+            self.replayed += len(pendientes)
+            self.published += len(pendientes)
+
+        print("🟢 MQTT conectado", f"(reenviados {len(pendientes)} pendientes)" if pendientes else "")
+        if self.on_state:
+            self.on_state(True)
+
+    def _on_disconnect(self, client, userdata, rc):
+        with self._lock:
+            self.connected = False
+            self.disconnects += 1
+            self._desconectado_desde = time.monotonic()
+        if rc != 0:
+            print("❌ MQTT se desconectó inesperadamente (rc =", rc, "), reintentando...")
+        else:
+            print("🔌 MQTT desconectado correctamente.")
+        if self.on_state:
+            self.on_state(False)
+
+    def _on_message(self, client, userdata, msg):
+        if self.on_message:
+            try:
+                self.on_message(msg.topic, msg.payload)
+            except Exception as e:
+                print("⚠️ Error en on_message:", e)
+
+    # -------------------------------------------------------------
+    def subscribe(self, topic, qos=None):
+        qos = self.qos if qos is None else qos
+        with self._lock:
+            self._subs[topic] = qos
+            if self.connected:
+                self.client.subscribe(topic, qos)
+
+    def publish(self, topic, payload, qos=None, retain=False):
+        """Publica, o encola si no hay conexión. Devuelve True si salió ya."""
+        qos = self.qos if qos is None else qos
+        with self._lock:
+            if self.connected:
+                info = self.client.publish(topic, payload, qos=qos, retain=retain)
+                if info.rc == mqtt.MQTT_ERR_SUCCESS:
+                    self.published += 1
+                    return True
+                if qos > 0 and not self.clean_session:
+                    # paho ya lo guardó en la sesión y lo reenviará al reconectar
+                    return False
+            if len(self._cola) == self._cola.maxlen:
+                self.dropped += 1
+            self._cola.append((topic, payload, qos, retain))
+            self.queued += 1
+        return False
+
+    # -------------------------------------------------------------
+    def stats(self):
+        with self._lock:
+            return {
+                "conectado": self.connected,
+                "conexiones": self.connects,
+                "desconexiones": self.disconnects,
+                "ultima_reconexion_s": self.last_reconnect_s,
+                "max_reconexion_s": self.max_reconnect_s,
+                "publicados": self.published,
+                "en_cola": len(self._cola),
+                "encolados": self.queued,
+                "reenviados": self.replayed,
+                "descartados": self.dropped,
+            }
+
+
+def create_mqtt_transport(mqtt_config, suffix="", **kwargs):
+    """
+    MQTTTransport con los parámetros de config.MQTTConfig. Sin CLIENT_ID
+    el id queda vacío (lo asigna el broker) aunque haya suffix.
+    """
+    client_id = mqtt_config.CLIENT_ID
+    if client_id and suffix:
+        client_id += f"-{suffix}"
+    return MQTTTransport(
+        mqtt_config.BROKER, mqtt_config.PORT,
+        client_id=client_id,
+        user=mqtt_config.USER, password=mqtt_config.PASSWORD,
+        keepalive=mqtt_config.KEEPALIVE,
+        clean_session=mqtt_config.CLEAN_SESSION,
+        qos=mqtt_config.QOS,
+        use_tls=mqtt_config.USE_TLS,
+        reconnect_min=mqtt_config.RECONNECT_MIN,
+        reconnect_max=mqtt_config.RECONNECT_MAX,
+        offline_queue=mqtt_config.OFFLINE_QUEUE,
+        **kwargs,
+    )
+
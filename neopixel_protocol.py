@@ -0,0 +1,112 @@
+# neopixel_protocol.py
+"""
+Protocolo binario de tramas para esp32/neopixel.
+
+Trama v1:
+    byte 0-1  : b"NP"        (magic)
+    byte 2    : versión (1)
+    byte 3    : N = número de LEDs en la trama
+    byte 4... : 3*N bytes, un LED tras otro en orden G,R,B
+
+Los datos van en el orden de cable de los WS2812 (GRB), el mismo que usa
+internamente neopixel.NeoPixel en MicroPython: la ESP32 los copia tal
+cual a np.buf con un memoryview, sin bucle por píxel.
+
+El formato de texto "R,G,B" (mismo color en todo el anillo) sigue
+siendo válido; una trama nunca empieza por un dígito.
+"""
+
+import json
+import random
+
+from topics import TOPIC_NEOPIXEL, TOPIC_EFFECT
+
+FRAME_MAGIC = b"NP"
+FRAME_VERSION = 1
+FRAME_HEADER = 4
+NUM_LEDS = 16
+
+
+def is_frame(data):
+    return isinstance(data, (bytes, bytearray)) and len(data) >= FRAME_HEADER and data[:2] == FRAME_MAGIC
+
+
+def encode_frame(colors, num_leds=NUM_LEDS):
+    """
+    colors: [(r,g,b), ...] o [{"r":..,"g":..,"b":..}, ...], uno por LED.
+    Si hay menos colores que LEDs, la paleta se repite alrededor del anillo.
+    """
+    if not colors:
+        raise ValueError("Paleta vacía")
+    if not 0 < num_leds <= 255:
+        raise ValueError("num_leds debe estar entre 1 y 255")
+
+    trip = [
+        (c["r"], c["g"], c["b"]) if isinstance(c, dict) else c
+        for c in colors
+    ]
+
+    frame = bytearray(FRAME_HEADER + 3 * num_leds)
+    frame[0:2] = FRAME_MAGIC
+    frame[2] = FRAME_VERSION
+    frame[3] = num_leds
+
+    i = FRAME_HEADER
+    for led in range(num_leds):
+        r, g, b = trip[led % len(trip)]
+        frame[i] = max(0, min(255, int(g)))
+        frame[i + 1] = max(0, min(255, int(r)))
+        frame[i + 2] = max(0, min(255, int(b)))
+        i += 3
+    return bytes(frame)
+
+
+def decode_frame(data):
+    """Trama -> [(r,g,b), ...] por LED. None si no es una trama v1 válida."""
+    if not is_frame(data) or data[2] != FRAME_VERSION:
+        return None
+    n = data[3]
+    if len(data) < FRAME_HEADER + 3 * n:
+        return None
+    px = data[FRAME_HEADER:FRAME_HEADER + 3 * n]
+    return [(px[i + 1], px[i], px[i + 2]) for i in range(0, 3 * n, 3)]
+
+
+# ============================================================
+# Efectos animados (se calculan en la ESP32, tópico esp32/effect)
+# ============================================================
+EFFECTS = ("gradient", "chase", "breathing", "rainbow", "palette")
+
+
+def encode_effect(name, colors=(), speed=50):
+    """
+    Mensaje JSON de escena para la ESP32: nombre del efecto, paleta y
+    velocidad 0-100. Un solo mensaje por cambio de escena; "off" apaga.
+    """
+    if name != "off" and name not in EFFECTS:
+        raise ValueError(f"Efecto desconocido: {name}")
+
+    palette = [
+        [int(c["r"]), int(c["g"]), int(c["b"])] if isinstance(c, dict) else [int(v) for v in c]
+        for c in colors
+    ]
+    return json.dumps(
+        {"effect": name, "palette": palette, "speed": max(0, min(100, int(speed)))},
+        separators=(",", ":"),
+    )
+
+
+def palette_message(colors, leds):
+    """
+    Mensaje MQTT para mostrar una paleta según config.LedConfig:
+    (tópico, payload). Efecto animado, trama binaria o, en modo texto,
+    un color "R,G,B" al azar de la paleta.
+    """
+    if leds.EFFECT:
+        return TOPIC_EFFECT, encode_effect(leds.EFFECT, colors, leds.EFFECT_SPEED)
+    if leds.BINARY_FRAMES:
+        return TOPIC_NEOPIXEL, encode_frame(colors, leds.NUM_LEDS)
+    c = random.choice(colors)
+    if isinstance(c, dict):
+        c = (c["r"], c["g"], c["b"])
+    return TOPIC_NEOPIXEL, f"{int(c[0])},{int(c[1])},{int(c[2])}"
@@ -0,0 +1,419 @@
+# noria_daemon.py
+"""
+Daemon sin interfaz gráfica para controlar la noria.
+
+Usa los mismos caminos que interfaz.py (MQTTTransport, PublishCoalescer,
+TopicRouter, AsyncColorClient, prefetch de paletas) sobre un event loop
+asyncio, y expone una API JSON local por HTTP:
+
+    GET  /status                      último estado conocido de la noria
+    GET  /metrics                     métricas de MQTT, IA y API
+    POST /speed    {"value": 0-100}   velocidad de la noria (stepper)
+    POST /dc       {"value": 0-100}   velocidad del motor DC
+    POST /lights   {"on": true, "prompt": "..."} | {"on": false}
+    POST /music    {"on": true|false}
+    POST /servo    {"open": true|false} | {"angle": 0-180}
+    POST /chatbot  {"text": "..."}
+
+  Con NORIA_FLEET=1 (modo flota de MQTTClientPC, varias norias):
+    GET  /fleet                       norias vistas, grupos y métricas
+    POST /fleet    {"topic": "neopixel", "message": "0,0,0",
+                    "device": "<id>" | "group": "<grupo>"}   (sin ambos: todas)
+
+    python noria_daemon.py
+    curl -s -X POST localhost:8765/lights -d '{"on": true}'
+
+Todas las conexiones las atiende un único hilo (asyncio): no hay un hilo
+por cliente ni por petición. Las llamadas a la IA corren en el pool fijo
+de AsyncColorClient.
+"""
+
+import asyncio
+import hmac
+import json
+import signal
+import threading
+import time
+
+from config import AppConfig
+from async_color_api import AsyncColorClient, create_color_source
+from palette_prefetch import create_prefetcher
+from mqtt_client_pc import MQTTClientPC
+from mqtt_transport import create_mqtt_transport
+from publish_scheduler import PublishCoalescer
+from topic_router import TopicRouter
+from telemetry import TelemetryRing, PassengerCounter, parse_number
+from neopixel_protocol import palette_message, decode_frame, is_frame
+from topics import (
+    TOPIC_NEOPIXEL, TOPIC_EFFECT, TOPIC_DC_SPEED, TOPIC_STEPPER_SPEED, TOPIC_SONG,
+    TOPIC_SERVO, TOPIC_CHATBOT, TOPIC_ERROR, TOPIC_STATUS, TOPIC_DISTANCE, TOPIC_ALL,
+)
+
+_RAZONES = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found",
+            405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error",
+            502: "Bad Gateway"}
+
+
+class PeticionInvalida(Exception):
+    """Cuerpo o parámetros de la petición no válidos (HTTP 400)."""
+
+
+class NoriaDaemon:
+
+    def __init__(self, config=None):
+        self.config = config or AppConfig()
+        cfg = self.config
+
+        # IA: mismo cliente, hedging y prefetch que la interfaz
+        self.color_gen, self.color_source = create_color_source(cfg)
+        self.colores = AsyncColorClient(self.color_source)
+        self.prefetcher = create_prefetcher(self.color_gen, cfg.prefetch)
+        self.prompt_luces = cfg.prefetch.PROMPTS[0]
+
+        # Estado conocido de la noria (lo actualiza el hilo de MQTT)
+        self._estado_lock = threading.Lock()
+        self.estado = {
+            "mqtt_conectado": False,
+            "stepper_speed": None,
+            "dc_speed": None,
+            "luces": None,
+            "musica": None,
+            "servo": None,
+            "distancia_cm": None,
+            "pasajeros": 0,
+            "status": None,
+            "ultimo_error": None,
+        }
+        self.telemetria = TelemetryRing(
+            capacity=cfg.telemetry.RAW_CAPACITY,
+            bucket_seconds=cfg.telemetry.BUCKET_SECONDS,
+            max_buckets=cfg.telemetry.MAX_BUCKETS,
+        )
+        self.contador_pasajeros = PassengerCounter(
+            threshold_cm=cfg.telemetry.PASSENGER_THRESHOLD_CM,
+            hysteresis_cm=cfg.telemetry.PASSENGER_HYSTERESIS_CM,
+        )
+        self.router = self._crear_router()
+        self._luces_gen = 0
+
+        # MQTT
+        self.mqtt = create_mqtt_transport(
+            cfg.mqtt, suffix="daemon",
+            on_message=self._on_mqtt_message,
+            on_state=lambda conectado: self._set_estado("mqtt_conectado", conectado),
+        )
+        self.mqtt.subscribe(TOPIC_ALL)
+
+        # Flota: MQTTClientPC sobre la misma conexión; reparte por noria
+        # lo que llega a <TOPIC_BASE>/<id>/... y publica los comandos
+        self.flota = None
+        if cfg.mqtt.FLEET_ENABLED:
+            self.flota = MQTTClientPC(cfg.mqtt.BROKER, cfg.mqtt.PORT, cfg.mqtt.TOPIC_ESTADO,
+                                      cfg.mqtt.TOPIC_CONTROL, transport=self.mqtt)
+            self.flota.enable_fleet(mqtt_config=cfg.mqtt)
+            self.mqtt.on_message = self._on_mqtt_message
+        self.publisher = PublishCoalescer(
+            self.mqtt.publish,
+            default_rate=cfg.publish.DEFAULT_RATE,
+            rates=cfg.publish.RATES,
+            passthrough=cfg.publish.PASSTHROUGH,
+            slots=cfg.publish.SLOTS,
+        )
+
+        self.rutas = {
+            ("GET", "/status"): self._api_status,
+            ("GET", "/metrics"): self._api_metrics,
+            ("POST", "/speed"): self._api_speed,
+            ("POST", "/dc"): self._api_dc,
+            ("POST", "/lights"): self._api_lights,
+            ("POST", "/music"): self._api_music,
+            ("POST", "/servo"): self._api_servo,
+            ("POST", "/chatbot"): self._api_chatbot,
+        }
+        if self.flota is not None:
+            self.rutas[("GET", "/fleet")] = self._api_fleet
+            self.rutas[("POST", "/fleet")] = self._api_fleet_command
+
+        # Métricas de la API
+        self.requests = 0
+        self.errors = 0
+        self.clients = 0
+        self.max_clients = 0
+
+    # ==================================================================
+    #                       MQTT -> estado
+    # ==================================================================
+    def _set_estado(self, clave, valor):
+        with self._estado_lock:
+            self.estado[clave] = valor
+
+    def _crear_router(self):
+        router = TopicRouter()
+        router.add(TOPIC_ERROR, lambda t, p: self._set_estado("ultimo_error", p))
+        router.add(TOPIC_STATUS, lambda t, p: self._set_estado("status", p))
+        router.add(TOPIC_NEOPIXEL, lambda t, p: self._set_estado("luces", p))
+        router.add(TOPIC_EFFECT, lambda t, p: self._set_estado("luces", p))
+        router.add(TOPIC_STEPPER_SPEED, lambda t, p: self._set_estado("stepper_speed", p))
+        router.add(TOPIC_DC_SPEED, lambda t, p: self._set_estado("dc_speed", p))
+        router.add(TOPIC_SONG, lambda t, p: self._set_estado("musica", p))
+        router.add(TOPIC_SERVO, lambda t, p: self._set_estado("servo", p))
+        router.add(TOPIC_DISTANCE, self._on_distancia)
+        return router
+
+    def _on_distancia(self, topic, payload):
+        valor = parse_number(payload)
+        if valor is None:
+            return
+        self.telemetria.append(time.time(), valor)
+        self.contador_pasajeros.update(valor)
+        with self._estado_lock:
+            self.estado["distancia_cm"] = valor
+            self.estado["pasajeros"] = self.contador_pasajeros.count
+
+    def _on_mqtt_message(self, topic, raw):
+        if self.flota is not None and self.flota.handle_fleet_message(topic, raw):
+            return
+        if is_frame(raw):
+            leds = decode_frame(raw) or []
+            payload = ", ".join(f"{r},{g},{b}" for (r, g, b) in leds)
+        else:
+            payload = raw.decode(errors="replace")
+        self.router.route(topic, payload)
+
+    # ==================================================================
+    #                         API (handlers)
+    # ==================================================================
+    @staticmethod
+    def _porcentaje(body, clave="value"):
+        try:
+            valor = int(body[clave])
+        except (KeyError, TypeError, ValueError):
+            raise PeticionInvalida(f"'{clave}' debe ser un entero 0-100")
+        if not 0 <= valor <= 100:
+            raise PeticionInvalida(f"'{clave}' debe estar entre 0 y 100")
+        return valor
+
+    async def _api_status(self, body):
+        with self._estado_lock:
+            return dict(self.estado)
+
+    async def _api_metrics(self, body):
+        metricas = {
+            "api": {"peticiones": self.requests, "errores": self.errors,
+                    "clientes": self.clients, "max_clientes": self.max_clients},
+            "mqtt": self.mqtt.stats(),
+            "publicaciones": self.publisher.stats(),
+            "router": self.router.stats(),
+            "ia": self.colores.stats(),
+            "telemetria": self.telemetria.stats(),
+        }
+        if self.prefetcher:
+            metricas["prefetch"] = self.prefetcher.stats()
+        if hasattr(self.color_source, "stats"):
+            metricas["hedging"] = self.color_source.stats()
+        return metricas
+
+    async def _api_speed(self, body):
+        valor = self._porcentaje(body)
+        self.publisher.submit(TOPIC_STEPPER_SPEED, str(valor))
+        return {"stepper_speed": valor}
+
+    async def _api_dc(self, body):
+        valor = self._porcentaje(body)
+        self.publisher.submit(TOPIC_DC_SPEED, str(valor))
+        return {"dc_speed": valor}
+
+    async def _api_lights(self, body):
+        # Cada petición invalida a las anteriores: un "on" que aún espera a
+        # la IA no debe encender después de un "off" posterior
+        self._luces_gen += 1
+        gen = self._luces_gen
+        if not body.get("on", True):
+            self.publisher.submit(TOPIC_NEOPIXEL, "0,0,0")
+            return {"luces": False}
+
+        prompt = str(body.get("prompt") or self.prompt_luces)
+        n_colors = self.config.prefetch.N_COLORS
+
+        data = None
+        if self.prefetcher and prompt in self.config.prefetch.PROMPTS:
+            data = self.prefetcher.take(prompt)
+        if data is None:
+            data = await self.colores.get_colors_from_prompt(prompt, n_colors=n_colors)
+
+        colors = data.get("colors") if isinstance(data, dict) else None
+        if not colors:
+            return 502, {"error": "No se pudo obtener colores"}
+        if gen != self._luces_gen:
+            return 409, {"error": "Reemplazada por una petición posterior"}
+
+        topic, payload = palette_message(colors, self.config.leds)
+        self.publisher.submit(topic, payload)
+        return {"luces": True, "colors": colors, "source": data.get("source"),
+                "fallback": bool(data.get("fallback"))}
+
+    async def _api_music(self, body):
+        on = bool(body.get("on", True))
+        self.publisher.submit(TOPIC_SONG, "start" if on else "stop")
+        return {"musica": on}
+
+    async def _api_servo(self, body):
+        if "angle" in body:
+            try:
+                angulo = int(body["angle"])
+            except (TypeError, ValueError):
+                raise PeticionInvalida("'angle' debe ser un entero 0-180")
+            if not 0 <= angulo <= 180:
+                raise PeticionInvalida("'angle' debe estar entre 0 y 180")
+            self.publisher.submit(TOPIC_SERVO, str(angulo))
+            return {"servo": angulo}
+        abierto = bool(body.get("open", True))
+        self.publisher.submit(TOPIC_SERVO, "open" if abierto else "close")
+        return {"servo": "open" if abierto else "close"}
+
+    async def _api_chatbot(self, body):
+        texto = str(body.get("text", "")).strip()
+        if not texto:
+            raise PeticionInvalida("'text' vacío")
+        self.publisher.submit(TOPIC_CHATBOT, texto)
+        return {"chatbot": texto}
+
+    async def _api_fleet(self, body):
+        with self.flota._fleet_lock:
+            norias = {i: {"grupos": sorted(d["grupos"]), "visto": d["visto"], "estado": d["estado"]}
+                      for i, d in self.flota.devices.items()}
+        return {"resumen": self.flota.fleet_stats(), "norias": norias}
+
+    async def _api_fleet_command(self, body):
+        topic = str(body.get("topic", "")).strip("/ ")
+        if not topic or "/" in topic or "+" in topic or "#" in topic:
+            raise PeticionInvalida("'topic' debe ser un tópico esp32 sin '/' (p. ej. 'neopixel')")
+        if "message" not in body:
+            raise PeticionInvalida("falta 'message'")
+        mensaje = str(body["message"])
+        sub = f"control/{topic}"
+
+        if body.get("device"):
+            self.flota.publish_device(str(body["device"]), mensaje, sub)
+            return {"enviados": 1}
+        grupo = body.get("group")
+        return {"enviados": self.flota.publish_group(None if grupo is None else str(grupo), mensaje, sub)}
+
+    # ==================================================================
+    #                          Servidor HTTP
+    # ==================================================================
+    async def _despachar(self, metodo, ruta, headers, cuerpo):
+        token = self.config.daemon.TOKEN
+        if token and not hmac.compare_digest(headers.get("authorization", "").encode(),
+                                             f"Bearer {token}".encode()):
+            return 401, {"error": "Token inválido"}
+
+        ruta = ruta.split("?", 1)[0]
+        handler = self.rutas.get((metodo, ruta))
+        if handler is None:
+            if any(r == ruta for (_m, r) in self.rutas):
+                return 405, {"error": f"Método {metodo} no permitido en {ruta}"}
+            return 404, {"error": f"Ruta desconocida: {ruta}"}
+
+        try:
+            body = json.loads(cuerpo) if cuerpo else {}
+            if not isinstance(body, dict):
+                raise PeticionInvalida("El cuerpo debe ser un objeto JSON")
+            resultado = await handler(body)
+        except (PeticionInvalida, json.JSONDecodeError) as e:
+            return 400, {"error": str(e)}
+        except Exception as e:
+            print("❌ Error en la API:", e)
+            return 500, {"error": str(e)}
+
+        if isinstance(resultado, tuple):
+            return resultado
+        return 200, resultado
+
+    async def _atender(self, reader, writer):
+        self.clients += 1
+        self.max_clients = max(self.max_clients, self.clients)
+        timeout = self.config.daemon.IDLE_TIMEOUT
+        try:
+            while True:
+                linea = await asyncio.wait_for(reader.readline(), timeout)
+                if not linea:
+                    break
+                metodo, ruta, version = linea.decode("latin-1").split()
+
+                headers = {}
+                while True:
+                    h = await asyncio.wait_for(reader.readline(), timeout)
+                    if h in (b"\r\n", b"\n", b""):
+                        break
+                    clave, _, valor = h.decode("latin-1").partition(":")
+                    headers[clave.strip().lower()] = valor.strip()
+
+                largo = int(headers.get("content-length", 0))
+                if largo > self.config.daemon.MAX_BODY:
+                    status, data = 413, {"error": "Cuerpo demasiado grande"}
+                    seguir = False
+                else:
+                    cuerpo = await asyncio.wait_for(reader.readexactly(largo), timeout) if largo else b""
+                    self.requests += 1
+                    status, data = await self._despachar(metodo, ruta, headers, cuerpo)
+                    seguir = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+
+                if status >= 400:
+                    self.errors += 1
+                body = json.dumps(data, ensure_ascii=False).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {_RAZONES.get(status, '')}\r\n"
+                    f"Content-Type: application/json; charset=utf-8\r\n"
+                    f"Content-Length: {len(body)}\r\n"
+                    f"Connection: {'keep-alive' if seguir else 'close'}\r\n\r\n".encode() + body
+                )
+                await writer.drain()
+                if not seguir:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            self.clients -= 1
+            writer.close()
+
+    # ==================================================================
+    async def serve_forever(self):
+        loop = asyncio.get_running_loop()
+        parar = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, parar.set)
+            except (NotImplementedError, RuntimeError):
+                pass   # Windows: Ctrl+C llega como KeyboardInterrupt
+
+        self.mqtt.start()
+        if self.prefetcher:
+            self.prefetcher.start()
+
+        servidor = await asyncio.start_server(self._atender, self.config.daemon.HOST, self.config.daemon.PORT)
+        print(f"🎡 Daemon de la noria escuchando en http://{self.config.daemon.HOST}:{self.config.daemon.PORT}")
+        try:
+            async with servidor:
+                await parar.wait()
+        finally:
+            self.close()
+
+    def close(self):
+        print("⏹ Cerrando daemon...")
+        self.publisher.close()
+        print("📊 Publicaciones MQTT:", self.publisher.stats())
+        if self.flota is not None:
+            print("🎡 Flota:", self.flota.fleet_stats())
+            self.flota.pool.close()
+        self.mqtt.stop()
+        if self.prefetcher:
+            self.prefetcher.close()
+        self.colores.close()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(NoriaDaemon().serve_forever())
+    except KeyboardInterrupt:
+        pass
@@ -1,7 +1,11 @@
 # noria_esp32.py  -- MicroPython (ESP32)
-import network, time, ujson, urequests, _thread
+import network, time, math, ujson, gc, micropython, select
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
 from umqtt.simple import MQTTClient
-from machine import Pin, PWM
+from machine import Pin, PWM, Timer
 import neopixel
 
 # ======================================================================
@@ -30,17 +34,49 @@ GEMINI_ENDPOINT = (
 print("📡 Endpoint Gemini cargado:")
 print(GEMINI_ENDPOINT)
 
+# call_ai usa la API compatible con OpenAI de OpenRouter (la clave sk-or-v1 es de OpenRouter)
+OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+OPENROUTER_API_KEY = GEMINI_API_KEY
+AI_TIMEOUT_MS = 15000   # pasado este tiempo la petición a la IA se cancela
+
 MQTT_SERVER = "broker.hivemq.com"
 MQTT_PORT = 1883
+MQTT_KEEPALIVE = 60   # s; se envía PINGREQ cada KEEPALIVE/2
+MQTT_POLL_MS = 20     # sondeo del socket si uasyncio no expone su cola de E/S
 
 TOPIC_NEOPIXEL = b"esp32/neopixel"
 TOPIC_DC = b"esp32/dc_speed"
-TOPIC_STEPPER = b"esp32/stepper_delay"
+TOPIC_STEPPER = b"esp32/stepper_delay"   # compatibilidad: ms por medio paso
+TOPIC_STEPPER_SPEED = b"esp32/stepper_speed"   # 0-100 % (lo que publica la interfaz)
 TOPIC_SONG = b"esp32/play_song"
 TOPIC_VOLUME = b"esp32/buzzer_volume"
 TOPIC_CHATBOT = b"esp32/chatbot_command"
 TOPIC_ERROR = b"esp32/error"
 TOPIC_SERVO = b"esp32/servo"   # nuevo tópico para controlar servo (open/close/angle)
+TOPIC_EFFECT = b"esp32/effect" # efectos LED: {"effect":..,"palette":[[r,g,b],..],"speed":0-100}
+TOPIC_PING = b"esp32/ping"     # eco a esp32/pong para medir latencia desde el PC
+TOPIC_PONG = b"esp32/pong"
+TOPIC_METRICS = b"esp32/metrics"
+
+# --- Flota (MQTTClientPC.enable_fleet en el PC) ---
+# Vacío = una sola noria, solo tópicos esp32/... Con DEVICE_ID la noria
+# escucha además órdenes para ella, para sus grupos y para todas:
+#   <FLEET_BASE>/<id>/control/<sub>
+#   <FLEET_BASE>/grupo/<grupo>/control/<sub>
+#   <FLEET_BASE>/todas/control/<sub>
+# y las trata como esp32/<sub> (p. ej. .../control/neopixel). Publica
+# "online"/"offline" (retenido) en <FLEET_BASE>/<id>/estado y sus métricas
+# en <FLEET_BASE>/<id>/metrics, que es como el PC descubre las norias.
+DEVICE_ID = ""
+DEVICE_GROUPS = ()
+FLEET_BASE = "noria"
+
+METRICS_MS = 10000   # cada cuánto se publican las métricas del scheduler
+
+# Cola de comandos entrantes (ver mqtt_callback)
+CMD_QUEUE_MAX = 16   # comandos de actuación pendientes
+AI_QUEUE_MAX = 2     # comandos de chatbot esperando a la IA
+ERROR_REPORT_MS = 1000   # como mucho un aviso de cola llena por segundo
 
 DEBUG = False
 
@@ -51,6 +87,14 @@ NP_PIN = 5
 NUM_LEDS = 16
 np = neopixel.NeoPixel(Pin(NP_PIN), NUM_LEDS)
 
+# Trama binaria en esp32/neopixel (ver neopixel_protocol.py en el PC):
+#   b"NP" + versión + N + 3*N bytes en orden G,R,B
+FRAME_MAGIC = b"NP"
+FRAME_VERSION = 1
+FRAME_HEADER = 4
+# Si el driver usa otro orden que GRB no se puede copiar tal cual
+FRAME_DIRECT = getattr(np, "ORDER", (1, 0, 2, 3)) == (1, 0, 2, 3) and np.bpp == 3
+
 # Motor DC
 pwm_A = PWM(Pin(27), freq=1000)
 pin_B = Pin(14, Pin.OUT)
@@ -67,6 +111,15 @@ SEQUENCE = [
     (0,0,1,0), (0,0,1,1), (0,0,0,1), (1,0,0,1)
 ]
 
+# Generador de pasos por timer (ver stepper_set_rate)
+STEP_TIMER_ID = 0
+STEP_TICK_HZ = 4000       # reloj del generador: resolución de 250 us
+STEPPER_MIN_HZ = 60       # medio pasos/s al 1 %
+STEPPER_MAX_HZ = 900      # medio pasos/s al 100 % (28BYJ-48 calibrado sin perder pasos)
+STEPPER_ACCEL = 1500      # medio pasos/s^2 en la rampa (0 -> máx en ~0.6 s)
+step_timer = Timer(STEP_TIMER_ID)
+micropython.alloc_emergency_exception_buf(100)
+
 # Buzzer
 buzzer_pin = Pin(18)
 buzzer = PWM(buzzer_pin, freq=440, duty=0)
@@ -109,71 +162,740 @@ def servo_close():
     except Exception as e:
         if DEBUG: print("Servo close error:", e)
 
-# Música
-notes = {
-    'C4':262, 'D4':294, 'E4':330, 'F4':349, 'G4':392,
-    'A4':440, 'B4':494, 'C5':523, 'PAUSE':0
-}
-
-circus_song = [
-    ('G4',150),('E4',150),('G4',150),('E4',150),
-    ('G4',300),('C4',150),('D4',150),('E4',150),
-    ('F4',300),('PAUSE',100)
-]
+# Música: cada canción es un bytes de pares (nota MIDI, duración en
+# ticks de MUSIC_TICK_MS); nota 0 = silencio. C4 = 60, A4 = 69.
+MUSIC_TIMER_ID = 1
+MUSIC_TICK_MS = 10
+NOTE_BASE = 48                       # C3
+NOTE_HZ = [int(440 * 2 ** ((m - 69) / 12) + 0.5) for m in range(NOTE_BASE, NOTE_BASE + 48)]
+
+SONGS = (
+    # 0: circo (la de siempre)
+    bytes((67,15, 64,15, 67,15, 64,15, 67,30, 60,15, 62,15, 64,15, 65,30, 0,10)),
+    # 1: cumpleaños feliz
+    bytes((67,15, 67,5, 69,20, 67,20, 72,20, 71,40, 0,10,
+           67,15, 67,5, 69,20, 67,20, 74,20, 72,40, 0,10)),
+    # 2: fanfarria de arranque
+    bytes((60,12, 64,12, 67,12, 72,30, 67,12, 72,40, 0,10)),
+)
+music_timer = Timer(MUSIC_TIMER_ID)
 
 # ======================================================================
 #                           ESTADO COMPARTIDO
 # ======================================================================
-step_delay = 10
-stepper_running = False
-stepper_lock = _thread.allocate_lock()
+# Todo corre en un único scheduler uasyncio (tareas cooperativas): el
+# estado se comparte sin locks porque una tarea solo cede en los await.
+# Cada tarea duerme en su evento mientras no tiene nada que hacer
+fx_wake = asyncio.Event()
+cmd_wake = asyncio.Event()
+ai_wake = asyncio.Event()
+
+# Colas acotadas de (topic, msg, t_listo_us). Las paradas de seguridad no
+# pasan por aquí: se aplican en el mismo callback, antes que todo.
+_cola_cmd = []
+_cola_ia = []
+_ai_job = None        # tarea de la petición a la IA en curso
+_q_dropped = 0        # descartados/rechazados desde el último aviso
+_q_report = 0         # ticks_ms del último aviso en esp32/error
+
+# Métricas (se publican en esp32/metrics cada METRICS_MS)
+_m_wakeups = 0     # veces que despertó alguna tarea
+_m_busy_us = 0     # tiempo trabajando (no esperando)
+_m_msgs = 0        # mensajes MQTT atendidos
+_m_lat_sum = 0     # socket listo -> actuación terminada (us)
+_m_lat_max = 0
+_m_lat_n = 0       # comandos aplicados (para la media)
+_m_t_listo = 0     # ticks_us en que el socket tuvo datos (para la latencia)
+_m_dropped = 0
+_m_queue_max = 0
+_m_ai_timeouts = 0
+_m_ai_rejected = 0     # chatbot rechazados con la cola de la IA llena
+# Gramática local (acumulado desde el arranque)
+_m_intent_local = 0    # comandos de chatbot resueltos sin IA
+_m_intent_llm = 0      # comandos que tuvieron que ir a la IA
+_m_intent_us = 0       # tiempo total del parser local
+_m_ai_ms_avg = 0       # media móvil de lo que tarda la IA (0 = sin medir)
 
 # ======================================================================
 #                           FUNCIONES HARDWARE
 # ======================================================================
 def set_color(r,g,b):
+    stop_effect()
+    np.fill((r,g,b))
+    np.write()
+
+def set_frame(msg):
+    """
+    Copia una trama binaria directamente a np.buf (sin bucle por píxel).
+    Si la trama trae menos LEDs que el anillo, el resto no cambia.
+    """
+    mv = memoryview(msg)
+    if mv[2] != FRAME_VERSION:
+        raise ValueError("version")
+    n = min(mv[3], NUM_LEDS)
+    nbytes = 3 * n
+    if len(mv) < FRAME_HEADER + nbytes:
+        raise ValueError("corta")
+
+    stop_effect()
+    if FRAME_DIRECT:
+        np.buf[0:nbytes] = mv[FRAME_HEADER:FRAME_HEADER + nbytes]
+    else:
+        for i in range(n):
+            j = FRAME_HEADER + 3 * i
+            np[i] = (mv[j + 1], mv[j], mv[j + 2])
+    np.write()
+
+# ======================================================================
+#                         MOTOR DE EFECTOS LED
+# ======================================================================
+# Cada efecto se precalcula UNA vez (al cambiar de escena) como un bucle
+# de fotogramas ya en el orden de bytes del driver. El reloj de fotogramas
+# solo copia el fotograma que toca a np.buf: sin cálculo por píxel.
+FX_FRAME_MS = 25          # reloj fijo: 40 fps
+FX_MAX_FRAMES = 128       # 128 * 16 LEDs * 3 bytes = 6 KB como máximo
+FX_FADE_STEPS = 16        # pasos de fundido entre colores (palette)
+FX_TAIL = 4               # LEDs de estela en chase
+BPP = np.bpp
+FRAME_BYTES = NUM_LEDS * BPP
+R_I, G_I, B_I = np.ORDER[0], np.ORDER[1], np.ORDER[2]
+
+# Tablas precalculadas al arrancar
+# SIN8[i]: 0..255, medio seno (respiración suave, empieza y acaba en 0)
+SIN8 = bytes(int(255 * math.sin(math.pi * i / 64)) for i in range(64))
+# WHEEL: 256 tonos (r,g,b) consecutivos
+WHEEL = bytearray(256 * 3)
+for _h in range(256):
+    _s = _h // 86
+    _f = (_h - _s * 86) * 3
+    if _s == 0:
+        WHEEL[_h*3:_h*3+3] = bytes((255 - _f, _f, 0))
+    elif _s == 1:
+        WHEEL[_h*3:_h*3+3] = bytes((0, 255 - _f, _f))
+    else:
+        WHEEL[_h*3:_h*3+3] = bytes((_f, 0, 255 - _f))
+
+_fx_frames = None   # bytearray con nframes * FRAME_BYTES
+_fx_mv = None
+_fx_nframes = 0
+_fx_phase = 0       # acumulador de fase en 8.8 (256 = 1 fotograma por tick)
+_fx_step = 0
+_fx_last = -1
+_fx_next = 0
+
+def _put(buf, i, c, scale=256):
+    """Escribe el color c=(r,g,b) del LED i en buf según el orden del driver."""
+    o = i * BPP
+    buf[o + R_I] = (c[0] * scale) >> 8
+    buf[o + G_I] = (c[1] * scale) >> 8
+    buf[o + B_I] = (c[2] * scale) >> 8
+
+def _mix(a, b, num, den):
+    return (
+        a[0] + (b[0] - a[0]) * num // den,
+        a[1] + (b[1] - a[1]) * num // den,
+        a[2] + (b[2] - a[2]) * num // den,
+    )
+
+def _build_gradient(pal):
+    # Paleta interpolada alrededor del anillo; cada fotograma la rota un LED
+    base = []
+    k = len(pal)
     for i in range(NUM_LEDS):
-        np[i] = (r,g,b)
+        pos = i * k
+        base.append(_mix(pal[pos // NUM_LEDS], pal[(pos // NUM_LEDS + 1) % k], pos % NUM_LEDS, NUM_LEDS))
+    frames = bytearray(NUM_LEDS * FRAME_BYTES)
+    for f in range(NUM_LEDS):
+        for i in range(NUM_LEDS):
+            _put(frames, f * NUM_LEDS + i, base[(i + f) % NUM_LEDS])
+    return frames, NUM_LEDS
+
+def _build_chase(pal):
+    # Cabeza + estela que da una vuelta por color de la paleta
+    vueltas = min(len(pal), FX_MAX_FRAMES // NUM_LEDS)
+    frames = bytearray(vueltas * NUM_LEDS * FRAME_BYTES)
+    for v in range(vueltas):
+        c = pal[v]
+        for f in range(NUM_LEDS):
+            base = (v * NUM_LEDS + f) * NUM_LEDS
+            for t in range(FX_TAIL):
+                _put(frames, base + (f - t) % NUM_LEDS, c, 256 >> t)
+    return frames, vueltas * NUM_LEDS
+
+def _build_breathing(pal):
+    # Un ciclo de respiración (SIN8) por color de la paleta
+    ciclos = min(len(pal), FX_MAX_FRAMES // len(SIN8))
+    n = ciclos * len(SIN8)
+    frames = bytearray(n * FRAME_BYTES)
+    for f in range(n):
+        c = pal[f // len(SIN8)]
+        scale = SIN8[f % len(SIN8)] + 1
+        _put(frames, f * NUM_LEDS, c, scale)
+        o = f * FRAME_BYTES
+        frames[o + BPP:o + FRAME_BYTES] = frames[o:o + BPP] * (NUM_LEDS - 1)
+    return frames, n
+
+def _build_rainbow(pal):
+    # Arcoíris completo en el anillo que gira 4 tonos por fotograma
+    n = 64
+    frames = bytearray(n * FRAME_BYTES)
+    for f in range(n):
+        for i in range(NUM_LEDS):
+            h = ((i * 256 // NUM_LEDS) + f * 4) & 255
+            _put(frames, f * NUM_LEDS + i, WHEEL[h*3:h*3+3])
+    return frames, n
+
+def _build_palette(pal):
+    # Anillo de un color que se funde al siguiente de la paleta
+    k = min(len(pal), FX_MAX_FRAMES // FX_FADE_STEPS)
+    n = k * FX_FADE_STEPS
+    frames = bytearray(n * FRAME_BYTES)
+    for f in range(n):
+        c = _mix(pal[f // FX_FADE_STEPS], pal[(f // FX_FADE_STEPS + 1) % k], f % FX_FADE_STEPS, FX_FADE_STEPS)
+        _put(frames, f * NUM_LEDS, c)
+        o = f * FRAME_BYTES
+        frames[o + BPP:o + FRAME_BYTES] = frames[o:o + BPP] * (NUM_LEDS - 1)
+    return frames, n
+
+EFFECTS = {
+    "gradient": _build_gradient,
+    "chase": _build_chase,
+    "breathing": _build_breathing,
+    "rainbow": _build_rainbow,
+    "palette": _build_palette,
+}
+
+def start_effect(name, pal, speed):
+    """
+    Precalcula el efecto y lo deja corriendo en el reloj de fotogramas.
+    speed 0-100: 100 = un fotograma nuevo por tick (40 fps), 0 = estático.
+    """
+    global _fx_frames, _fx_mv, _fx_nframes, _fx_phase, _fx_step, _fx_last, _fx_next
+    build = EFFECTS[name]
+    pal = [(max(0, min(255, int(c[0]))), max(0, min(255, int(c[1]))), max(0, min(255, int(c[2]))))
+           for c in pal] or [(255, 255, 255)]
+    _fx_frames = None   # liberar el efecto anterior antes de reservar el nuevo
+    frames, n = build(pal)
+    _fx_frames = frames
+    _fx_mv = memoryview(frames)
+    _fx_nframes = n
+    _fx_phase = 0
+    _fx_step = max(0, min(100, int(speed))) * 256 // 100
+    _fx_last = -1
+    _fx_next = time.ticks_ms()
+    fx_wake.set()
+
+def stop_effect():
+    global _fx_frames, _fx_mv
+    _fx_frames = None
+    _fx_mv = None
+
+def effects_tick():
+    """Llamar desde leds_task: dibuja si ya toca el siguiente fotograma."""
+    global _fx_phase, _fx_last, _fx_next
+    if _fx_frames is None:
+        return
+    now = time.ticks_ms()
+    if time.ticks_diff(now, _fx_next) < 0:
+        return
+    _fx_next = time.ticks_add(_fx_next, FX_FRAME_MS)
+    if time.ticks_diff(now, _fx_next) > 0:
+        # Muy atrasados (p. ej. una llamada bloqueante): no intentar recuperar
+        _fx_next = time.ticks_add(now, FX_FRAME_MS)
+
+    f = (_fx_phase >> 8) % _fx_nframes
+    _fx_phase += _fx_step
+    if f == _fx_last:
+        return
+    _fx_last = f
+    o = f * FRAME_BYTES
+    np.buf[0:FRAME_BYTES] = _fx_mv[o:o + FRAME_BYTES]
     np.write()
 
 def motor_dc_speed(percent):
     p = max(0, min(100, int(percent)))
     pwm_A.duty(int(p * 10.23))
 
-def step_once():
-    for a,b,c,d in SEQUENCE:
+# ======================================================================
+#                   MOTOR PASO A PASO (timer + rampa)
+# ======================================================================
+# Un timer a STEP_TICK_HZ suma _st_inc a un acumulador de fase en Q16
+# (65536 = un medio paso): al desbordar se da el siguiente medio paso.
+# Cada RAMP_TICKS la velocidad se acerca a la pedida en _st_dinc (rampa
+# trapezoidal): arranques y paradas suaves.
+#
+# El callback se registra como IRQ "hard" si el port lo admite (ESP32 con
+# MicroPython >= 1.23): corre en la interrupción, no le afectan el GC, el
+# scheduler, np.write() ni el TLS, y por eso no reserva memoria. En ports
+# más viejos solo hay soft IRQ: se encola en el scheduler y puede llegar
+# tarde (o perderse si la cola está llena) mientras el GC o una lectura
+# bloqueante ocupan la CPU. Para verlo, el propio callback mide el hueco
+# entre ticks: step_gap_max_us y step_late (ticks con más de 2 periodos
+# de hueco) en esp32/metrics, junto a step_hard.
+# Coste: STEP_TICK_HZ llamadas/s mientras gira, aunque vaya a 60 Hz; al
+# pararse el timer se apaga.
+PHASE_ONE = 1 << 16
+STEP_LATE_US = 2 * 1000000 // STEP_TICK_HZ
+RAMP_TICKS = STEP_TICK_HZ // 250    # la rampa se actualiza cada 4 ms
+_st_dinc = max(1, STEPPER_ACCEL * PHASE_ONE // STEP_TICK_HZ * RAMP_TICKS // STEP_TICK_HZ)
+_st_inc = 0          # velocidad actual (fase por tick)
+_st_target = 0       # velocidad pedida
+_st_phase = 0
+_st_idx = 0
+_st_ramp = 0
+_st_on = False       # timer en marcha
+_st_hard = False     # True si el timer corre como IRQ hard
+_st_t = 0            # ticks_us del último tick (medida de jitter)
+_st_gap_max = 0
+_st_late = 0
+
+def _step_isr(_t):
+    # Sin reservar memoria: puede correr como IRQ hard
+    global _st_inc, _st_phase, _st_idx, _st_ramp, _st_on, _st_t, _st_gap_max, _st_late
+    now = time.ticks_us()
+    gap = time.ticks_diff(now, _st_t)
+    _st_t = now
+    if gap > _st_gap_max:
+        _st_gap_max = gap
+    if gap > STEP_LATE_US:
+        _st_late += 1
+    _st_ramp -= 1
+    if _st_ramp <= 0:
+        _st_ramp = RAMP_TICKS
+        if _st_inc < _st_target:
+            _st_inc = min(_st_inc + _st_dinc, _st_target)
+        elif _st_inc > _st_target:
+            _st_inc = max(_st_inc - _st_dinc, _st_target)
+        if _st_inc == 0:
+            # Parado: bobinas sin corriente y timer apagado
+            step_timer.deinit()
+            _st_on = False
+            M1.value(0); M2.value(0); M3.value(0); M4.value(0)
+            return
+    _st_phase += _st_inc
+    if _st_phase >= PHASE_ONE:
+        _st_phase -= PHASE_ONE
+        _st_idx = (_st_idx + 1) & 7
+        a, b, c, d = SEQUENCE[_st_idx]
         M1.value(a)
         M2.value(b)
         M3.value(c)
         M4.value(d)
-        time.sleep_ms(1)
-
-def play_circus_thread():
-    """Corre en segundo hilo para no bloquear."""
-    for note, dur in circus_song:
-        freq = notes.get(note, 0)
-        if freq == 0:
-            buzzer.duty(0)
-        else:
-            buzzer.freq(freq)
-            buzzer.duty(global_volume)
-        time.sleep_ms(dur)
-    buzzer.duty(0)
 
-def play_circus():
+def stepper_set_rate(hz):
+    """Velocidad objetivo en medio pasos/s (0 = parar con rampa de frenado)."""
+    global _st_target, _st_on, _st_ramp
+    hz = max(0, min(STEPPER_MAX_HZ, int(hz)))
+    _st_target = hz * PHASE_ONE // STEP_TICK_HZ
+    if _st_target and not _st_on:
+        _st_on = True
+        _st_ramp = 0
+        _step_timer_start()
+
+def _step_timer_start():
+    global _st_hard, _st_t
+    _st_t = time.ticks_us()
     try:
-        _thread.start_new_thread(play_circus_thread, ())
-    except Exception as e:
-        # si falla al crear hilo, intentamos ejecutar sin hilo (peor caso)
-        if DEBUG: print("No se pudo iniciar hilo play_circus:", e)
-        play_circus_thread()
+        step_timer.init(freq=STEP_TICK_HZ, mode=Timer.PERIODIC, callback=_step_isr, hard=True)
+        _st_hard = True
+    except (TypeError, ValueError):
+        # Port sin IRQ hard para Timer: soft IRQ (ver métricas de jitter)
+        step_timer.init(freq=STEP_TICK_HZ, mode=Timer.PERIODIC, callback=_step_isr)
+        _st_hard = False
+
+def stepper_speed_percent(p):
+    """0-100 % -> STEPPER_MIN_HZ..STEPPER_MAX_HZ (0 = parar)."""
+    p = max(0, min(100, int(p)))
+    if p == 0:
+        stepper_set_rate(0)
+    else:
+        stepper_set_rate(STEPPER_MIN_HZ + (STEPPER_MAX_HZ - STEPPER_MIN_HZ) * (p - 1) // 99)
+
+def stepper_percent():
+    """Velocidad pedida actual en 0-100 % (inversa de stepper_speed_percent)."""
+    hz = _st_target * STEP_TICK_HZ >> 16
+    if hz == 0:
+        return 0
+    return max(1, min(100, 1 + (hz - STEPPER_MIN_HZ) * 99 // (STEPPER_MAX_HZ - STEPPER_MIN_HZ)))
+
+def stepper_delay_ms(ms):
+    """Compatibilidad con esp32/stepper_delay: ms por medio paso, >= 500 para."""
+    stepper_set_rate(0 if ms >= 500 else 1000 // max(1, ms))
+
+# ======================================================================
+#                      SECUENCIADOR DE MÚSICA (timer)
+# ======================================================================
+# Un solo timer periódico (solo mientras suena) recorre la tabla de la
+# canción: no hay hilos ni reservas de memoria por reproducción.
+_mus_song = None
+_mus_pos = 0
+_mus_left = 0        # ticks que le quedan a la nota actual
+_mus_tempo = 100     # % (200 = el doble de rápido)
+_mus_on = False      # timer en marcha
+_mus_paused = False
+
+def _music_isr(_t):
+    global _mus_pos, _mus_left
+    _mus_left -= 1
+    if _mus_left == 1:
+        buzzer.duty(0)          # pequeño corte entre notas
+    if _mus_left > 0:
+        return
+    if _mus_pos >= len(_mus_song):
+        music_stop()
+        return
+    nota = _mus_song[_mus_pos]
+    _mus_left = max(1, _mus_song[_mus_pos + 1] * 100 // _mus_tempo)
+    _mus_pos += 2
+    if nota:
+        buzzer.freq(NOTE_HZ[nota - NOTE_BASE])
+        buzzer.duty(global_volume)
+    else:
+        buzzer.duty(0)
+
+def _music_timer(on):
+    global _mus_on
+    if on and not _mus_on:
+        music_timer.init(period=MUSIC_TICK_MS, mode=Timer.PERIODIC, callback=_music_isr)
+    elif not on and _mus_on:
+        music_timer.deinit()
+    _mus_on = on
+
+def music_play(song_id=0):
+    """Empieza la canción song_id (si ya sonaba algo, vuelve a empezar). False si no existe."""
+    global _mus_song, _mus_pos, _mus_left, _mus_paused
+    if not 0 <= song_id < len(SONGS):
+        return False
+    _mus_song = SONGS[song_id]
+    _mus_pos = 0
+    _mus_left = 0
+    _mus_paused = False
+    _music_timer(True)
+    return True
+
+def music_stop():
+    global _mus_song, _mus_paused
+    _music_timer(False)
+    buzzer.duty(0)
+    _mus_song = None
+    _mus_paused = False
+
+def music_pause():
+    global _mus_paused
+    if _mus_song is not None and not _mus_paused:
+        _mus_paused = True
+        _music_timer(False)
+        buzzer.duty(0)
+
+def music_resume():
+    global _mus_paused, _mus_left
+    if _mus_song is not None and _mus_paused:
+        _mus_paused = False
+        _mus_left = 0      # la nota interrumpida se da por terminada
+        _music_timer(True)
+
+def music_tempo(pct):
+    global _mus_tempo
+    _mus_tempo = max(25, min(400, int(pct)))
+
+def music_command(cmd):
+    """
+    Comandos de esp32/play_song: "start", "start <id>", "song <id>", "<id>",
+    "stop", "pause", "resume", "tempo <25-400>". False si no se entiende.
+    """
+    parts = cmd.strip().lower().split()
+    if not parts:
+        return False
+    op = parts[0]
+    arg = parts[1] if len(parts) > 1 else None
+    try:
+        if op in ("start", "play", "song", "on"):
+            return music_play(int(arg) if arg is not None else 0)
+        if op.isdigit():
+            return music_play(int(op))
+        if op in ("stop", "off"):
+            music_stop()
+        elif op == "pause":
+            music_pause()
+        elif op == "resume":
+            music_resume()
+        elif op == "tempo" and arg is not None:
+            music_tempo(int(arg))
+        else:
+            return False
+    except ValueError:
+        return False
+    return True
+
+# ======================================================================
+#                  GRAMÁTICA LOCAL DE COMANDOS (es / en)
+# ======================================================================
+# Los comandos habituales del chatbot ("luces rojas", "velocidad 50",
+# "abre la puerta and play music") se traducen aquí a {"actions":[...]},
+# igual que respondería la IA, sin ir a la red. Cada palabra tiene que
+# ser conocida: si sobra algo que no entendemos se usa la IA.
+INTENT_STEP = 20          # "más rápido", "sube el volumen"...
+TEMPO_STEP = 25
+AI_LAT_EST_MS = 2500      # estimación inicial de lo que tarda la IA
+
+_VOCAB = {}
+
+def _vocab(tipo, valor, palabras):
+    for w in palabras.split():
+        _VOCAB[w] = (tipo, valor)
+
+# Dominios ("velocidad" y "motor" son débiles: ceden ante uno concreto)
+_vocab("dom", "noria", "noria rueda wheel stepper giro")
+_vocab("debil", "noria", "motor velocidad speed")
+_vocab("dom", "dc", "dc ventilador fan")
+_vocab("dom", "luz", "luz luces light lights led leds neopixel color colores colour")
+_vocab("dom", "servo", "servo puerta door compuerta")
+_vocab("dom", "vol", "volumen volume sonido sound")
+_vocab("dom", "musica", "musica music cancion canciones song melodia buzzer")
+# Operaciones
+_vocab("op", "on", "enciende encender prende prender activa activar on arranca arrancar inicia iniciar start gira girar mueve mover enable")
+_vocab("op", "off", "apaga apagar off desactiva desactivar disable")
+_vocab("op", "stop", "para parar paro deten detener detente stop halt frena frenar alto")
+_vocab("op", "open", "abre abrir abierta abierto open")
+_vocab("op", "close", "cierra cerrar cerrada cerrado close shut")
+_vocab("op", "up", "sube subir aumenta aumentar up raise increase mas louder")
+_vocab("op", "down", "baja bajar disminuye disminuir reduce reducir down lower decrease menos quieter")
+_vocab("op", "faster", "rapido rapida fast faster acelera acelerar quicker")
+_vocab("op", "slower", "lento lenta despacio slow slower")
+_vocab("op", "play", "pon poner toca tocar reproduce reproducir play suena sonar set")
+_vocab("op", "pause", "pausa pausar pause")
+_vocab("op", "resume", "sigue seguir continua continuar reanuda reanudar resume continue")
+_vocab("op", "tempo", "tempo ritmo")
+_vocab("op", "mute", "silencio silencia silenciar mute")
+# Números con nombre
+_vocab("num", 100, "max maximo maxima maximum full tope cien hundred")
+_vocab("num", 50, "mitad half medio media")
+_vocab("num", 10, "min minimo minima minimum")
+_vocab("num", 0, "cero zero")
+# Colores
+_vocab("color", "255,0,0", "rojo roja rojos rojas red")
+_vocab("color", "0,255,0", "verde verdes green")
+_vocab("color", "0,0,255", "azul azules blue")
+_vocab("color", "255,255,0", "amarillo amarilla amarillos amarillas yellow")
+_vocab("color", "255,128,0", "naranja naranjas orange")
+_vocab("color", "128,0,255", "morado morada morados moradas violeta violetas purple violet")
+_vocab("color", "255,64,160", "rosa rosas rosado rosada pink")
+_vocab("color", "255,255,255", "blanco blanca blancos blancas white")
+_vocab("color", "0,255,255", "cian cyan turquesa turquoise")
+_vocab("color", "255,0,255", "magenta magentas")
+_vocab("color", "255,180,0", "dorado dorada dorados doradas gold golden")
+# Canciones (índice en SONGS)
+_vocab("song", 0, "circo circus")
+_vocab("song", 1, "cumpleanos birthday")
+_vocab("song", 2, "fanfarria fanfare")
+# Relleno
+_vocab("stop", None, "la las el los lo un una uno the a an al de del en to of for por favor please "
+       "porfa ahora now ya it turn grados degrees porciento percent ciento nivel level "
+       "feliz happy que puedes could you can")
+
+_CONECTORES = ("y", "e", "and", "luego", "then", "tambien", "also", "despues")
+_ACENTOS = (("á", "a"), ("é", "e"), ("í", "i"), ("ó", "o"), ("ú", "u"), ("ü", "u"), ("ñ", "n"))
+
+def _tokens(texto):
+    texto = texto.lower()
+    for a, b in _ACENTOS:
+        texto = texto.replace(a, b)
+    return "".join(c if c.isalpha() or c.isdigit() else " " for c in texto).split()
+
+def _accion(act, val=None):
+    return {"action": act, "value": val} if val is not None else {"action": act}
+
+def _clausula(palabras):
+    """Una orden simple -> lista de acciones, o None si no se entiende del todo."""
+    doms, debil, ops = [], None, []
+    num = color = song = None
+    for w in palabras:
+        if w.isdigit():
+            if num is not None:
+                return None
+            num = int(w)
+            continue
+        k = _VOCAB.get(w)
+        if k is None:
+            return None
+        tipo, val = k
+        if tipo == "dom":
+            if val not in doms:
+                doms.append(val)
+        elif tipo == "debil":
+            debil = val
+        elif tipo == "op":
+            ops.append(val)
+        elif tipo == "num":
+            if num is not None:
+                return None
+            num = val
+        elif tipo == "color":
+            color = val
+        elif tipo == "song":
+            song = val
+
+    if color is not None and "luz" not in doms:
+        doms.append("luz")
+    if song is not None and "musica" not in doms:
+        doms.append("musica")
+    if len(doms) > 1:
+        return None
+    dom = doms[0] if doms else None
+    vel = debil is not None   # se mencionó "velocidad"/"motor"
+
+    # "más rápido" = faster; "sube" solo cuenta si no hay otra operación
+    op = None
+    for o in ("stop", "off", "mute", "faster", "slower", "open", "close", "pause", "resume",
+              "tempo", "on", "play", "up", "down"):
+        if o in ops:
+            op = o
+            break
+    if "faster" in ops or "slower" in ops:
+        op = "faster" if "faster" in ops else "slower"
+
+    if dom is None:
+        if op in ("faster", "slower") or vel or op == "stop":
+            dom = "noria"
+        elif op in ("open", "close"):
+            dom = "servo"
+        elif op in ("pause", "resume", "tempo"):
+            dom = "musica"
+        else:
+            return None
+
+    if dom == "noria" or dom == "dc":
+        act = "set_stepper_speed" if dom == "noria" else "set_speed"
+        if op in ("stop", "off"):
+            return [_accion(act, 0)]
+        if num is not None and op in (None, "on", "play", "up", "down", "faster", "slower"):
+            return [_accion(act, max(0, min(100, num)))]
+        if dom == "noria" and op in ("faster", "up", "slower", "down"):
+            actual = stepper_percent()
+            paso = INTENT_STEP if op in ("faster", "up") else -INTENT_STEP
+            return [_accion(act, max(0, min(100, actual + paso)))]
+        if op in ("on", "play"):
+            return [_accion(act, 50)]
+        return None
+
+    if dom == "luz":
+        if op in ("off", "stop"):
+            return [_accion("set_color", "0,0,0")]
+        if color is not None:
+            return [_accion("set_color", color)]
+        if op in ("on", "play"):
+            return [_accion("set_color", "255,255,255")]
+        return None
+
+    if dom == "servo":
+        if op == "open":
+            return [_accion("servo_open")]
+        if op in ("close", "stop"):
+            return [_accion("servo_close")]
+        if num is not None:
+            return [_accion("servo_angle", max(0, min(180, num)))]
+        return None
+
+    if dom == "vol":
+        if op in ("mute", "off"):
+            return [_accion("set_volume", 0)]
+        if num is not None:
+            return [_accion("set_volume", max(0, min(100, num)))]
+        if op in ("up", "down"):
+            actual = global_volume * 100 // 1023
+            paso = INTENT_STEP if op == "up" else -INTENT_STEP
+            return [_accion("set_volume", max(0, min(100, actual + paso)))]
+        return None
+
+    if dom == "musica":
+        if op in ("stop", "off", "mute"):
+            return [_accion("stop_song")]
+        if op == "pause":
+            return [_accion("pause_song")]
+        if op == "resume":
+            return [_accion("resume_song")]
+        if op == "tempo" or (vel and num is not None):
+            return [_accion("set_tempo", num)] if num is not None else None
+        if op in ("faster", "slower"):
+            paso = TEMPO_STEP if op == "faster" else -TEMPO_STEP
+            return [_accion("set_tempo", _mus_tempo + paso)]
+        if op in (None, "on", "play"):
+            if song is None and num is not None:
+                song = num
+            return [_accion("play_song", song if song is not None else 0)]
+        return None
+    return None
+
+def parse_intent(texto):
+    """Texto del chatbot -> {"actions": [...]} o None si hay que preguntar a la IA."""
+    palabras = _tokens(texto)
+    if not palabras:
+        return None
+    acciones, actual = [], []
+    for w in palabras + [_CONECTORES[0]]:
+        if w in _CONECTORES:
+            if actual:
+                r = _clausula(actual)
+                if r is None:
+                    return None
+                acciones.extend(r)
+                actual = []
+        else:
+            actual.append(w)
+    return {"actions": acciones} if acciones else None
+
+# Actuador (tópico) que mueve cada acción, para anular lo pendiente al parar
+_ACCION_TOPIC = {
+    "set_stepper_speed": TOPIC_STEPPER_SPEED,
+    "set_stepper_delay": TOPIC_STEPPER,
+    "set_speed": TOPIC_DC,
+    "servo_open": TOPIC_SERVO,
+    "servo_close": TOPIC_SERVO,
+    "servo_angle": TOPIC_SERVO,
+}
+
+def _paradas(acciones):
+    """Tópicos de los actuadores que estas acciones paran ([] si ninguna para)."""
+    topics = []
+    for a in acciones:
+        act, val = a.get("action"), a.get("value")
+        if act in ("set_stepper_speed", "set_speed") and val == 0 or act == "servo_close":
+            topics.append(_ACCION_TOPIC[act])
+    return topics
 
 # ======================================================================
 #                             INTELIGENCIA ARTIFICIAL
 # ======================================================================
 SYSTEM_PROMPT = 'Responde solo JSON en formato {"actions":[...]}'
 
-def call_ai(prompt):
+async def http_post(url, headers, body):
+    """
+    POST con streams de uasyncio (HTTP/1.0, sin chunked): no bloquea al
+    resto de tareas y se puede cancelar o limitar con wait_for_ms.
+    Devuelve (status, cuerpo en bytes).
+    """
+    proto, _, host, path = url.split("/", 3)
+    port = 443 if proto == "https:" else 80
+    if ":" in host:
+        host, port = host.split(":")
+        port = int(port)
+    gc.collect()   # TLS necesita un bloque grande de heap
+    reader, writer = await asyncio.open_connection(host, port, ssl=proto == "https:")
+    try:
+        req = "POST /%s HTTP/1.0\r\nHost: %s\r\nContent-Length: %d\r\n" % (path, host, len(body))
+        for k in headers:
+            req += "%s: %s\r\n" % (k, headers[k])
+        writer.write(req.encode() + b"\r\n" + body)
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        while (await reader.readline()) not in (b"\r\n", b""):
+            pass
+        return status, await reader.read(-1)
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+async def call_ai(prompt):
     try:
         headers = {
             'Authorization': 'Bearer ' + OPENROUTER_API_KEY,
@@ -186,16 +908,14 @@ def call_ai(prompt):
                 {'role':'user','content':prompt}
             ]
         }
-        resp = urequests.post(OPENROUTER_URL, headers=headers, data=ujson.dumps(data))
+        status, body = await http_post(OPENROUTER_URL, headers, ujson.dumps(data).encode())
 
-        if resp.status_code != 200:
+        if status != 200:
             try: client.publish(TOPIC_ERROR, b"Error API")
             except: pass
-            resp.close()
             return None
 
-        j = resp.json()
-        resp.close()
+        j = ujson.loads(body)
         content = j['choices'][0]['message']['content']
         content = content.replace("```json","").replace("```","").strip()
         return content
@@ -207,7 +927,7 @@ def call_ai(prompt):
 
 def execute_actions(json_text):
     try:
-        d = ujson.loads(json_text)
+        d = json_text if isinstance(json_text, dict) else ujson.loads(json_text)
         actions = d.get('actions', [])
 
         for a in actions:
@@ -222,13 +942,25 @@ def execute_actions(json_text):
                 set_color(r,g,b)
 
             elif act == 'set_stepper_delay':
-                global step_delay, stepper_running
-                with stepper_lock:
-                    step_delay = max(1, int(val))
-                    stepper_running = True
+                stepper_delay_ms(int(val))
+
+            elif act == 'set_stepper_speed':
+                stepper_speed_percent(int(val))
 
             elif act == 'play_song':
-                play_circus()
+                music_play(int(val) if val not in (None, "") else 0)
+
+            elif act == 'stop_song':
+                music_stop()
+
+            elif act == 'pause_song':
+                music_pause()
+
+            elif act == 'resume_song':
+                music_resume()
+
+            elif act == 'set_tempo':
+                music_tempo(int(val))
 
             elif act == 'set_volume':
                 global global_volume
@@ -254,42 +986,107 @@ def execute_actions(json_text):
         except: pass
 
 # ======================================================================
-#                           HILO STEPPER
+#                           TAREAS (uasyncio)
 # ======================================================================
-def stepper_thread():
-    global stepper_running, step_delay
+async def leds_task():
+    global _m_wakeups, _m_busy_us
     while True:
-        if not stepper_running:
-            time.sleep_ms(30)
+        if _fx_frames is None:
+            fx_wake.clear()
+            await fx_wake.wait()
             continue
+        _m_wakeups += 1
+        t0 = time.ticks_us()
+        effects_tick()
+        _m_busy_us += time.ticks_diff(time.ticks_us(), t0)
+        # Dormir justo hasta el siguiente fotograma
+        await asyncio.sleep_ms(max(0, time.ticks_diff(_fx_next, time.ticks_ms())))
 
-        with stepper_lock:
-            sd = step_delay
-
-        for a,b,c,d in SEQUENCE:
-            if not stepper_running:
-                break
-            M1.value(a)
-            M2.value(b)
-            M3.value(c)
-            M4.value(d)
-            time.sleep_ms(sd)
-
-try:
-    _thread.start_new_thread(stepper_thread, ())
-except Exception as e:
-    if DEBUG: print("No se pudo iniciar thread stepper:", e)
 
 # ======================================================================
 #                           MQTT CALLBACK
 # ======================================================================
-def mqtt_callback(topic, msg):
-    global stepper_running, step_delay, global_volume
+def es_seguridad(t, msg):
+    """Paradas y cierres: se aplican al instante, por delante de la cola."""
+    s = msg.strip().lower()
+    if t == TOPIC_STEPPER_SPEED or t == TOPIC_DC:
+        return s == b"0"
+    if t == TOPIC_STEPPER:
+        return s.isdigit() and int(s) >= 500
+    if t == TOPIC_SERVO:
+        return s in (b"close", b"servo_close", b"0", b"off", b"false", b"stop")
+    return False
+
+# Comandos pendientes que una parada deja sin efecto
+_ANULA = {
+    TOPIC_STEPPER: (TOPIC_STEPPER, TOPIC_STEPPER_SPEED),
+    TOPIC_STEPPER_SPEED: (TOPIC_STEPPER, TOPIC_STEPPER_SPEED),
+    TOPIC_DC: (TOPIC_DC,),
+    TOPIC_SERVO: (TOPIC_SERVO,),
+}
 
-    try:
-        s = msg.decode()
-    except:
-        s = str(msg)
+def _reportar_descarte(n=1):
+    """Cuenta descartes y avisa en esp32/error como mucho cada ERROR_REPORT_MS."""
+    global _q_dropped, _q_report, _m_dropped
+    _q_dropped += n
+    _m_dropped += n
+    now = time.ticks_ms()
+    if time.ticks_diff(now, _q_report) >= ERROR_REPORT_MS:
+        _q_report = now
+        try: client.publish(TOPIC_ERROR, b"Cola llena: %d comandos descartados" % _q_dropped)
+        except: pass
+        _q_dropped = 0
+
+def _anular(topics):
+    """
+    Quita de la cola lo pendiente para los actuadores parados: comandos de
+    esos tópicos y, en los del chatbot ya resueltos, sus acciones sobre
+    ellos (el resto de acciones se mantiene).
+    """
+    anula = []
+    for tp in topics:
+        anula.extend(_ANULA[tp])
+    quedan = []
+    for c in _cola_cmd:
+        if c[0] in anula:
+            continue
+        if c[0] == TOPIC_CHATBOT:
+            acciones = [a for a in c[1]["actions"] if _ACCION_TOPIC.get(a.get("action")) not in anula]
+            if not acciones:
+                continue
+            c = (c[0], {"actions": acciones}, c[2])
+        quedan.append(c)
+    _cola_cmd[:] = quedan
+
+def ai_cancel():
+    """Cancela la petición a la IA en curso y los chatbot pendientes. Devuelve cuántos."""
+    n = len(_cola_ia)
+    del _cola_ia[:]
+    if _ai_job is not None:
+        _ai_job.cancel()
+        n += 1
+    return n
+
+def _registrar_latencia(t0):
+    global _m_lat_sum, _m_lat_max, _m_lat_n
+    dt = time.ticks_diff(time.ticks_us(), t0)
+    _m_lat_n += 1
+    _m_lat_sum += dt
+    if dt > _m_lat_max:
+        _m_lat_max = dt
+
+def mqtt_callback(topic, msg):
+    """
+    Solo clasifica y encola (no bloquea el bucle de MQTT):
+      - paradas de seguridad: se aplican ya, anulan lo pendiente de ese
+        actuador y cancelan la IA;
+      - chatbot: cola de la IA (si está llena se rechaza el nuevo);
+      - resto: cola de comandos; un comando nuevo a un tópico ya en cola
+        reemplaza al pendiente, y si la cola está llena se descarta el
+        más antiguo.
+    """
+    global _m_msgs, _m_queue_max, _m_intent_local, _m_intent_llm, _m_intent_us, _m_ai_rejected
+    _m_msgs += 1
 
     # Normaliza topic a bytes comparables (umqtt devuelve topic en bytes)
     # En tu código TOPIC_* son bytes, así que topic puede venir como bytes o str.
@@ -298,6 +1095,93 @@ def mqtt_callback(topic, msg):
     except:
         t = topic
 
+    # Órdenes de la flota: <base>/<destino>/control/<sub> -> esp32/<sub>
+    for p in _FLEET_PREFIJOS:
+        if t.startswith(p):
+            t = b"esp32/" + t[len(p):]
+            break
+
+    if es_seguridad(t, msg):
+        handle_command(t, msg)
+        _anular((t,))
+        if ai_cancel():
+            try: client.publish(TOPIC_ERROR, b"IA cancelada por parada")
+            except: pass
+        _registrar_latencia(_m_t_listo)
+        return
+
+    if t == TOPIC_CHATBOT:
+        # Primero la gramática local: si la entiende no hace falta la IA
+        t1 = time.ticks_us()
+        try:
+            d = parse_intent(msg.decode())
+        except Exception:
+            d = None
+        if d is not None:
+            _m_intent_local += 1
+            _m_intent_us += time.ticks_diff(time.ticks_us(), t1)
+            paradas = _paradas(d["actions"])
+            if paradas:
+                execute_actions(d)   # "para la noria" es una parada de seguridad
+                _anular(paradas)
+                if ai_cancel():
+                    try: client.publish(TOPIC_ERROR, b"IA cancelada por parada")
+                    except: pass
+                _registrar_latencia(_m_t_listo)
+                return
+            _cola_cmd.append((t, d, _m_t_listo))   # sin reemplazo: cada orden cuenta
+            if len(_cola_cmd) > CMD_QUEUE_MAX:
+                _cola_cmd.pop(0)
+                _reportar_descarte()
+            cmd_wake.set()
+            return
+        _m_intent_llm += 1
+        if len(_cola_ia) >= AI_QUEUE_MAX:
+            _m_ai_rejected += 1
+            try: client.publish(TOPIC_ERROR, b"IA ocupada: comando rechazado")
+            except: pass
+            return
+        _cola_ia.append((t, msg, _m_t_listo))
+        ai_wake.set()
+        return
+
+    item = (t, msg, _m_t_listo)
+    if t != TOPIC_PING:
+        for i in range(len(_cola_cmd)):
+            if _cola_cmd[i][0] == t:
+                _cola_cmd[i] = item   # el último valor manda
+                return
+    if len(_cola_cmd) >= CMD_QUEUE_MAX:
+        _cola_cmd.pop(0)
+        _reportar_descarte()
+    _cola_cmd.append(item)
+    if len(_cola_cmd) > _m_queue_max:
+        _m_queue_max = len(_cola_cmd)
+    cmd_wake.set()
+
+def handle_command(t, msg):
+    """Aplica un comando (lo llaman commands_task y, para paradas, mqtt_callback)."""
+    global global_volume
+
+    # Chatbot ya resuelto por la gramática local: msg es {"actions": [...]}
+    if t == TOPIC_CHATBOT:
+        execute_actions(msg)
+        return
+
+    # Trama binaria de LEDs: se atiende sin decodificar a texto
+    if t == TOPIC_NEOPIXEL and msg[:2] == FRAME_MAGIC and len(msg) >= FRAME_HEADER:
+        try:
+            set_frame(msg)
+        except:
+            try: client.publish(TOPIC_ERROR, b"Trama LED invalida")
+            except: pass
+        return
+
+    try:
+        s = msg.decode()
+    except:
+        s = str(msg)
+
     if t == TOPIC_NEOPIXEL:
         try:
             r,g,b = [int(x) for x in s.split(',')]
@@ -306,6 +1190,18 @@ def mqtt_callback(topic, msg):
             try: client.publish(TOPIC_ERROR, b"Color invalido")
             except: pass
 
+    elif t == TOPIC_EFFECT:
+        try:
+            d = ujson.loads(s)
+            name = d.get("effect", "off")
+            if name in ("off", "none", "stop"):
+                set_color(0, 0, 0)
+            else:
+                start_effect(name, d.get("palette", []), d.get("speed", 50))
+        except:
+            try: client.publish(TOPIC_ERROR, b"Efecto invalido")
+            except: pass
+
     elif t == TOPIC_DC:
         try:
             motor_dc_speed(int(s))
@@ -313,22 +1209,24 @@ def mqtt_callback(topic, msg):
             try: client.publish(TOPIC_ERROR, b"DC invalido")
             except: pass
 
+    elif t == TOPIC_STEPPER_SPEED:
+        try:
+            stepper_speed_percent(int(s))
+        except:
+            try: client.publish(TOPIC_ERROR, b"Stepper invalido")
+            except: pass
+
     elif t == TOPIC_STEPPER:
         try:
-            v = int(s)
-            with stepper_lock:
-                if v >= 500:
-                    stepper_running = False
-                else:
-                    step_delay = max(1, v)
-                    stepper_running = True
+            stepper_delay_ms(int(s))
         except:
             try: client.publish(TOPIC_ERROR, b"Stepper invalido")
             except: pass
 
     elif t == TOPIC_SONG:
-        if s.lower().strip() == "start":
-            play_circus()
+        if not music_command(s):
+            try: client.publish(TOPIC_ERROR, b"Musica comando invalido")
+            except: pass
 
     elif t == TOPIC_VOLUME:
         try:
@@ -358,13 +1256,67 @@ def mqtt_callback(topic, msg):
             try: client.publish(TOPIC_ERROR, "Servo procesamiento falló")
             except: pass
 
-    elif t == TOPIC_CHATBOT:
-        ai_resp = call_ai(s)
-        if ai_resp:
-            execute_actions(ai_resp)
-        else:
-            try: client.publish(TOPIC_ERROR, b"No IA")
-            except: pass
+    elif t == TOPIC_PING:
+        try: client.publish(TOPIC_PONG, msg)
+        except: pass
+
+async def commands_task():
+    global _m_wakeups, _m_busy_us
+    while True:
+        if not _cola_cmd:
+            cmd_wake.clear()
+            await cmd_wake.wait()
+            continue
+        _m_wakeups += 1
+        t, msg, t0 = _cola_cmd.pop(0)
+        t1 = time.ticks_us()
+        try:
+            handle_command(t, msg)
+        except Exception:
+            pass
+        _m_busy_us += time.ticks_diff(time.ticks_us(), t1)
+        _registrar_latencia(t0)
+        await asyncio.sleep_ms(0)   # ceder a MQTT entre comandos
+
+async def _ai_run(prompt):
+    global _m_ai_timeouts, _m_ai_ms_avg
+    t0 = time.ticks_ms()
+    try:
+        ai_resp = await asyncio.wait_for_ms(call_ai(prompt), AI_TIMEOUT_MS)
+        dt = time.ticks_diff(time.ticks_ms(), t0)
+        _m_ai_ms_avg = dt if _m_ai_ms_avg == 0 else (_m_ai_ms_avg * 7 + dt) // 8
+    except asyncio.TimeoutError:
+        _m_ai_timeouts += 1
+        try: client.publish(TOPIC_ERROR, b"IA sin respuesta (timeout)")
+        except: pass
+        return
+    if ai_resp:
+        execute_actions(ai_resp)
+    else:
+        try: client.publish(TOPIC_ERROR, b"No IA")
+        except: pass
+
+async def ai_task():
+    """Una petición a la IA a la vez, en su propia tarea (cancelable)."""
+    global _ai_job
+    while True:
+        if not _cola_ia:
+            ai_wake.clear()
+            await ai_wake.wait()
+            continue
+        _t, msg, _t0 = _cola_ia.pop(0)
+        try:
+            prompt = msg.decode()
+        except:
+            prompt = str(msg)
+        _ai_job = asyncio.create_task(_ai_run(prompt))
+        try:
+            await _ai_job
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            pass
+        _ai_job = None
 
 # ======================================================================
 #                        WIFI Y MQTT
@@ -378,46 +1330,165 @@ def wifi_connect():
             time.sleep(1)
     if DEBUG: print("WiFi conectado, IP:", wlan.ifconfig()[0])
 
+_FLEET_PREFIJOS = ()
+TOPIC_FLEET_ESTADO = TOPIC_FLEET_METRICS = None
+if DEVICE_ID:
+    _FLEET_PREFIJOS = tuple(
+        (FLEET_BASE + "/" + p + "/control/").encode()
+        for p in [DEVICE_ID] + ["grupo/" + g for g in DEVICE_GROUPS] + ["todas"]
+    )
+    TOPIC_FLEET_ESTADO = (FLEET_BASE + "/" + DEVICE_ID + "/estado").encode()
+    TOPIC_FLEET_METRICS = (FLEET_BASE + "/" + DEVICE_ID + "/metrics").encode()
+
+def mqtt_subscribe(c):
+    c.subscribe(TOPIC_NEOPIXEL)
+    c.subscribe(TOPIC_DC)
+    c.subscribe(TOPIC_STEPPER)
+    c.subscribe(TOPIC_STEPPER_SPEED)
+    c.subscribe(TOPIC_SONG)
+    c.subscribe(TOPIC_VOLUME)
+    c.subscribe(TOPIC_CHATBOT)
+    c.subscribe(TOPIC_SERVO)   # suscripción al tópico del servo
+    c.subscribe(TOPIC_EFFECT)
+    c.subscribe(TOPIC_PING)
+    for p in _FLEET_PREFIJOS:
+        c.subscribe(p + b"+")
+    if TOPIC_FLEET_ESTADO:
+        c.publish(TOPIC_FLEET_ESTADO, b"online", retain=True)
+
 def mqtt_connect():
     global client
-    client = MQTTClient("esp32_full_noria", MQTT_SERVER, MQTT_PORT)
+    # Cada noria de la flota necesita su propio client id
+    client_id = "esp32_full_noria" + ("_" + DEVICE_ID if DEVICE_ID else "")
+    client = MQTTClient(client_id, MQTT_SERVER, MQTT_PORT, keepalive=MQTT_KEEPALIVE)
     client.set_callback(mqtt_callback)
+    if TOPIC_FLEET_ESTADO:
+        client.set_last_will(TOPIC_FLEET_ESTADO, b"offline", retain=True)
     client.connect()
-
-    client.subscribe(TOPIC_NEOPIXEL)
-    client.subscribe(TOPIC_DC)
-    client.subscribe(TOPIC_STEPPER)
-    client.subscribe(TOPIC_SONG)
-    client.subscribe(TOPIC_VOLUME)
-    client.subscribe(TOPIC_CHATBOT)
-    client.subscribe(TOPIC_SERVO)   # suscripción al tópico del servo
+    mqtt_subscribe(client)
 
     if DEBUG: print("MQTT conectado y suscrito a topics")
     return client
 
+async def mqtt_reconnect():
+    """Reconecta con backoff sin bloquear al resto de tareas; renueva suscripciones."""
+    espera = 1
+    while True:
+        try:
+            client.disconnect()
+        except:
+            pass
+        try:
+            client.connect()
+            mqtt_subscribe(client)
+            if DEBUG: print("MQTT reconectado")
+            return
+        except Exception:
+            await asyncio.sleep(espera)
+            espera = min(espera * 2, 30)
+
+# umqtt.simple lee el socket por su cuenta, así que no se puede envolver
+# en asyncio.StreamReader (consumiría los bytes) y uasyncio no tiene una
+# espera pública de "socket legible". Se usa su cola de E/S interna
+# (core._io_queue.queue_read, en uasyncio v3: MicroPython 1.13 a 1.24);
+# si la versión instalada no la tiene se sondea con select.poll, que es
+# API pública, a costa de hasta MQTT_POLL_MS de latencia.
+_io_queue = getattr(getattr(asyncio, "core", None), "_io_queue", None)
+
+if hasattr(_io_queue, "queue_read"):
+    async def _socket_listo(sock):
+        """Suspende la tarea hasta que el socket tenga datos (poll del scheduler, sin sondeo)."""
+        yield _io_queue.queue_read(sock)
+else:
+    print("⚠️ uasyncio sin _io_queue: MQTT por sondeo cada", MQTT_POLL_MS, "ms")
+
+    async def _socket_listo(sock):
+        """Espera a que el socket tenga datos sondeando con select.poll."""
+        p = select.poll()
+        p.register(sock, select.POLLIN)
+        while not p.poll(0):
+            await asyncio.sleep_ms(MQTT_POLL_MS)
+
+async def mqtt_task():
+    global _m_wakeups, _m_busy_us, _m_t_listo
+    while True:
+        try:
+            await _socket_listo(client.sock)
+            _m_wakeups += 1
+            _m_t_listo = time.ticks_us()
+            client.check_msg()   # un paquete; si hay más, el socket sigue listo
+            _m_busy_us += time.ticks_diff(time.ticks_us(), _m_t_listo)
+        except Exception:
+            await mqtt_reconnect()
+
+async def mqtt_ping_task():
+    while True:
+        await asyncio.sleep(MQTT_KEEPALIVE // 2)
+        try:
+            client.ping()
+        except Exception:
+            pass   # mqtt_task detecta la caída al leer y reconecta
+
+async def metrics_task():
+    """Publica latencia de comandos y carga del scheduler cada METRICS_MS."""
+    global _m_wakeups, _m_busy_us, _m_msgs, _m_lat_sum, _m_lat_max
+    global _m_dropped, _m_queue_max, _m_ai_timeouts, _m_lat_n, _st_gap_max, _st_late, _m_ai_rejected
+    t_prev = time.ticks_ms()
+    while True:
+        await asyncio.sleep_ms(METRICS_MS)
+        now = time.ticks_ms()
+        dt_ms = max(1, time.ticks_diff(now, t_prev))
+        t_prev = now
+        intents = _m_intent_local + _m_intent_llm
+        m = {
+            "msgs": _m_msgs,
+            "lat_avg_us": _m_lat_sum // _m_lat_n if _m_lat_n else 0,
+            "lat_max_us": _m_lat_max,
+            "wakeups_s": _m_wakeups * 1000 // dt_ms,
+            "busy_pct": _m_busy_us // (10 * dt_ms),
+            "stepper_hz": _st_inc * STEP_TICK_HZ >> 16,
+            "step_hard": _st_hard,
+            "step_gap_max_us": _st_gap_max,
+            "step_late": _st_late,
+            "queue_max": _m_queue_max,
+            "dropped": _m_dropped,
+            "ai_timeouts": _m_ai_timeouts,
+            "ai_rejected": _m_ai_rejected,
+            "intent_local_total": _m_intent_local,
+            "intent_llm_total": _m_intent_llm,
+            "intent_match_pct": _m_intent_local * 100 // intents if intents else 0,
+            "intent_saved_ms_total": _m_intent_local * (_m_ai_ms_avg or AI_LAT_EST_MS) - _m_intent_us // 1000,
+            "mem_free": gc.mem_free(),
+        }
+        _m_wakeups = _m_busy_us = _m_msgs = _m_lat_sum = _m_lat_max = 0
+        _m_dropped = _m_queue_max = _m_ai_timeouts = _m_lat_n = _m_ai_rejected = 0
+        _st_gap_max = _st_late = 0
+        if _q_dropped:
+            _reportar_descarte(0)   # descartes que quedaron sin avisar
+        try:
+            datos = ujson.dumps(m)
+            client.publish(TOPIC_METRICS, datos)
+            if TOPIC_FLEET_METRICS:
+                client.publish(TOPIC_FLEET_METRICS, datos)
+        except: pass
+
 # ======================================================================
 #                        BUCLE PRINCIPAL
 # ======================================================================
-try:
+async def main():
     wifi_connect()
-    client = mqtt_connect()
+    mqtt_connect()
 
-    # se pone loop ligero: check_msg() frecuente, stepper y musica en hilos
-    while True:
-        try:
-            client.check_msg()
-        except Exception:
-            # intentar reconectar suavemente
-            try:
-                client.disconnect()
-            except:
-                pass
-            time.sleep(1)
-            try:
-                client.connect()
-            except:
-                pass
-        time.sleep_ms(10)
+    # Cada tarea duerme hasta que tiene trabajo: sin sleep fijo ni sondeo
+    asyncio.create_task(leds_task())
+    asyncio.create_task(commands_task())
+    asyncio.create_task(ai_task())
+    asyncio.create_task(mqtt_ping_task())
+    asyncio.create_task(metrics_task())
+    await mqtt_task()
+
+try:
+    asyncio.run(main())
 
 except KeyboardInterrupt:
     pass
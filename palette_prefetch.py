@@ -0,0 +1,150 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class PalettePrefetcher:
+    """
+    Mantiene un búfer de paletas ya generadas por la IA para cada prompt.
+
+    - take(prompt) devuelve al instante una paleta lista (o None si el
+      búfer está vacío) y dispara el relleno en segundo plano.
+    - Cuando el nivel (listas + en camino) baja de low_water se piden
+      paletas hasta volver a depth, con como mucho refill_concurrency
+      peticiones a la vez.
+    - Las paletas con más de max_age segundos se descartan.
+    - Si un relleno falla, ese prompt no vuelve a pedir hasta pasados
+      retry_backoff segundos (el doble en cada fallo seguido, hasta
+      retry_backoff_max): con la IA caída no se lanza una tanda de
+      peticiones en cada take().
+    """
+
+    def __init__(self, client, prompts, n_colors=3, depth=4, low_water=2,
+                 refill_concurrency=1, max_age=3600, retry_backoff=5.0, retry_backoff_max=300.0):
+        self.client = client
+        self.n_colors = n_colors
+        self.depth = max(1, int(depth))
+        self.low_water = max(0, min(int(low_water), self.depth - 1))
+        self.max_age = max_age
+        self.retry_backoff = retry_backoff
+        self.retry_backoff_max = retry_backoff_max
+
+        self._buffers = {p: deque() for p in prompts}   # prompt -> deque[(ts, data)]
+        self._pendientes = {p: 0 for p in prompts}      # relleno en vuelo por prompt
+        self._fallos = {p: 0 for p in prompts}          # fallos seguidos por prompt
+        self._reintento = {p: 0.0 for p in prompts}     # no pedir antes de este time.time()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, int(refill_concurrency)), thread_name_prefix="prefetch"
+        )
+
+        # Métricas
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.refills = 0
+        self.refill_errors = 0
+
+    # -------------------------------------------------------------
+    def start(self):
+        """Llena los búferes de todos los prompts configurados."""
+        for prompt in list(self._buffers):
+            self._rellenar(prompt)
+
+    def take(self, prompt):
+        """Devuelve una paleta {"colors": [...]} precargada, o None."""
+        ahora = time.time()
+        data = None
+
+        with self._lock:
+            buf = self._buffers.setdefault(prompt, deque())
+            self._pendientes.setdefault(prompt, 0)
+            self._fallos.setdefault(prompt, 0)
+            self._reintento.setdefault(prompt, 0.0)
+
+            while buf and self.max_age is not None and ahora - buf[0][0] > self.max_age:
+                buf.popleft()
+                self.stale += 1
+
+            if buf:
+                data = buf.popleft()[1]
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        self._rellenar(prompt)
+        return data
+
+    # -------------------------------------------------------------
+    def _rellenar(self, prompt):
+        with self._lock:
+            if time.time() < self._reintento[prompt]:
+                return
+            nivel = len(self._buffers[prompt]) + self._pendientes[prompt]
+            if nivel > self.low_water:
+                return
+            faltan = self.depth - nivel
+            self._pendientes[prompt] += faltan
+
+        for _ in range(faltan):
+            self._executor.submit(self._fetch, prompt)
+
+    def _fetch(self, prompt):
+        data = None
+        try:
+            # mode="llm": el búfer solo guarda paletas reales de la IA
+            data = self.client.get_colors_from_prompt(
+                prompt, n_colors=self.n_colors, use_cache=False, mode="llm"
+            )
+        except Exception as e:
+            print("⚠️ Error precargando paleta:", e)
+
+        ok = isinstance(data, dict) and data.get("colors") and not data.get("fallback")
+        with self._lock:
+            self._pendientes[prompt] -= 1
+            if ok:
+                self._buffers[prompt].append((time.time(), data))
+                self.refills += 1
+                self._fallos[prompt] = 0
+            else:
+                # No se reintenta en bucle: el próximo take() volverá a
+                # pedir, pero no antes de que pase el backoff
+                self.refill_errors += 1
+                espera = min(self.retry_backoff_max, self.retry_backoff * (2 ** self._fallos[prompt]))
+                self._fallos[prompt] += 1
+                self._reintento[prompt] = time.time() + espera
+
+    # -------------------------------------------------------------
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "listas": {p: len(b) for p, b in self._buffers.items()},
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+                "descartadas_viejas": self.stale,
+                "rellenos": self.refills,
+                "errores_relleno": self.refill_errors,
+                "en_backoff": [p for p, t in self._reintento.items() if t > time.time()],
+            }
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+def create_prefetcher(client, prefetch_config):
+    """PalettePrefetcher según config.PrefetchConfig (None si está desactivado)."""
+    if not prefetch_config.ENABLED:
+        return None
+    return PalettePrefetcher(
+        client, prefetch_config.PROMPTS,
+        n_colors=prefetch_config.N_COLORS,
+        depth=prefetch_config.DEPTH,
+        low_water=prefetch_config.LOW_WATER,
+        refill_concurrency=prefetch_config.REFILL_CONCURRENCY,
+        max_age=prefetch_config.MAX_AGE_SECONDS,
+        retry_backoff=prefetch_config.RETRY_BACKOFF_SECONDS,
+        retry_backoff_max=prefetch_config.RETRY_BACKOFF_MAX_SECONDS,
+    )
@@ -0,0 +1,131 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+class PublishCoalescer:
+    """
+    Planificador de publicaciones MQTT salientes ("gana el último valor").
+
+    - Un solo hueco pendiente por tópico: si llega un valor nuevo antes de
+      enviarse el anterior, lo reemplaza (nunca se encolan valores viejos).
+    - Ritmo máximo por tópico (mensajes/s). Si el tópico lleva un rato sin
+      publicar, el valor sale al momento; si no, sale el último al cumplirse
+      el intervalo. Así el valor final siempre se envía.
+    - Los tópicos de 'passthrough' (p. ej. el chatbot) no se fusionan: cada
+      mensaje se envía, en orden.
+    - 'slots' agrupa tópicos que mueven lo mismo (esp32/neopixel y
+      esp32/effect pintan el mismo anillo): comparten hueco y ritmo, así
+      que un mensaje de uno reemplaza al pendiente del otro y gana siempre
+      la última orden.
+    - El envío real (send_fn) se hace en un hilo propio, nunca en el de Tk.
+    """
+
+    def __init__(self, send_fn, default_rate=10.0, rates=None, passthrough=(), slots=None):
+        self.send_fn = send_fn
+        self.default_rate = default_rate
+        self.rates = dict(rates or {})
+        self.passthrough = set(passthrough)
+        self.slots = dict(slots or {})     # topic -> hueco compartido
+
+        self._pendientes = OrderedDict()   # hueco -> (topic, payload) (último valor)
+        self._cola = deque()               # (topic, payload) sin fusionar
+        self._ultimo_envio = {}            # hueco -> time.monotonic()
+        self._cond = threading.Condition()
+        self._cerrado = False
+
+        # Métricas
+        self.submitted = 0
+        self.sent = 0
+        self.coalesced = 0
+        self.errors = 0
+
+        self._hilo = threading.Thread(target=self._bucle, name="mqtt-publish", daemon=True)
+        self._hilo.start()
+
+    # -------------------------------------------------------------
+    def _intervalo(self, topic):
+        rate = self.rates.get(topic, self.default_rate)
+        return 1.0 / rate if rate else 0.0
+
+    def _hueco(self, topic):
+        return self.slots.get(topic, topic)
+
+    def submit(self, topic, payload):
+        """Programa la publicación. No bloquea."""
+        with self._cond:
+            if self._cerrado:
+                return
+            self.submitted += 1
+            if topic in self.passthrough:
+                self._cola.append((topic, payload))
+            else:
+                hueco = self._hueco(topic)
+                if hueco in self._pendientes:
+                    self.coalesced += 1
+                    self._pendientes.move_to_end(hueco)
+                self._pendientes[hueco] = (topic, payload)
+            self._cond.notify()
+
+    # -------------------------------------------------------------
+    def _siguientes(self, ahora):
+        """Mensajes que ya pueden salir y segundos hasta el próximo (o None)."""
+        listos = []
+        while self._cola:
+            listos.append(self._cola.popleft())
+
+        espera = None
+        for hueco, (topic, _) in list(self._pendientes.items()):
+            libre = self._ultimo_envio.get(hueco, float("-inf")) + self._intervalo(topic)
+            if libre <= ahora:
+                listos.append(self._pendientes.pop(hueco))
+            else:
+                espera = libre - ahora if espera is None else min(espera, libre - ahora)
+        return listos, espera
+
+    def _bucle(self):
+        while True:
+            with self._cond:
+                while True:
+                    listos, espera = self._siguientes(time.monotonic())
+                    if listos or self._cerrado:
+                        break
+                    self._cond.wait(espera)
+                if not listos and self._cerrado:
+                    return
+                ahora = time.monotonic()
+                for topic, _ in listos:
+                    self._ultimo_envio[self._hueco(topic)] = ahora
+
+            for topic, payload in listos:
+                try:
+                    self.send_fn(topic, payload)
+                    with self._cond:
+                        self.sent += 1
+                except Exception as e:
+                    with self._cond:
+                        self.errors += 1
+                    print("❌ Error al publicar MQTT:", e)
+
+    # -------------------------------------------------------------
+    def stats(self):
+        with self._cond:
+            return {
+                "solicitados": self.submitted,
+                "publicados": self.sent,
+                "fusionados": self.coalesced,
+                "pendientes": len(self._pendientes) + len(self._cola),
+                "errores": self.errors,
+            }
+
+    def close(self, timeout=1.0):
+        """
+        Deja de aceptar mensajes y envía ya lo pendiente
+        (sin respetar el ritmo máximo) antes de terminar.
+        """
+        with self._cond:
+            self._cerrado = True
+            for hueco in self._pendientes:
+                self._ultimo_envio.pop(hueco, None)
+            self._cond.notify()
+        self._hilo.join(timeout)
@@ -0,0 +1,153 @@
+import re
+import threading
+from array import array
+
+
+class TelemetryRing:
+    """
+    Telemetría numérica en memoria fija.
+
+    - Muestras crudas en un anillo de 'capacity' (array('d') preasignado):
+      pasado ese número, las más viejas se sobrescriben.
+    - Agregados por cubetas de 'bucket_seconds' (min/max/suma/cuenta) en
+      otro anillo de 'max_buckets'. Cada cubeta cerrada tiene un número de
+      secuencia creciente, así la gráfica pide solo las nuevas
+      (buckets_since) y no recorre el historial.
+
+    La memoria no crece con la duración de la sesión.
+    """
+
+    def __init__(self, capacity=20000, bucket_seconds=1.0, max_buckets=600):
+        self.capacity = max(1, int(capacity))
+        self.bucket_seconds = float(bucket_seconds)
+        self.max_buckets = max(1, int(max_buckets))
+
+        self._t = array("d", bytes(8 * self.capacity))
+        self._v = array("d", bytes(8 * self.capacity))
+        self._head = 0      # próxima posición a escribir
+        self._count = 0
+
+        # Anillo de cubetas cerradas
+        self._b_t = array("d", bytes(8 * self.max_buckets))
+        self._b_min = array("d", bytes(8 * self.max_buckets))
+        self._b_max = array("d", bytes(8 * self.max_buckets))
+        self._b_mean = array("d", bytes(8 * self.max_buckets))
+        self._b_seq = -1    # secuencia de la última cubeta cerrada
+
+        # Cubeta en curso
+        self._cur_idx = None   # int(t // bucket_seconds)
+        self._cur_min = self._cur_max = self._cur_sum = 0.0
+        self._cur_n = 0
+
+        self._lock = threading.Lock()
+        self.total = 0
+
+    # -------------------------------------------------------------
+    def append(self, t, value):
+        """Añade una muestra (t en segundos). Seguro desde cualquier hilo."""
+        value = float(value)
+        with self._lock:
+            self._t[self._head] = t
+            self._v[self._head] = value
+            self._head = (self._head + 1) % self.capacity
+            if self._count < self.capacity:
+                self._count += 1
+            self.total += 1
+
+            idx = int(t // self.bucket_seconds)
+            if self._cur_idx is None:
+                self._cur_idx = idx
+            elif idx != self._cur_idx:
+                self._cerrar_cubeta()
+                self._cur_idx = idx
+
+            if self._cur_n == 0:
+                self._cur_min = self._cur_max = value
+                self._cur_sum = 0.0
+            elif value < self._cur_min:
+                self._cur_min = value
+            elif value > self._cur_max:
+                self._cur_max = value
+            self._cur_sum += value
+            self._cur_n += 1
+
+    def _cerrar_cubeta(self):
+        if self._cur_n == 0:
+            return
+        self._b_seq += 1
+        i = self._b_seq % self.max_buckets
+        self._b_t[i] = self._cur_idx * self.bucket_seconds
+        self._b_min[i] = self._cur_min
+        self._b_max[i] = self._cur_max
+        self._b_mean[i] = self._cur_sum / self._cur_n
+        self._cur_n = 0
+
+    # -------------------------------------------------------------
+    def last_seq(self):
+        with self._lock:
+            return self._b_seq
+
+    def buckets_since(self, seq):
+        """
+        Cubetas cerradas con secuencia > seq: [(seq, t, min, max, media), ...].
+        Como mucho max_buckets (las más antiguas ya se sobrescribieron).
+        """
+        with self._lock:
+            desde = max(seq + 1, self._b_seq - self.max_buckets + 1, 0)
+            salida = []
+            for s in range(desde, self._b_seq + 1):
+                i = s % self.max_buckets
+                salida.append((s, self._b_t[i], self._b_min[i], self._b_max[i], self._b_mean[i]))
+            return salida
+
+    def current_bucket(self):
+        """Cubeta en curso (sin cerrar): (t, min, max, media) o None."""
+        with self._lock:
+            if self._cur_n == 0:
+                return None
+            return (self._cur_idx * self.bucket_seconds, self._cur_min, self._cur_max,
+                    self._cur_sum / self._cur_n)
+
+    # -------------------------------------------------------------
+    def stats(self):
+        with self._lock:
+            return {
+                "muestras": self.total,
+                "en_memoria": self._count,
+                "cubetas": self._b_seq + 1,
+            }
+
+
+class PassengerCounter:
+    """
+    Cuenta pasajeros con el sensor de distancia: uno por cada vez que la
+    distancia baja de threshold y vuelve a subir por encima de
+    threshold + hysteresis (la histéresis evita contar el ruido dos veces).
+    """
+
+    def __init__(self, threshold_cm=30.0, hysteresis_cm=5.0):
+        self.threshold = threshold_cm
+        self.hysteresis = hysteresis_cm
+        self.count = 0
+        self._dentro = False
+        self._lock = threading.Lock()
+
+    def update(self, distance):
+        """Devuelve True si esta muestra completa el paso de un pasajero."""
+        with self._lock:
+            if not self._dentro and distance < self.threshold:
+                self._dentro = True
+            elif self._dentro and distance > self.threshold + self.hysteresis:
+                self._dentro = False
+                self.count += 1
+                return True
+            return False
+
+
+_NUMERO_RE = re.compile(r"-?\d+(?:\.\d+)?")
+
+
+def parse_number(payload):
+    """Primer número de un payload de texto ('23.4', 'dist: 23 cm'...). None si no hay."""
+    m = _NUMERO_RE.search(payload)
+    return float(m.group()) if m else None
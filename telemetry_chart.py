@@ -0,0 +1,104 @@
+import tkinter as tk
+from collections import deque
+
+
+class TelemetryChart:
+    """
+    Gráfica en vivo de un TelemetryRing sobre un Canvas de Tk.
+
+    Cada cubeta cerrada se dibuja UNA vez (barra min-max + tramo de la
+    media). Al llegar cubetas nuevas, lo ya dibujado se desplaza con un
+    solo canvas.move por etiqueta, se dibujan solo las nuevas y se borran
+    las que salen por la izquierda. La cubeta en curso se redibuja en cada
+    refresco. El coste no depende de cuánto historial haya.
+
+    Cada cubeta va en la columna de su instante t (no de su número de
+    secuencia): los segundos sin datos quedan como un hueco y la media no
+    se une por encima de él.
+    """
+
+    def __init__(self, parent, ring, width=400, height=110, n_buckets=120, y_max=200.0,
+                 bg="#FFF3E0", color_rango="#FFCC80", color_media="#E65100"):
+        self.ring = ring
+        self.width = width
+        self.height = height
+        self.n_buckets = n_buckets
+        self.y_max = float(y_max)
+        self.dx = width / n_buckets
+        self.color_rango = color_rango
+        self.color_media = color_media
+
+        self.canvas = tk.Canvas(parent, width=width, height=height, bg=bg, highlightthickness=0)
+        self._seq = ring.last_seq()       # no se dibuja lo anterior a crear la gráfica
+        self._items = deque()             # (columna, [ids]) de izquierda a derecha
+        self._derecha = None              # columna de la derecha del todo (la cubeta en curso)
+        self._ultima_media = None         # (columna, x, y) de la última cubeta dibujada
+
+    def pack(self, **kwargs):
+        self.canvas.pack(**kwargs)
+
+    def _y(self, valor):
+        valor = min(max(valor, 0.0), self.y_max)
+        return self.height - 2 - (valor / self.y_max) * (self.height - 4)
+
+    def _columna(self, t):
+        return int(round(t / self.ring.bucket_seconds))
+
+    def _x(self, columna):
+        return self.width - (self._derecha - columna + 1) * self.dx + self.dx / 2
+
+    def _dibujar(self, columna, vmin, vmax, media, tags):
+        x = self._x(columna)
+        ids = [self.canvas.create_line(x, self._y(vmin), x, self._y(vmax) - 1,
+                                       fill=self.color_rango, width=max(1, int(self.dx)), tags=tags)]
+        y = self._y(media)
+        anterior = self._ultima_media
+        if anterior is not None and "datos" in tags and anterior[0] == columna - 1:
+            ids.append(self.canvas.create_line(anterior[1], anterior[2], x, y,
+                                               fill=self.color_media, width=2, tags=tags))
+        else:
+            # Primera cubeta o después de un hueco: la media no se une
+            ids.append(self.canvas.create_line(x, y, x + 1, y, fill=self.color_media, width=2, tags=tags))
+        return ids, (columna, x, y)
+
+    def update(self):
+        """Llamar en cada fotograma de la UI."""
+        nuevas = self.ring.buckets_since(self._seq)
+        actual = self.ring.current_bucket()
+
+        # La columna de la derecha es la cubeta en curso (o la siguiente a
+        # la última cerrada); nunca retrocede
+        derecha = self._derecha
+        if nuevas:
+            derecha = max(derecha or 0, self._columna(nuevas[-1][1]) + 1)
+        if actual is not None:
+            derecha = max(derecha or 0, self._columna(actual[0]))
+
+        if derecha is not None and derecha != self._derecha:
+            if self._derecha is not None:
+                desplazar = min(derecha - self._derecha, self.n_buckets)
+                self.canvas.move("datos", -desplazar * self.dx, 0)
+                if self._ultima_media is not None:
+                    columna, x0, y0 = self._ultima_media
+                    self._ultima_media = (columna, x0 - desplazar * self.dx, y0)
+            self._derecha = derecha
+
+            # Borrar lo que ya salió por la izquierda
+            while self._items and self._items[0][0] <= derecha - self.n_buckets:
+                for item in self._items.popleft()[1]:
+                    self.canvas.delete(item)
+
+        if nuevas:
+            for _seq, t, vmin, vmax, media in nuevas:
+                columna = self._columna(t)
+                if columna <= self._derecha - self.n_buckets:
+                    continue
+                ids, self._ultima_media = self._dibujar(columna, vmin, vmax, media, ("datos",))
+                self._items.append((columna, ids))
+            self._seq = nuevas[-1][0]
+
+        # Cubeta en curso: siempre a la derecha del todo
+        self.canvas.delete("actual")
+        if actual is not None:
+            t, vmin, vmax, media = actual
+            self._dibujar(self._columna(t), vmin, vmax, media, ("actual",))
@@ -0,0 +1,60 @@
+import color_cache
+from color_cache import ColorCache
+
+
+class _Reloj:
+    def __init__(self, t=1000.0):
+        self.t = t
+
+    def __call__(self):
+        return self.t
+
+
+def test_get_put(tmp_path):
+    cache = ColorCache(path=str(tmp_path / "cache.json"))
+    key = ColorCache.make_key("mar", 3, "modelo", 0.5)
+    assert cache.get(key) is None
+    cache.put(key, [[1, 2, 3], (4, 5, 6)])
+    assert cache.get(key) == [(1, 2, 3), (4, 5, 6)]
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_ttl(monkeypatch):
+    reloj = _Reloj()
+    monkeypatch.setattr(color_cache.time, "time", reloj)
+    cache = ColorCache(ttl=60)
+    cache.put("k", [(1, 2, 3)])
+    reloj.t += 59
+    assert cache.get("k") == [(1, 2, 3)]
+    reloj.t += 2
+    assert cache.get("k") is None
+    assert cache.stats()["expirations"] == 1
+    assert cache.stats()["entradas"] == 0
+
+
+def test_lru_expulsa_la_menos_usada():
+    cache = ColorCache(max_entries=2)
+    cache.put("a", [(1, 1, 1)])
+    cache.put("b", [(2, 2, 2)])
+    cache.get("a")                 # "b" pasa a ser la menos usada
+    cache.put("c", [(3, 3, 3)])
+    assert cache.get("b") is None
+    assert cache.get("a") == [(1, 1, 1)]
+    assert cache.get("c") == [(3, 3, 3)]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_persistencia(tmp_path):
+    ruta = str(tmp_path / "cache.json")
+    ColorCache(path=ruta).put("k", [(9, 8, 7)])
+    assert ColorCache(path=ruta).get("k") == [(9, 8, 7)]
+
+
+def test_invalidate():
+    cache = ColorCache()
+    cache.put("a", [(1, 1, 1)])
+    cache.put("b", [(2, 2, 2)])
+    cache.invalidate("a")
+    assert cache.get("a") is None and cache.get("b") is not None
+    cache.invalidate()
+    assert cache.stats()["entradas"] == 0
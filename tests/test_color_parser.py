@@ -0,0 +1,61 @@
+from color_parser import ColorLineParser, parse_colors
+
+
+def test_formatos_numericos():
+    texto = 'rgb(10, 20, 30) #fff [1,2,3] {"r": 4, "g": 5, "b": 6} 7; 8; 9'
+    assert parse_colors(texto) == [(10, 20, 30), (255, 255, 255), (1, 2, 3), (4, 5, 6), (7, 8, 9)]
+
+
+def test_rgb_porcentaje_y_limite_255():
+    assert parse_colors("rgb(100%, 50%, 0%) 300,0,999") == [(255, 127, 0), (255, 0, 255)]
+
+
+def test_nombres_si_no_hay_numeros():
+    assert parse_colors("Rojo y azul") == [(255, 0, 0), (0, 0, 255)]
+
+
+def test_nombres_ignorados_si_hay_numeros():
+    assert parse_colors("255,0,0 (rojo)") == [(255, 0, 0)]
+    assert parse_colors("1. 255,0,0 - Rojo intenso\n2. 0,0,255 - Azul") == [(255, 0, 0), (0, 0, 255)]
+    assert parse_colors("paleta roja y azul:\n255,0,0\n0,255,0") == [(255, 0, 0), (0, 255, 0)]
+
+
+def test_punto_final_etiquetas_y_espacios():
+    assert parse_colors("255,100,50.") == [(255, 100, 50)]
+    assert parse_colors("Color 1: 10, 20, 30.") == [(10, 20, 30)]
+    assert parse_colors("R: 255, G: 0, B: 0") == [(255, 0, 0)]
+    assert parse_colors("255 0 0") == [(255, 0, 0)]
+    assert parse_colors("10 20 30\n40 50 60") == [(10, 20, 30), (40, 50, 60)]
+
+
+def test_decimales_y_series_largas_no_son_colores():
+    assert parse_colors("255,100,50.5") == []
+    assert parse_colors("1 2 3 4") == []
+
+
+def test_negativos_y_horas_no_son_colores():
+    assert parse_colors("-5,2,3") == []
+    assert parse_colors("12:30, 5,6") == []
+
+
+def test_limit():
+    assert parse_colors("1,2,3 4,5,6 7,8,9", limit=2) == [(1, 2, 3), (4, 5, 6)]
+    assert parse_colors("rojo verde azul", limit=1) == [(255, 0, 0)]
+
+
+def test_texto_vacio():
+    assert parse_colors("") == []
+    assert parse_colors(None) == []
+
+
+def test_line_parser_misma_regla_que_parse_colors():
+    p = ColorLineParser()
+    assert p.feed("paleta roja y azul:") == []
+    assert p.feed("255,0,0") == [(255, 0, 0)]
+    assert p.feed("verde") == []
+    assert p.flush() == []
+
+    p = ColorLineParser()
+    assert p.feed("rojo") == []
+    assert p.feed("azul") == []
+    assert p.flush() == [(255, 0, 0), (0, 0, 255)]
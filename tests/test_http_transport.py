@@ -0,0 +1,152 @@
+import threading
+import time
+
+import pytest
+
+requests = pytest.importorskip("requests")
+
+from bench_noria import FakeLLMServer
+from http_transport import HTTPTransport, RequestCancelled
+
+
+class _Guion(FakeLLMServer):
+    """
+    FakeLLMServer que responde según un guion: cada entrada es
+    (status, cabeceras, segundos de espera). Agotado el guion, responde
+    como el servidor normal (200 con colores).
+    """
+
+    def __init__(self, *guion):
+        super().__init__(latency_ms=0)
+        self.guion = list(guion)
+
+    def _responder(self, handler, body):
+        with self._rng_lock:
+            paso = self.guion.pop(0) if self.guion else None
+        if paso is None:
+            return super()._responder(handler, body)
+
+        status, cabeceras, espera = paso
+        with self._rng_lock:
+            self.requests += 1
+        time.sleep(espera)
+        data = b'{"error": {"message": "guion"}}'
+        handler.send_response(status)
+        for k, v in cabeceras.items():
+            handler.send_header(k, v)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(data)))
+        handler.end_headers()
+        try:
+            handler.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            pass                             # el cliente ya cortó (timeout)
+
+
+def _transporte(**kwargs):
+    opciones = dict(max_retries=2, backoff_base=0.01, backoff_max=0.05, read_timeout=5.0)
+    opciones.update(kwargs)
+    return HTTPTransport(**opciones)
+
+
+def test_reintenta_5xx_y_429():
+    with _Guion((503, {}, 0), (429, {}, 0)) as server:
+        http = _transporte()
+        resp = http.post(server.url, json={"stream": False})
+    assert resp.status_code == 200
+    assert server.requests == 3
+    stats = http.stats()
+    assert stats["llamadas"] == 1 and stats["reintentos"] == 2 and stats["errores"] == 0
+
+
+def test_agota_reintentos_y_devuelve_el_ultimo_error():
+    with _Guion((500, {}, 0), (502, {}, 0), (503, {}, 0)) as server:
+        http = _transporte()
+        resp = http.post(server.url, json={})
+    assert resp.status_code == 503
+    assert server.requests == 3
+    assert http.stats()["errores"] == 1
+
+
+def test_4xx_no_se_reintenta():
+    with _Guion((400, {}, 0)) as server:
+        http = _transporte()
+        resp = http.post(server.url, json={})
+    assert resp.status_code == 400
+    assert server.requests == 1
+    assert http.stats()["reintentos"] == 0
+
+
+def test_backoff_con_jitter():
+    http = _transporte(backoff_base=0.5, backoff_max=8.0)
+    for intento in range(6):
+        techo = min(8.0, 0.5 * 2 ** intento)
+        esperas = [http._backoff(intento) for _ in range(50)]
+        assert all(0 <= e <= techo for e in esperas)
+        assert len(set(esperas)) > 1          # full jitter, no un valor fijo
+
+
+def test_backoff_respeta_retry_after():
+    http = _transporte(backoff_base=0.01, backoff_max=8.0)
+    assert http._backoff(0, "3") >= 3
+    assert http._backoff(0, "60") <= 8.0     # acotado por backoff_max
+    assert http._backoff(0, "mañana") <= 0.01
+
+
+def test_retry_after_del_servidor():
+    with _Guion((429, {"Retry-After": "0.3"}, 0)) as server:
+        http = _transporte(backoff_max=1.0)
+        t0 = time.perf_counter()
+        resp = http.post(server.url, json={})
+        transcurrido = time.perf_counter() - t0
+    assert resp.status_code == 200
+    assert transcurrido >= 0.3
+
+
+def test_timeout_de_lectura():
+    with _Guion((200, {}, 0.5), (200, {}, 0.5)) as server:
+        http = _transporte(read_timeout=0.1, max_retries=1)
+        with pytest.raises(requests.Timeout):
+            http.post(server.url, json={})
+    assert server.requests == 2
+    stats = http.stats()
+    assert stats["errores"] == 1 and stats["reintentos"] == 1
+
+
+def test_cancel_scope_interrumpe_el_backoff():
+    with _Guion((503, {"Retry-After": "5"}, 0)) as server:
+        http = _transporte(backoff_max=5.0)
+        cancelar = threading.Event()
+        threading.Timer(0.2, cancelar.set).start()
+        t0 = time.perf_counter()
+        with http.cancel_scope(cancelar):
+            with pytest.raises(RequestCancelled):
+                http.post(server.url, json={})
+        transcurrido = time.perf_counter() - t0
+    assert transcurrido < 2
+    assert server.requests == 1
+
+
+def test_cancel_scope_ya_cancelado_no_envia_nada():
+    with _Guion() as server:
+        http = _transporte()
+        cancelar = threading.Event()
+        cancelar.set()
+        with http.cancel_scope(cancelar):
+            with pytest.raises(RequestCancelled):
+                http.post(server.url, json={})
+        # Fuera del bloque el hilo vuelve a poder enviar
+        assert http.post(server.url, json={}).status_code == 200
+    assert server.requests == 1
+
+
+def test_estadisticas_de_latencia():
+    with _Guion((200, {}, 0.05), (200, {}, 0.05), (200, {}, 0.05)) as server:
+        http = _transporte()
+        for _ in range(3):
+            http.post(server.url, json={})
+    stats = http.stats()
+    assert stats["llamadas"] == 3
+    assert stats["ultima_ms"] >= 50
+    assert stats["media_ms"] >= 50
+    assert stats["p50_ms"] <= stats["p95_ms"]
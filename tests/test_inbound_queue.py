@@ -0,0 +1,39 @@
+from inbound_queue import InboundQueue
+
+
+def test_un_hueco_por_topico():
+    q = InboundQueue()
+    q.put("a", 1)
+    q.put("b", 1)
+    q.put("a", 2)
+    assert q.drain() == [("b", 1), ("a", 2)]
+    assert q.stats()["fusionados"] == 1
+    assert q.drain() == []
+
+
+def test_passthrough_conserva_todo_y_va_primero():
+    q = InboundQueue(passthrough=["esp32/error"])
+    q.put("esp32/status", "s1")
+    q.put("esp32/error", "e1")
+    q.put("esp32/error", "e2")
+    q.put("esp32/status", "s2")
+    assert q.drain() == [("esp32/error", "e1"), ("esp32/error", "e2"), ("esp32/status", "s2")]
+
+
+def test_passthrough_acotado_descarta_los_mas_antiguos():
+    q = InboundQueue(passthrough=["e"], max_queue=3)
+    for i in range(5):
+        q.put("e", i)
+    assert q.drain() == [("e", 2), ("e", 3), ("e", 4)]
+    assert q.stats()["descartados"] == 2
+
+
+def test_profundidad_maxima():
+    q = InboundQueue(passthrough=["e"])
+    q.put("a", 1)
+    q.put("e", 1)
+    q.put("e", 2)
+    assert q.depth() == 3
+    q.drain()
+    assert q.depth() == 0
+    assert q.stats()["profundidad_max"] == 3
@@ -0,0 +1,85 @@
+import threading
+
+import pytest
+
+from llm_providers import ColorProvider, HedgedProvider, ProviderError
+
+
+class _Motor:
+    """Motor local falso: siempre el mismo gris."""
+
+    def generate(self, prompt, n_colors=5):
+        return [(9, 9, 9)] * n_colors
+
+
+class _Proveedor(ColorProvider):
+    def __init__(self, name, colors=None, cache=None, **kwargs):
+        super().__init__(**kwargs)
+        self.name = name
+        self.colors = colors
+        self.cache = cache or {}
+        self.llamadas = []
+
+    def cached(self, prompt, n_colors):
+        return self.cache.get(prompt)
+
+    def _generate(self, prompt, n_colors, cancel_event, use_cache=True):
+        self.llamadas.append(use_cache)
+        if self.colors is None:
+            raise ProviderError("sin colores")
+        if use_cache:
+            self.cache[prompt] = self.colors
+        return self.colors
+
+
+def _colores(data):
+    return [(c["r"], c["g"], c["b"]) for c in data["colors"]]
+
+
+def test_argumentos_desconocidos_no_se_tragan():
+    with pytest.raises(TypeError):
+        _Proveedor("a", [(1, 2, 3)]).get_colors_from_prompt("mar", 1, stream=True)
+
+
+def test_modos_llm_fallback_y_local():
+    p = _Proveedor("a", None, fallback=_Motor())
+    assert _colores(p.get_colors_from_prompt("mar", 2, mode="llm")) == [(255, 0, 0)] * 2
+    assert _colores(p.get_colors_from_prompt("mar", 2, mode="fallback")) == [(9, 9, 9)] * 2
+    assert _colores(p.get_colors_from_prompt("mar", 2, mode="local")) == [(9, 9, 9)] * 2
+    assert p.llamadas == [True, True]      # "local" no llama al proveedor
+
+
+def test_use_cache_y_refresh():
+    p = _Proveedor("a", [(1, 2, 3)], cache={"mar": [(7, 7, 7)]})
+    assert _colores(p.get_colors_from_prompt("mar", 1)) == [(7, 7, 7)]
+    assert _colores(p.get_colors_from_prompt("mar", 1, use_cache=False)) == [(1, 2, 3)]
+    assert p.cache["mar"] == [(7, 7, 7)]   # use_cache=False tampoco guarda
+    assert _colores(p.get_colors_from_prompt("mar", 1, refresh=True)) == [(1, 2, 3)]
+    assert p.cache["mar"] == [(1, 2, 3)]
+
+
+def test_hedged_local_first_llama_a_on_refine():
+    primario = _Proveedor("a", [(1, 2, 3)])
+    hedged = HedgedProvider(primario, _Proveedor("b", None), fallback=_Motor())
+    refinada = []
+    listo = threading.Event()
+
+    def on_refine(data):
+        refinada.append(_colores(data))
+        listo.set()
+
+    data = hedged.get_colors_from_prompt("mar", 1, mode="local_first", on_refine=on_refine)
+    assert _colores(data) == [(9, 9, 9)]
+    assert listo.wait(2)
+    assert refinada == [[(1, 2, 3)]]
+    # La paleta del proveedor quedó en su caché: ya no hace falta el motor local
+    assert _colores(hedged.get_colors_from_prompt("mar", 1, mode="local_first")) == [(1, 2, 3)]
+    hedged.close()
+
+
+def test_hedged_use_cache_false_no_lee_la_cache_del_primario():
+    primario = _Proveedor("a", [(1, 2, 3)], cache={"mar": [(7, 7, 7)]})
+    hedged = HedgedProvider(primario, _Proveedor("b", None))
+    assert _colores(hedged.get_colors_from_prompt("mar", 1, use_cache=False, mode="llm")) == [(1, 2, 3)]
+    assert primario.llamadas == [False]
+    hedged.close()
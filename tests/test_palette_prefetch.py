@@ -0,0 +1,59 @@
+import palette_prefetch
+from palette_prefetch import PalettePrefetcher
+
+
+class _Reloj:
+    def __init__(self, t=1000.0):
+        self.t = t
+
+    def __call__(self):
+        return self.t
+
+
+class _Cliente:
+    def __init__(self):
+        self.ok = False
+        self.llamadas = []
+
+    def get_colors_from_prompt(self, prompt, n_colors=5, use_cache=True, refresh=False,
+                               mode=None, on_refine=None):
+        self.llamadas.append((use_cache, mode))
+        if not self.ok:
+            return {"colors": [{"r": 255, "g": 0, "b": 0}] * n_colors, "fallback": True}
+        return {"colors": [{"r": 1, "g": 2, "b": 3}] * n_colors, "source": "ia"}
+
+
+def _prefetcher(cliente, **kwargs):
+    pre = PalettePrefetcher(cliente, ["mar"], depth=2, low_water=0, **kwargs)
+    # Sin hilos: el relleno se ejecuta en el acto
+    pre._executor.submit = lambda fn, *args: fn(*args)
+    return pre
+
+
+def test_pide_paletas_reales_de_la_ia():
+    cliente = _Cliente()
+    cliente.ok = True
+    pre = _prefetcher(cliente)
+    pre.start()
+    assert cliente.llamadas == [(False, "llm")] * 2
+    assert pre.take("mar")["colors"][0] == {"r": 1, "g": 2, "b": 3}
+
+
+def test_backoff_tras_un_fallo(monkeypatch):
+    reloj = _Reloj()
+    monkeypatch.setattr(palette_prefetch.time, "time", reloj)
+    cliente = _Cliente()
+    pre = _prefetcher(cliente, retry_backoff=10, retry_backoff_max=15)
+
+    pre.start()                            # 2 peticiones, 2 fallos
+    assert len(cliente.llamadas) == 2
+    assert pre.take("mar") is None
+    assert len(cliente.llamadas) == 2      # en backoff: no se pide nada
+    assert pre.stats()["en_backoff"] == ["mar"]
+
+    reloj.t += 16                          # 10 * 2 = 20, acotado a 15
+    cliente.ok = True
+    assert pre.take("mar") is None
+    assert len(cliente.llamadas) == 4
+    assert pre.take("mar") is not None
+    assert pre.stats()["en_backoff"] == []
@@ -0,0 +1,56 @@
+import threading
+
+from publish_scheduler import PublishCoalescer
+
+
+def _coalescer(**kwargs):
+    enviados = []
+    lock = threading.Lock()
+
+    def send(topic, payload):
+        with lock:
+            enviados.append((topic, payload))
+
+    return PublishCoalescer(send, **kwargs), enviados
+
+
+def test_gana_el_ultimo_valor():
+    p, enviados = _coalescer(default_rate=1.0)
+    for v in range(10):
+        p.submit("esp32/stepper_speed", str(v))
+    p.close()
+    # El primero sale al momento; el resto se fusiona en el último
+    assert enviados[-1] == ("esp32/stepper_speed", "9")
+    assert len(enviados) <= 2
+    assert p.stats()["fusionados"] >= 8
+
+
+def test_passthrough_envia_todo_en_orden():
+    p, enviados = _coalescer(default_rate=1.0, passthrough=["esp32/chatbot_command"])
+    for i in range(5):
+        p.submit("esp32/chatbot_command", f"m{i}")
+    p.close()
+    assert enviados == [("esp32/chatbot_command", f"m{i}") for i in range(5)]
+
+
+def test_topicos_de_un_mismo_hueco_conservan_la_ultima_orden():
+    slots = {"esp32/neopixel": "leds", "esp32/effect": "leds"}
+    p, enviados = _coalescer(default_rate=1.0, slots=slots)
+    p.submit("esp32/effect", "ON1")
+    p.submit("esp32/neopixel", "0,0,0")
+    p.submit("esp32/effect", "ON2")
+    p.submit("esp32/neopixel", "0,0,0")
+    p.close()
+    assert enviados[-1] == ("esp32/neopixel", "0,0,0")
+    assert ("esp32/effect", "ON2") not in enviados
+
+
+def test_close_envia_lo_pendiente():
+    p, enviados = _coalescer(default_rate=0.5)
+    p.submit("a", "1")
+    p.submit("a", "2")
+    p.submit("b", "x")
+    p.close()
+    assert ("a", "2") in enviados and ("b", "x") in enviados
+    p.submit("a", "3")   # cerrado: se ignora
+    assert ("a", "3") not in enviados
@@ -0,0 +1,76 @@
+import telemetry_chart
+from telemetry import TelemetryRing
+from telemetry_chart import TelemetryChart
+
+
+class _Canvas:
+    """Canvas falso: guarda las líneas con sus coordenadas y etiquetas."""
+
+    def __init__(self, *args, **kwargs):
+        self.lineas = {}
+        self._id = 0
+
+    def create_line(self, x0, y0, x1, y1, tags=(), **kwargs):
+        self._id += 1
+        self.lineas[self._id] = [x0, y0, x1, y1, tags]
+        return self._id
+
+    def move(self, tag, dx, dy):
+        for linea in self.lineas.values():
+            if tag in linea[4]:
+                linea[0] += dx
+                linea[2] += dx
+
+    def delete(self, item):
+        if isinstance(item, str):
+            self.lineas = {k: v for k, v in self.lineas.items() if item not in v[4]}
+        else:
+            self.lineas.pop(item, None)
+
+
+def _grafica(monkeypatch, ring, **kwargs):
+    monkeypatch.setattr(telemetry_chart.tk, "Canvas", _Canvas)
+    return TelemetryChart(None, ring, width=100, n_buckets=10, **kwargs)
+
+
+def _barras(chart):
+    """x de las barras min-max de las cubetas cerradas."""
+    return sorted(
+        linea[0] for linea in chart.canvas.lineas.values()
+        if "datos" in linea[4] and linea[0] == linea[2] and linea[1] != linea[3]
+    )
+
+
+def test_cubetas_por_instante_con_huecos(monkeypatch):
+    ring = TelemetryRing(bucket_seconds=1.0)
+    chart = _grafica(monkeypatch, ring)
+    for t, v in ((0.1, 1), (0.5, 3), (1.2, 2), (1.7, 4), (4.5, 5), (4.6, 7), (5.1, 6)):
+        ring.append(t, v)
+    chart.update()
+
+    # Cerradas: t=0, 1 y 4 (2 y 3 sin datos); en curso: t=5 a la derecha
+    assert chart._derecha == 5
+    assert _barras(chart) == [45.0, 55.0, 85.0]      # 65 y 75 quedan vacías
+    # La media une 0-1 pero no salta el hueco 1-4
+    unidas = [l for l in chart.canvas.lineas.values() if "datos" in l[4] and l[2] - l[0] > 1]
+    assert len(unidas) == 1
+
+
+def test_desplaza_y_borra_por_tiempo(monkeypatch):
+    ring = TelemetryRing(bucket_seconds=1.0)
+    chart = _grafica(monkeypatch, ring)
+    ring.append(0.5, 1)
+    ring.append(1.5, 1)
+    chart.update()
+    assert _barras(chart) == [85.0]
+
+    ring.append(2.5, 1)
+    chart.update()
+    assert _barras(chart) == [75.0, 85.0]
+
+    # 20 s sin datos: lo dibujado sale por la izquierda y se borra
+    ring.append(22.5, 1)
+    chart.update()
+    assert chart._derecha == 22
+    assert _barras(chart) == []
+    assert [l[4] for l in chart.canvas.lineas.values()] == [("actual",), ("actual",)]
@@ -0,0 +1,49 @@
+import pytest
+
+from topic_router import TopicRouter
+
+
+def _router(*patrones):
+    router = TopicRouter()
+    vistos = []
+    for patron in patrones:
+        router.add(patron, lambda t, p, patron=patron: vistos.append((patron, t, p)))
+    return router, vistos
+
+
+def test_exacto_y_comodines():
+    router, vistos = _router("esp32/error", "esp32/+", "esp32/#", "noria/+/estado")
+    assert router.route("esp32/error", "x") == 3
+    # El exacto primero; después los comodines
+    assert vistos[0][0] == "esp32/error"
+    assert sorted(v[0] for v in vistos[1:]) == ["esp32/#", "esp32/+"]
+
+    vistos.clear()
+    assert router.route("noria/n1/estado", "ok") == 1
+    assert vistos == [("noria/+/estado", "noria/n1/estado", "ok")]
+
+
+def test_almohadilla_incluye_el_nivel_padre():
+    router, _ = _router("esp32/#")
+    assert len(router.match("esp32")) == 1
+    assert len(router.match("esp32/a/b/c")) == 1
+    assert router.match("otro/a") == ()
+
+
+def test_sin_handler_cuenta_y_no_falla():
+    router, _ = _router("a/b")
+    assert router.route("a/c", "x") == 0
+    assert router.stats()["sin_handler"] == 1
+
+
+def test_add_invalida_la_cache():
+    router, _ = _router("a/b")
+    assert len(router.match("a/b")) == 1
+    router.add("a/+", lambda t, p: None)
+    assert len(router.match("a/b")) == 2
+
+
+@pytest.mark.parametrize("patron", ["a/#/b", "a/b#", "a/+b"])
+def test_patrones_invalidos(patron):
+    with pytest.raises(ValueError):
+        TopicRouter().add(patron, lambda t, p: None)
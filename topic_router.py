@@ -0,0 +1,114 @@
+import threading
+
+
+class _Nodo:
+    """Nodo del trie de patrones con comodines (un nivel de tópico)."""
+
+    __slots__ = ("hijos", "handlers", "resto")
+
+    def __init__(self):
+        self.hijos = {}      # nivel literal o "+" -> _Nodo
+        self.handlers = []   # patrón que termina exactamente aquí
+        self.resto = []      # patrón que termina en "#" aquí
+
+
+class TopicRouter:
+    """
+    Despacho de mensajes MQTT entrantes por tópico.
+
+    - Tópicos exactos en un dict: una sola búsqueda por mensaje.
+    - Patrones con comodines MQTT (+ y #) compilados en un trie por niveles.
+    - El resultado de cada tópico visto se guarda, así que los mensajes
+      siguientes del mismo tópico cuestan también una búsqueda en un dict.
+
+    Los handlers reciben (topic, payload).
+    """
+
+    def __init__(self):
+        self._exactos = {}
+        self._trie = _Nodo()
+        self._cache = {}
+        self._lock = threading.Lock()
+
+        # Métricas
+        self.routed = 0
+        self.unmatched = 0
+
+    # -------------------------------------------------------------
+    @staticmethod
+    def _validar(pattern):
+        niveles = pattern.split("/")
+        for i, nivel in enumerate(niveles):
+            if "#" in nivel and (nivel != "#" or i != len(niveles) - 1):
+                raise ValueError(f"'#' solo puede ser el último nivel: {pattern}")
+            if "+" in nivel and nivel != "+":
+                raise ValueError(f"'+' debe ocupar un nivel completo: {pattern}")
+        return niveles
+
+    def add(self, pattern, handler):
+        """Registra handler para un tópico exacto o un patrón con + / #."""
+        niveles = self._validar(pattern)
+        with self._lock:
+            if "+" not in niveles and "#" not in niveles:
+                self._exactos.setdefault(pattern, []).append(handler)
+            else:
+                nodo = self._trie
+                for nivel in niveles:
+                    if nivel == "#":
+                        nodo.resto.append(handler)
+                        break
+                    nodo = nodo.hijos.setdefault(nivel, _Nodo())
+                else:
+                    nodo.handlers.append(handler)
+            self._cache.clear()
+
+    # -------------------------------------------------------------
+    def _buscar_comodines(self, niveles):
+        encontrados = []
+        frente = [self._trie]
+        for nivel in niveles:
+            siguiente = []
+            for nodo in frente:
+                # "a/#" también coincide con "a" (regla MQTT), por eso antes de bajar
+                encontrados.extend(nodo.resto)
+                hijo = nodo.hijos.get(nivel)
+                if hijo is not None:
+                    siguiente.append(hijo)
+                hijo = nodo.hijos.get("+")
+                if hijo is not None:
+                    siguiente.append(hijo)
+            frente = siguiente
+            if not frente:
+                return encontrados
+        for nodo in frente:
+            encontrados.extend(nodo.handlers)
+            encontrados.extend(nodo.resto)
+        return encontrados
+
+    def match(self, topic):
+        """Handlers que corresponden a topic (exactos primero)."""
+        handlers = self._cache.get(topic)
+        if handlers is None:
+            with self._lock:
+                handlers = tuple(self._exactos.get(topic, ())) + tuple(self._buscar_comodines(topic.split("/")))
+                self._cache[topic] = handlers
+        return handlers
+
+    def route(self, topic, payload):
+        """Llama a los handlers de topic. Devuelve cuántos se ejecutaron."""
+        handlers = self.match(topic)
+        if not handlers:
+            self.unmatched += 1
+            return 0
+        self.routed += 1
+        for handler in handlers:
+            handler(topic, payload)
+        return len(handlers)
+
+    def stats(self):
+        return {
+            "enrutados": self.routed,
+            "sin_handler": self.unmatched,
+            "exactos": len(self._exactos),
+            "topicos_en_cache": len(self._cache),
+        }
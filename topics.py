@@ -0,0 +1,18 @@
+# topics.py
+"""Tópicos MQTT de la noria (ESP32), compartidos por la interfaz y el daemon."""
+
+TOPIC_NEOPIXEL = "esp32/neopixel"
+TOPIC_EFFECT = "esp32/effect"                  # Efecto LED animado en la ESP32 (JSON)
+TOPIC_DC_SPEED = "esp32/dc_speed"              # DC motor speed (0-100)
+TOPIC_STEPPER_SPEED = "esp32/stepper_speed"    # Stepper motor speed (0-100)
+TOPIC_STEPPER = "esp32/stepper_delay"          # Compatibilidad, si alguien usa delay
+TOPIC_SONG = "esp32/play_song"
+TOPIC_CHATBOT = "esp32/chatbot_command"
+TOPIC_SERVO = "esp32/servo_door"
+TOPIC_ERROR = "esp32/error"
+TOPIC_STATUS = "esp32/status"
+TOPIC_DISTANCE = "esp32/distance_cm"           # Nuevo topic para texto sensor (mostrar en UI)
+TOPIC_PING = "esp32/ping"                      # La ESP32 responde el mismo payload en esp32/pong
+TOPIC_PONG = "esp32/pong"
+TOPIC_METRICS = "esp32/metrics"                # Latencia y carga del scheduler de la ESP32 (JSON)
+TOPIC_ALL = "esp32/#"                          # Una sola suscripción para todo lo de la noria